@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from profiling import stage
+
+API_URL = "https://api.anthropic.com/v1/messages"
+API_VERSION = "2023-06-01"
+
+# 529 is the API's "overloaded" status
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504, 529})
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 30.0
+CONNECT_TIMEOUT_S = 5
+READ_TIMEOUT_S = 60
+POOL_SIZE = 8
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'process-bottleneck-analyzer', 'ai')
+CACHE_TTL_S = 24 * 3600
+# Replies that ended their turn; anything else (max_tokens) is cut off and never cached
+CLEAN_STOP_REASONS = frozenset({'end_turn', 'stop_sequence'})
+
+
+class APIError(ValueError):
+    """Non-retryable or retries-exhausted API failure; status is None for network errors."""
+
+    def __init__(self, status, message):
+        super().__init__(f"API Error {status}: {message}" if status else f"API Error: {message}")
+        self.status = status
+
+
+class AIClient:
+    """Messages API client: pooled keep-alive session, retries with backoff, on-disk response cache.
+
+    Identical requests (same model, prompt and parameters) within cache_ttl
+    seconds are answered from cache_dir without a network call; pass
+    cache_dir=None to disable the cache. base_url can point at any server
+    speaking the same protocol, e.g. a local stub. One client is safe to
+    share between threads.
+    """
+
+    def __init__(self, api_key, base_url=API_URL, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE_S,
+                 backoff_max=BACKOFF_MAX_S, timeout=(CONNECT_TIMEOUT_S, READ_TIMEOUT_S),
+                 cache_dir=CACHE_DIR, cache_ttl=CACHE_TTL_S, pool_size=POOL_SIZE, sleep=time.sleep):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self._sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Content-Type":      "application/json",
+            "x-api-key":         api_key,
+            "anthropic-version": API_VERSION,
+        })
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'cache_hits': 0}
+
+    # ── Cache ────────────────────────────────────────────────────────────────
+    @staticmethod
+    def cache_key(payload):
+        """SHA-256 of the canonical JSON request (model, messages and parameters)."""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _cache_get(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), encoding='utf-8') as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created', 0) > self.cache_ttl:
+            return None
+        return entry.get('response')
+
+    def _cache_put(self, key, response):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump({'created': time.time(), 'response': response}, fh)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # an unwritable cache only costs the next call a request
+
+    def clear_cache(self):
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    # ── Requests ─────────────────────────────────────────────────────────────
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry `attempt` (0-based): Retry-After if sent, else jittered 2^n."""
+        if response is not None:
+            try:
+                return min(float(response.headers['retry-after']), self.backoff_max)
+            except (KeyError, ValueError):
+                pass
+        return min(self.backoff_max, self.backoff_base * 2 ** attempt) * (0.5 + random.random() / 2)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _send(self, payload, stream=False):
+        """200 response for a request body, retrying 429/5xx and network errors with backoff."""
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            self._count('requests')
+            try:
+                response = self.session.post(self.base_url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    raise APIError(None, e) from e
+                self._count('retries')
+                self._sleep(self._backoff(attempt))
+                continue
+            if response.status_code == 200:
+                return response
+            if response.status_code not in RETRY_STATUSES or last:
+                raise APIError(response.status_code, response.text)
+            response.close()
+            self._count('retries')
+            self._sleep(self._backoff(attempt, response))
+
+    def _post(self, payload, key, use_cache):
+        """(response JSON, served from cache?) for a Messages API request body."""
+        if use_cache:
+            cached = self._cache_get(key)
+            if cached is not None:
+                self._count('cache_hits')
+                return cached, True
+        return self._send(payload).json(), False
+
+    def post(self, payload, use_cache=True):
+        """JSON response for a Messages API request body, from cache or the network.
+
+        A reply cut off at max_tokens is returned but not cached.
+        """
+        key = self.cache_key(payload)
+        data, from_cache = self._post(payload, key, use_cache)
+        if use_cache and not from_cache and data.get("stop_reason", "end_turn") in CLEAN_STOP_REASONS:
+            self._cache_put(key, data)
+        return data
+
+    @staticmethod
+    def _payload(prompt, model, max_tokens):
+        return {
+            "model":      model,
+            "max_tokens": max_tokens,
+            "messages":   [{"role": "user", "content": prompt}],
+        }
+
+    def forget(self, prompt, model, max_tokens):
+        """Drop the cached answer to a prompt, e.g. one that turned out unusable."""
+        if self.cache_dir:
+            try:
+                os.remove(self._cache_path(self.cache_key(self._payload(prompt, model, max_tokens))))
+            except OSError:
+                pass
+
+    def stream(self, prompt, model, max_tokens, use_cache=True):
+        """Yield the text of a completion as it is generated (server-sent events).
+
+        A cached answer arrives as a single chunk. A stream that reaches
+        message_stop having ended its turn is cached under the same key as
+        complete(), so either call can serve the other; an interrupted or
+        cut-off (max_tokens) one is not cached.
+        """
+        payload = self._payload(prompt, model, max_tokens)
+        key = self.cache_key(payload)
+        with stage('claude_api', prompt_chars=len(prompt), stream=True) as span:
+            if use_cache:
+                cached = self._cache_get(key)
+                if cached is not None:
+                    self._count('cache_hits')
+                    span.set(cache='hit')
+                    yield cached["content"][0]["text"]
+                    return
+            span.set(cache='miss')
+
+            parts = []
+            stop_reason = None
+            response = self._send({**payload, "stream": True}, stream=True)
+            with response:
+                # Lines are split on bytes and decoded as UTF-8 whatever charset the response declares
+                lines = (line.decode('utf-8') for line in response.iter_lines())
+                for event in iter_sse(lines):
+                    kind = event.get("type")
+                    if kind == "content_block_delta" and event["delta"].get("type") == "text_delta":
+                        parts.append(event["delta"]["text"])
+                        yield event["delta"]["text"]
+                    elif kind == "message_delta":
+                        stop_reason = event["delta"].get("stop_reason", stop_reason)
+                    elif kind == "error":
+                        error = event.get("error", {})
+                        raise APIError(None, f"{error.get('type', 'error')}: {error.get('message', '')}")
+                    elif kind == "message_stop":
+                        break
+                else:
+                    raise APIError(None, "stream ended before message_stop")
+            span.set(stop_reason=stop_reason)
+        if use_cache and stop_reason in CLEAN_STOP_REASONS:
+            self._cache_put(key, {"content": [{"type": "text", "text": ''.join(parts)}], "stop_reason": stop_reason})
+
+    def complete(self, prompt, model, max_tokens, use_cache=True, parse=None):
+        """Text of a single-turn completion, or parse(text) if given.
+
+        With parse, a response is cached only once it parses, so a malformed
+        answer is asked for again next time instead of being replayed; a
+        reply cut off at max_tokens is never cached.
+        """
+        payload = self._payload(prompt, model, max_tokens)
+        key = self.cache_key(payload)
+        with stage('claude_api', prompt_chars=len(prompt)) as span:
+            data, from_cache = self._post(payload, key, use_cache)
+            span.set(cache='hit' if from_cache else 'miss')
+        text = data["content"][0]["text"]
+        result = parse(text) if parse else text
+        if use_cache and not from_cache and data.get("stop_reason", "end_turn") in CLEAN_STOP_REASONS:
+            self._cache_put(key, data)
+        return result
+
+    def map(self, fn, items, max_workers=POOL_SIZE):
+        """[fn(item) ...] run concurrently over the shared session; failures come back as exceptions."""
+        def call(item):
+            try:
+                return fn(item)
+            except Exception as e:
+                return e
+        items = list(items)
+        if len(items) <= 1 or max_workers <= 1:
+            return [call(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+            return list(pool.map(call, items))
+
+    def close(self):
+        self.session.close()
+
+
+def iter_sse(lines):
+    """JSON payloads of the data: fields of a server-sent event stream, one dict per event."""
+    data = []
+    for line in lines:
+        if line is None:
+            continue
+        if not line:
+            if data:
+                payload = '\n'.join(data)
+                data = []
+                if payload != '[DONE]':
+                    yield json.loads(payload)
+            continue
+        if line.startswith('data:'):
+            data.append(line[5:].lstrip(' '))
+        # event:, id:, retry: and ': comment' lines carry nothing the payload lacks
+    if data:
+        yield json.loads('\n'.join(data))
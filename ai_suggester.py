@@ -1,5 +1,12 @@
 import json
-import requests
+import threading
+import time
+
+import pandas as pd
+import numpy as np
+
+from ai_client import AIClient, POOL_SIZE
+from profiling import profiled, stage
 
 # ============================================================
 #   PASTE YOUR ANTHROPIC API KEY BELOW (replace the value)
@@ -8,64 +15,150 @@ ANTHROPIC_API_KEY = "your-api-key-here"
 # ============================================================
 
 
-def get_ai_suggestions(kpi_results, findings) -> dict:
-    """Call Claude AI API and return suggestions + executive summary."""
+MODEL = "claude-sonnet-4-6"
+MAX_TOKENS = 2000
+
+# Budget for the data part of the prompt; large processes list their most
+# informative activities and summarise the rest.
+PROMPT_TOKEN_BUDGET = 6000
+CHARS_PER_TOKEN = 4
+MAX_LISTED_FINDINGS = 25
+ACTIVITY_COLUMNS = ['activity', 'avg_waiting_hrs', 'p90_waiting_hrs', 'max_waiting_hrs', 'std_waiting_hrs', 'frequency']
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> AIClient:
+    """Shared client for ANTHROPIC_API_KEY, so connections and the response cache are reused."""
+    global _client
     if not ANTHROPIC_API_KEY or ANTHROPIC_API_KEY == "your-api-key-here":
         raise ValueError(
             "API key not set! Open ai_suggester.py and paste your key into ANTHROPIC_API_KEY at the top of the file."
         )
+    with _client_lock:
+        if _client is None or _client.api_key != ANTHROPIC_API_KEY:
+            _client = AIClient(ANTHROPIC_API_KEY)
+        return _client
+
+
+def estimate_tokens(text) -> int:
+    """Rough token count of a prompt (about 4 characters per token)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _compact(value) -> str:
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+def _table(frame, columns):
+    """Column-oriented {"columns": [...], "rows": [[...], ...]}; keys are written once, not per row."""
+    rounded = frame[columns].round(2)
+    return {"columns": columns, "rows": rounded.astype(object).to_numpy().tolist()}
 
+
+def rank_activities(activity_stats):
+    """Row positions of activity_stats, most informative first.
+
+    Interleaves four rankings (average wait, variability, tail wait, total
+    wait) so each kind of problem is represented before any one runs deep.
+    """
+    avg = activity_stats['avg_waiting_hrs'].to_numpy(dtype=float)
+    std = activity_stats['std_waiting_hrs'].fillna(0).to_numpy(dtype=float)
+    tail_column = 'p99_waiting_hrs' if 'p99_waiting_hrs' in activity_stats else 'max_waiting_hrs'
+    tail = activity_stats[tail_column].to_numpy(dtype=float)
+    total = avg * activity_stats['frequency'].to_numpy(dtype=float)
+    rankings = np.stack([np.argsort(-np.nan_to_num(v, nan=-np.inf), kind='stable') for v in (avg, std, tail, total)])
+    return pd.unique(rankings.T.ravel())
+
+
+def _long_tail(omitted):
+    """Statistical summary of activities left out of the listing."""
+    if omitted.empty:
+        return None
+    avg = omitted['avg_waiting_hrs']
+    return {
+        "activities":             len(omitted),
+        "events":                 int(omitted['frequency'].sum()),
+        "total_waiting_hrs":      round(float((avg * omitted['frequency']).sum()), 2),
+        "avg_waiting_hrs_median": round(float(avg.median()), 2),
+        "avg_waiting_hrs_p90":    round(float(avg.quantile(0.9)), 2),
+        "avg_waiting_hrs_max":    round(float(avg.max()), 2),
+    }
+
+
+def compact_context(kpi_results, findings, token_budget=PROMPT_TOKEN_BUDGET):
+    """(process context for the prompt, prompt stats) within roughly token_budget tokens.
+
+    Findings are always included (capped at MAX_LISTED_FINDINGS each); the
+    remaining budget lists activities in rank_activities order and the rest
+    are summarised as a long tail. The stats compare the estimate with the
+    previous one-object-per-activity, indented serialisation.
+    """
     summary         = kpi_results['summary']
-    activity_stats  = kpi_results['activity_stats']
+    activity_stats  = kpi_results['activity_stats'].reset_index(drop=True)
     bottlenecks     = findings['bottlenecks']
-    inconsistent    = findings['inconsistent_steps']
+    inconsistent    = findings['inconsistent_steps'].sort_values('std_waiting_hrs', ascending=False)
     single_resource = findings['single_resource_risk']
 
-    activity_data = [
-        {
-            "activity":        row['activity'],
-            "avg_waiting_hrs": round(row['avg_waiting_hrs'], 2),
-            "max_waiting_hrs": round(row['max_waiting_hrs'], 2),
-            "std_dev_hrs":     round(row['std_waiting_hrs'], 2),
-            "frequency":       int(row['frequency'])
-        }
-        for _, row in activity_stats.iterrows()
-    ]
-
-    bottleneck_data = [
-        {
-            "rank":            int(row.get('rank', 0)),
-            "activity":        row['activity'],
-            "avg_waiting_hrs": round(row['avg_waiting_hrs'], 2),
-            "severity":        row.get('severity', '')
-        }
-        for _, row in bottlenecks.iterrows()
-    ]
-
-    inconsistent_data = [
-        {"activity": row['activity'], "std_dev_hrs": round(row['std_waiting_hrs'], 2)}
-        for _, row in inconsistent.iterrows()
-    ]
-
-    single_risk_data = (
-        [{"activity": row['activity']} for _, row in single_resource.iterrows()]
-        if not single_resource.empty else []
-    )
-
-    process_context = {
+    bottleneck_columns = [c for c in ['rank', 'activity', 'avg_waiting_hrs', 'severity'] if c in bottlenecks]
+    context = {
         "summary_kpis":               summary,
-        "all_activities":             activity_data,
-        "top_bottlenecks":            bottleneck_data,
-        "inconsistent_steps":         inconsistent_data,
-        "single_resource_risk_steps": single_risk_data
+        "top_bottlenecks":            _table(bottlenecks, bottleneck_columns),
+        "inconsistent_steps":         _table(inconsistent.head(MAX_LISTED_FINDINGS), ['activity', 'std_waiting_hrs']),
+        "single_resource_risk_steps": single_resource['activity'].head(MAX_LISTED_FINDINGS).tolist(),
+    }
+    if len(inconsistent) > MAX_LISTED_FINDINGS:
+        context["inconsistent_steps_total"] = len(inconsistent)
+    if len(single_resource) > MAX_LISTED_FINDINGS:
+        context["single_resource_risk_steps_total"] = len(single_resource)
+
+    columns = [c for c in ACTIVITY_COLUMNS if c in activity_stats]
+    order = rank_activities(activity_stats)
+    table = _table(activity_stats.iloc[order], columns)
+    remaining = token_budget * CHARS_PER_TOKEN - len(_compact(context)) - len(_compact(columns)) - 256
+    listed = 0
+    for row in table["rows"]:
+        remaining -= len(_compact(row)) + 1
+        if remaining < 0:
+            break
+        listed += 1
+    table["rows"] = table["rows"][:listed]
+    context["activities"] = table
+    long_tail = _long_tail(activity_stats.iloc[order[listed:]])
+    if long_tail:
+        context["other_activities_summary"] = long_tail
+
+    # Previous format: every activity as an indented object; estimated from a sample
+    k = len(activity_stats)
+    sample = [dict(zip(columns, r)) for r in _table(activity_stats.head(50), columns)["rows"]]
+    verbose_chars = len(json.dumps({**context, "activities": None}, indent=2, default=str))
+    if sample:
+        verbose_chars += len(json.dumps(sample, indent=2, default=str)) * k / len(sample)
+    tokens = estimate_tokens(_compact(context))
+    baseline = int(verbose_chars / CHARS_PER_TOKEN)
+    stats = {
+        "activities_total":     k,
+        "activities_listed":    listed,
+        "estimated_tokens":     tokens,
+        "baseline_tokens":      baseline,
+        "tokens_saved":         max(baseline - tokens, 0),
     }
+    return context, stats
+
+
+def build_prompt(kpi_results, findings, token_budget=PROMPT_TOKEN_BUDGET, return_stats=False):
+    """Prompt describing the analysed process to the model (and compact_context stats if asked)."""
+    process_context, stats = compact_context(kpi_results, findings, token_budget)
+    scope = ('' if 'other_activities_summary' not in process_context else
+             f"; the {stats['activities_listed']} most significant of {stats['activities_total']} activities "
+             "are listed and the rest summarised in other_activities_summary")
 
     prompt = f"""You are a world-class Process Excellence Consultant with expertise in Lean, Six Sigma, and operational efficiency.
 
-I have run a process mining analysis on a business workflow. Here is the complete analytical data:
+I have run a process mining analysis on a business workflow. Here is the analytical data (tables are column-oriented{scope}):
 
-{json.dumps(process_context, indent=2)}
+{_compact(process_context)}
 
 Respond ONLY with valid JSON in exactly this format (no markdown, no explanation outside JSON):
 
@@ -86,31 +179,178 @@ Respond ONLY with valid JSON in exactly this format (no markdown, no explanation
 
 Generate 5-8 suggestions. Sort by severity Critical first. Include at least one Quick Win and one Strategic suggestion."""
 
-    response = requests.post(
-        "https://api.anthropic.com/v1/messages",
-        headers={
-            "Content-Type":      "application/json",
-            "x-api-key":         ANTHROPIC_API_KEY,
-            "anthropic-version": "2023-06-01"
-        },
-        json={
-            "model":      "claude-sonnet-4-6",
-            "max_tokens": 2000,
-            "messages":   [{"role": "user", "content": prompt}]
-        },
-        timeout=60
-    )
-
-    if response.status_code != 200:
-        raise ValueError(f"API Error {response.status_code}: {response.text}")
-
-    raw = response.json()["content"][0]["text"].strip()
-
-    # Strip markdown fences if model wrapped in ```json ... ```
-    if "```" in raw:
-        raw = raw.split("```")[1]
-        if raw.startswith("json"):
-            raw = raw[4:]
-    raw = raw.strip()
-
-    return json.loads(raw)
+    if return_stats:
+        return prompt, stats
+    return prompt
+
+
+class SuggestionParser:
+    """Incremental parser for the suggestions JSON as it streams in.
+
+    feed() scans only the new text and returns the pieces completed by it:
+    ('summary', text) once the executive summary string closes and
+    ('suggestion', dict) for each closed object in the suggestions array.
+    Text before the first '{' (a ```json fence, a preamble) and after the
+    closing '}' is ignored; result() still returns whatever was completed
+    when the reply is cut off.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.executive_summary = None
+        self.suggestions = []
+        self.complete = False
+        self._pos = 0
+        self._start = None
+        self._end = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._after_colon = False
+        self._in_suggestions = False
+        self._item_start = None
+
+    def feed(self, chunk) -> list:
+        self.text += chunk
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.complete:
+                break
+            c = text[i]
+            if self._start is None:
+                if c == '{':
+                    self._start, self._depth = i, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._top_level_string(json.loads(text[self._string_start:i + 1]), events)
+                continue
+            if c == '"':
+                self._in_string, self._string_start = True, i
+            elif c == ':' and self._depth == 1:
+                self._after_colon = True
+            elif c == ',' and self._depth == 1:
+                self._after_colon = False
+            elif c in '{[':
+                self._depth += 1
+                if c == '[' and self._depth == 2 and self._key == 'suggestions' and self._after_colon:
+                    self._in_suggestions = True
+                elif c == '{' and self._depth == 3 and self._in_suggestions:
+                    self._item_start = i
+            elif c in '}]':
+                if c == '}' and self._depth == 3 and self._item_start is not None:
+                    item = json.loads(text[self._item_start:i + 1])
+                    self.suggestions.append(item)
+                    events.append(('suggestion', item))
+                    self._item_start = None
+                self._depth -= 1
+                if self._depth == 1:
+                    self._in_suggestions = False
+                elif self._depth == 0:
+                    self.complete = True
+                    self._end = i + 1
+        self._pos = len(text)
+        return events
+
+    def _top_level_string(self, value, events):
+        if not self._after_colon:
+            self._key = value
+            return
+        if self._key == 'executive_summary':
+            self.executive_summary = value
+            events.append(('summary', value))
+
+    def result(self) -> dict:
+        """The parsed reply; if it was cut off, the completed parts with truncated=True."""
+        if self.complete:
+            return json.loads(self.text[self._start:self._end])
+        if self.executive_summary is None and not self.suggestions:
+            raise ValueError("No suggestions could be parsed from the AI response")
+        result = {'suggestions': list(self.suggestions), 'truncated': True}
+        if self.executive_summary is not None:
+            result['executive_summary'] = self.executive_summary
+        return result
+
+
+def parse_response(raw) -> dict:
+    """Suggestions JSON from the model's reply text (fenced, prefixed or cut off)."""
+    parser = SuggestionParser()
+    parser.feed(raw)
+    return parser.result()
+
+
+def _prompt(kpi_results, findings):
+    """(prompt, compact_context stats), recorded as the build_prompt stage."""
+    with stage('build_prompt') as span:
+        prompt, stats = build_prompt(kpi_results, findings, return_stats=True)
+        span.set(rows_in=stats['activities_total'], rows_out=stats['activities_listed'],
+                 tokens=stats['estimated_tokens'], tokens_saved=stats['tokens_saved'])
+    return prompt, stats
+
+
+@profiled()
+def get_ai_suggestions(kpi_results, findings, client=None, use_cache=True) -> dict:
+    """Call Claude AI API and return suggestions + executive summary.
+
+    The same analysis is answered from the client's response cache; pass
+    use_cache=False to ask the model again. The result carries the
+    compact_context stats under 'prompt_stats'.
+    """
+    client = client or get_client()
+    prompt, stats = _prompt(kpi_results, findings)
+    result = client.complete(prompt, MODEL, MAX_TOKENS, use_cache=use_cache, parse=parse_response)
+    if result.get('truncated'):
+        client.forget(prompt, MODEL, MAX_TOKENS)  # a cut-off reply is not replayed from the cache
+    result['prompt_stats'] = stats
+    return result
+
+
+def get_ai_suggestions_batch(analyses, client=None, max_workers=POOL_SIZE) -> list:
+    """get_ai_suggestions for many (kpi_results, findings) pairs, with concurrent requests.
+
+    Results come back in input order; a failed analysis yields its exception.
+    """
+    client = client or get_client()
+    return client.map(lambda pair: get_ai_suggestions(*pair, client=client), analyses, max_workers=max_workers)
+
+
+def stream_ai_suggestions(kpi_results, findings, client=None, use_cache=True):
+    """Yield ('summary', text) and ('suggestion', dict) as the streamed reply completes them.
+
+    The last event is ('done', result), where result is what
+    get_ai_suggestions would return plus 'stream_stats': seconds to the
+    first text, to the first suggestion and in total. A reply that cannot
+    be parsed is dropped from the response cache and raises ValueError; a
+    cut-off one is dropped too, and returned with truncated=True.
+    """
+    client = client or get_client()
+    start = time.perf_counter()
+    prompt, stats = _prompt(kpi_results, findings)
+    parser = SuggestionParser()
+    timings = {'first_text_s': None, 'first_suggestion_s': None}
+    for chunk in client.stream(prompt, MODEL, MAX_TOKENS, use_cache=use_cache):
+        if timings['first_text_s'] is None:
+            timings['first_text_s'] = round(time.perf_counter() - start, 3)
+        for event in parser.feed(chunk):
+            if event[0] == 'suggestion' and timings['first_suggestion_s'] is None:
+                timings['first_suggestion_s'] = round(time.perf_counter() - start, 3)
+            yield event
+    try:
+        result = parser.result()
+    except ValueError:
+        client.forget(prompt, MODEL, MAX_TOKENS)
+        raise
+    if result.get('truncated'):
+        client.forget(prompt, MODEL, MAX_TOKENS)
+    result['prompt_stats'] = stats
+    result['stream_stats'] = {**timings, 'total_s': round(time.perf_counter() - start, 3)}
+    yield 'done', result
@@ -1,25 +1,58 @@
 import pandas as pd
 import numpy as np
 
+from eventlog import column_codes
+from profiling import profiled
+from rules import severity_of
+from sketches import PERCENTILE_COLUMNS
 
-def detect_bottlenecks(activity_stats, top_n=3):
-    """Identify top N bottleneck activities based on avg waiting time."""
-    ranked = activity_stats.sort_values('avg_waiting_hrs', ascending=False).reset_index(drop=True)
+
+RANKING_METRICS = ['avg_waiting_hrs'] + PERCENTILE_COLUMNS
+OVERLOAD_UTILIZATION_PCT = 85
+
+
+def metric_label(metric):
+    """Display name of a ranking metric: 'Average wait', 'P90 wait', ..."""
+    return 'Average wait' if metric == 'avg_waiting_hrs' else f"{metric.split('_')[0].upper()} wait"
+
+
+def detect_bottlenecks(activity_stats, top_n=3, metric='avg_waiting_hrs'):
+    """Identify top N bottleneck activities based on a waiting-time metric.
+
+    metric is 'avg_waiting_hrs' (default) or a percentile column such as
+    'p90_waiting_hrs'; severity is classified on the same metric, which is
+    also named in 'rank_metric' with its value in 'rank_value'.
+    """
+    if metric not in activity_stats.columns:
+        raise ValueError(f"Unknown ranking metric: {metric}. Choose one of {RANKING_METRICS}")
+    ranked = activity_stats.sort_values(metric, ascending=False).reset_index(drop=True)
+    bottlenecks = ranked.head(top_n).copy()
+    bottlenecks['rank'] = range(1, len(bottlenecks) + 1)
+    bottlenecks['severity'] = severity_of(bottlenecks[metric])
+    bottlenecks['rank_metric'] = metric_label(metric)
+    bottlenecks['rank_value'] = bottlenecks[metric]
+    return bottlenecks
+
+
+def detect_transition_bottlenecks(transition_stats, top_n=3, metric='avg_waiting_hrs', min_frequency=2):
+    """Top N directly-follows edges (source → target) by waiting-time metric.
+
+    Edges seen fewer than min_frequency times are ignored, so a one-off
+    detour does not outrank the main flow.
+    """
+    if transition_stats is None or transition_stats.empty:
+        return pd.DataFrame()
+    edges = transition_stats[transition_stats['frequency'] >= min_frequency]
+    ranked = edges.sort_values(metric, ascending=False).reset_index(drop=True)
     bottlenecks = ranked.head(top_n).copy()
     bottlenecks['rank'] = range(1, len(bottlenecks) + 1)
-    bottlenecks['severity'] = bottlenecks['avg_waiting_hrs'].apply(classify_severity)
+    bottlenecks['severity'] = severity_of(bottlenecks[metric])
     return bottlenecks
 
 
 def classify_severity(avg_hrs):
-    if avg_hrs >= 5:
-        return 'Critical'
-    elif avg_hrs >= 2:
-        return 'High'
-    elif avg_hrs >= 0.5:
-        return 'Medium'
-    else:
-        return 'Low'
+    """Severity label of a single waiting time; see rules.SEVERITY_BANDS."""
+    return str(severity_of([avg_hrs])[0])
 
 
 def detect_inconsistent_steps(activity_stats, threshold_multiplier=1.5):
@@ -36,21 +69,60 @@ def detect_single_resource_risk(df):
     """Steps handled by only one resource — single point of failure."""
     if 'resource' not in df.columns:
         return pd.DataFrame()
-    resource_counts = df.groupby('activity')['resource'].nunique().reset_index()
-    resource_counts.columns = ['activity', 'unique_resources']
+    # Distinct (activity, resource) code pairs, counted per activity code
+    act_codes, activities = column_codes(df['activity'])
+    res_codes, resources = column_codes(df['resource'])
+    valid = (act_codes >= 0) & (res_codes >= 0)
+    pairs = np.unique(act_codes[valid].astype(np.int64) * max(len(resources), 1) + res_codes[valid])
+    unique_resources = np.bincount(pairs // max(len(resources), 1), minlength=len(activities))
+    resource_counts = pd.DataFrame({'activity': activities, 'unique_resources': unique_resources})
     risky = resource_counts[resource_counts['unique_resources'] == 1]
     return risky
 
 
-def full_analysis(kpi_results):
-    """Run all analysis and return structured findings."""
+def detect_overloaded_resources(resource_utilization_stats, threshold_pct=OVERLOAD_UTILIZATION_PCT):
+    """Resources with open work for at least threshold_pct of the log span.
+
+    Takes utilization()['resource_utilization_stats']; the busiest come first.
+    """
+    if resource_utilization_stats is None or resource_utilization_stats.empty:
+        return pd.DataFrame()
+    overloaded = resource_utilization_stats[resource_utilization_stats['utilization_pct'] >= threshold_pct]
+    return overloaded.sort_values('utilization_pct', ascending=False).reset_index(drop=True)
+
+
+def detect_rising_delays(trend):
+    """Activities whose waiting time is trending up, steepest first.
+
+    Takes trends.window_stats()['trend'].
+    """
+    if trend is None or trend.empty:
+        return pd.DataFrame()
+    return trend[trend['rising']].reset_index(drop=True)
+
+
+@profiled()
+def full_analysis(kpi_results, metric='avg_waiting_hrs', utilization=None, trends=None):
+    """Run all analysis and return structured findings.
+
+    utilization and trends are the optional outputs of
+    utilization.utilization() and trends.window_stats(); without them
+    overloaded_resources and rising_delays are empty.
+    """
     activity_stats = kpi_results['activity_stats']
-    df = kpi_results['df_with_waiting']
+    df = kpi_results.get('df_with_waiting')
+    if df is None:
+        # Streaming results only carry the distinct (activity, resource) pairs
+        df = kpi_results['activity_resources']
 
     findings = {
-        'bottlenecks': detect_bottlenecks(activity_stats),
+        'bottlenecks': detect_bottlenecks(activity_stats, metric=metric),
         'inconsistent_steps': detect_inconsistent_steps(activity_stats),
         'single_resource_risk': detect_single_resource_risk(df),
+        'transition_bottlenecks': detect_transition_bottlenecks(kpi_results.get('transition_stats'), metric=metric),
+        'overloaded_resources': detect_overloaded_resources(
+            utilization['resource_utilization_stats'] if utilization else None),
+        'rising_delays': detect_rising_delays(trends['trend'] if trends else None),
         'activity_stats': activity_stats,
     }
     return findings
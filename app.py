@@ -1,18 +1,23 @@
 import streamlit as st
 import pandas as pd
 import os
+import tempfile
 
-from processor import load_and_validate, calculate_kpis
-from analyzer import full_analysis
+from parallel import calculate_kpis_parallel
+from log_cache import load_cached, file_fingerprint
+from case_index import CaseIndex, MAX_LISTED_MATCHES, case_steps
+from explorer import DEFAULT_PAGE_SIZE, LogIndex, PAGE_SIZES, TableIndex
+from pipeline_cache import cached, pipeline_cache
+from profiling import Trace, stage
+from render_engine import chart_renderer
+from analyzer import full_analysis, metric_label, OVERLOAD_UTILIZATION_PCT, RANKING_METRICS
 from suggester import generate_suggestions
-from ai_suggester import get_ai_suggestions
-from visualizer import (
-    plot_bottleneck_bar,
-    plot_heatmap,
-    plot_cycle_time_distribution,
-    plot_resource_workload,
-)
-from reporter import export_summary_csv
+from ai_suggester import stream_ai_suggestions
+from visualizer import HEATMAP_MODES
+from reporter import EXPORTS, write_report
+from trends import RISING_MIN_CHANGE_PCT, TREND_LOOKBACK, window_options, window_stats_from_frame
+from utilization import entity_count, resolution_options, utilization_from_frame
+from variants import filter_top_variants
 
 st.set_page_config(
     page_title="Process Bottleneck Analyzer — AI Powered",
@@ -62,6 +67,7 @@ h3 { color: var(--accent2) !important; font-size: 1rem !important; }
 .stTabs [data-baseweb="tab-list"] { background:var(--surface) !important; }
 .stTabs [data-baseweb="tab"] { background:var(--surface2) !important; color:var(--muted) !important; border-radius:6px 6px 0 0 !important; font-family:'Space Mono',monospace !important; font-size:0.82rem !important; }
 .stTabs [aria-selected="true"] { background:var(--accent) !important; color:white !important; }
+div[role="radiogroup"] label { background:var(--surface2); border-radius:6px 6px 0 0; padding:4px 12px; font-family:'Space Mono',monospace; font-size:0.82rem; }
 .stDownloadButton button { background:var(--accent) !important; color:white !important; border:none !important; border-radius:6px !important; }
 </style>
 """, unsafe_allow_html=True)
@@ -71,29 +77,59 @@ with st.sidebar:
     st.markdown("## ⚙️ Process Bottleneck\n### Analyzer")
     st.markdown("<span class='ai-badge'>✦ AI POWERED</span>", unsafe_allow_html=True)
     st.markdown("---")
-    uploaded_file = st.file_uploader("📂 Upload CSV / Excel", type=["csv","xlsx","xls"])
+    uploaded_file = st.file_uploader("📂 Upload CSV / Excel", type=["csv","xlsx","xls"],
+                                     on_change=lambda: st.session_state.pop('use_sample', None))
+    st.markdown("---")
+    if st.button("▶ Use Sample Dataset", use_container_width=True):
+        st.session_state['use_sample'] = True
     st.markdown("---")
-    use_sample = st.button("▶ Use Sample Dataset", use_container_width=True)
+    diagnostics = st.checkbox("🩺 Diagnostics", key="diagnostics",
+                              help="Time every pipeline stage of this run and show the trace below the report.")
+    track_memory = diagnostics and st.checkbox("Track peak memory (slower)", key="track_memory")
     st.markdown("---")
     st.caption("v2.0 · AI-Powered · Process Excellence")
 
+# Per-run stage trace; with diagnostics off no trace is active and the
+# instrumented functions skip recording entirely.
+trace = Trace("app run", memory=track_memory).start() if diagnostics else None
+
 # ── Load Data ────────────────────────────────────────────────────────────────
+def source_fingerprint(source):
+    """Content hash of a data source, computed once per upload/path per session."""
+    token = getattr(source, 'file_id', source)
+    fingerprints = st.session_state.setdefault('fingerprints', {})
+    if token not in fingerprints:
+        fingerprints[token] = file_fingerprint(source)
+    return fingerprints[token]
+
+
+def load_source(source):
+    fp = source_fingerprint(source)
+    df, quarantine = cached('load', fp, load_cached, source, return_quarantine=True, fingerprint=fp)
+    return fp, df, quarantine
+
+
 df = None
+quarantine = None
+fingerprint = None
 source_label = ""
 
-if use_sample:
+if st.session_state.get('use_sample'):
     sample_path = os.path.join(os.path.dirname(__file__), "sample_data", "sample_log.csv")
-    df = load_and_validate(sample_path)
+    fingerprint, df, quarantine = load_source(sample_path)
     source_label = "Sample Dataset (Order Processing)"
     st.sidebar.success("✅ Sample data loaded!")
 elif uploaded_file is not None:
     try:
-        df = load_and_validate(uploaded_file)
+        fingerprint, df, quarantine = load_source(uploaded_file)
         source_label = uploaded_file.name
         st.sidebar.success(f"✅ Loaded: {uploaded_file.name}")
     except ValueError as e:
         st.sidebar.error(str(e))
 
+if quarantine is not None and not quarantine.empty:
+    st.sidebar.warning(f"⚠️ {len(quarantine)} rows skipped — unparseable timestamps (see Raw Data tab)")
+
 # ── Landing Page ─────────────────────────────────────────────────────────────
 if df is None:
     st.markdown("""
@@ -110,13 +146,157 @@ if df is None:
     for col,icon,label in zip([c1,c2,c3],["📤","🔍","🤖"],["Upload your CSV event log","Auto KPI & bottleneck analysis","Claude AI suggestions"]):
         col.markdown(f"<div class='kpi-card'><div class='kpi-number'>{icon}</div><div class='kpi-label'>{label}</div></div>", unsafe_allow_html=True)
     st.markdown("<br><p style='text-align:center;color:#7878a0;'>← Click <b>Use Sample Dataset</b> in sidebar to try instantly</p>", unsafe_allow_html=True)
+    if trace:
+        trace.stop()
     st.stop()
 
 # ── Analysis ─────────────────────────────────────────────────────────────────
+# Memoised per dataset fingerprint, so widget reruns do not recompute anything.
 with st.spinner("🔍 Running analysis..."):
-    kpi_results    = calculate_kpis(df)
-    findings       = full_analysis(kpi_results)
-    rule_suggestions = generate_suggestions(findings, kpi_results['summary'])
+    full_kpis      = cached('kpis', fingerprint, calculate_kpis_parallel, df)
+    variant_stats  = full_kpis['variant_stats']
+
+    # Optional top-N variant filter: every view below runs on the filtered log,
+    # cached under its own dataset key.
+    variant_options = [0] + [n for n in (1, 3, 5, 10, 25) if n < len(variant_stats)]
+    top_variants = st.sidebar.selectbox(
+        "🧬 Process variants", variant_options, key="top_variants",
+        format_func=lambda n: f"All {len(variant_stats)} variants" if n == 0 else f"Top {n} variant{'s' if n > 1 else ''}",
+    )
+    if top_variants:
+        dataset     = f"{fingerprint}:top{top_variants}"
+        df          = cached('variant_filter', fingerprint, filter_top_variants, full_kpis['df_with_waiting'],
+                             full_kpis['case_stats'], top_variants, params=(top_variants,))
+        kpi_results = cached('kpis', dataset, calculate_kpis_parallel, df)
+        coverage    = variant_stats['share_pct'].head(top_variants).sum()
+        st.sidebar.caption(f"Showing {kpi_results['summary']['total_cases']} cases ({coverage:.0f}% of all)")
+    else:
+        dataset     = fingerprint
+        kpi_results = full_kpis
+
+    # Whole-span utilization stats do not depend on the resolution, so findings use 'auto';
+    # a log too long and wide for any resolution within utilization.MAX_CELLS gets none
+    util_options   = resolution_options(kpi_results['df_with_waiting']['timestamp'],
+                                        entity_count(kpi_results['df_with_waiting']))
+    utilization    = cached('utilization', dataset, utilization_from_frame, kpi_results['df_with_waiting'],
+                            params=('auto',)) if util_options else None
+    # Findings trend daily, or weekly when a daily grid would exceed trends.MAX_CELLS;
+    # a log spanning too long for either gets no rising-delay findings
+    trend_windows  = window_options(kpi_results['df_with_waiting']['timestamp'],
+                                    kpi_results['summary']['unique_activities'])
+    default_window = next((w for w in trend_windows if w != 'hourly'), None)
+    trends         = cached('trends', dataset, window_stats_from_frame, kpi_results['df_with_waiting'],
+                            default_window, 1, params=(default_window, 1)) if default_window else None
+    rank_metric    = st.session_state.get('rank_metric', 'avg_waiting_hrs')
+    findings       = cached('findings', dataset, full_analysis, kpi_results, params=(rank_metric,), metric=rank_metric,
+                            utilization=utilization, trends=trends)
+    rule_suggestions = cached('rule_suggestions', dataset, generate_suggestions, findings, kpi_results['summary'],
+                              params=(rank_metric,))
+
+# Views: a radio bar instead of st.tabs, so only the selected view's code runs
+# and charts for views that are never opened are never rendered.
+TABS = ["🔴 Bottlenecks","🔥 Heatmap","🔀 Process Map","📈 Charts","📆 Trends","🤖 AI Suggestions","⚙️ Rule Suggestions","📋 Raw Data","🔎 Case Drill-down"]
+tab1,tab2,tab3,tab4,tab5,tab6,tab7,tab8,tab9 = TABS
+active_view = st.session_state.get('view', tab1)
+
+# Start the active view's charts in the render pool now; the KPI cards and
+# tables below stream to the browser while the figures are being drawn.
+charts = {}
+if active_view == tab1:
+    charts['bottleneck_bar'] = chart_renderer.submit('bottleneck_bar', dataset, kpi_results)
+elif active_view == tab2:
+    heatmap_mode = st.session_state.get('heatmap_mode', 'auto')
+    charts['heatmap'] = chart_renderer.submit('heatmap', dataset, kpi_results,
+                                              params=(heatmap_mode,), mode=heatmap_mode)
+elif active_view == tab3:
+    charts['process_map'] = chart_renderer.submit('process_map', dataset, kpi_results)
+elif active_view == tab4:
+    charts['cycle_time'] = chart_renderer.submit('cycle_time', dataset, kpi_results)
+    charts['resource_workload'] = chart_renderer.submit('resource_workload', dataset, kpi_results)
+    util_resolution = st.session_state.get('util_resolution', 'auto')
+    if util_resolution not in util_options:  # chosen for a previous, smaller log
+        st.session_state.pop('util_resolution', None)
+        util_resolution = 'auto'
+    if util_resolution != 'auto':
+        utilization = cached('utilization', dataset, utilization_from_frame, kpi_results['df_with_waiting'],
+                             util_resolution, params=(util_resolution,))
+    if utilization is not None:
+        for chart in ('queue_timeline', 'resource_utilization'):
+            charts[chart] = chart_renderer.submit(chart, dataset, kpi_results, params=(util_resolution,),
+                                                  utilization=utilization)
+elif active_view == tab5 and default_window:
+    trend_window = st.session_state.get('trend_window', default_window)
+    if trend_window not in trend_windows:  # chosen for a previous, shorter log
+        st.session_state.pop('trend_window')
+        trend_window = default_window
+    trend_span = st.session_state.get('trend_span', 1)
+    if (trend_window, trend_span) != (default_window, 1):
+        trends = cached('trends', dataset, window_stats_from_frame, kpi_results['df_with_waiting'],
+                        trend_window, trend_span, params=(trend_window, trend_span))
+    charts['delay_trend'] = chart_renderer.submit('delay_trend', dataset, kpi_results,
+                                                  params=(trend_window, trend_span), trends=trends)
+elif active_view == tab9:
+    # The searched ids are memoised in the index, so each keystroke only narrows the last matches
+    case_lookup = cached('case_lookup', dataset, CaseIndex.from_frame, kpi_results['df_with_waiting'])
+    case_matches = case_lookup.search(st.session_state.get('drill_search', '').strip(),
+                                      st.session_state.get('drill_mode', 'substring'))
+    case_options = case_lookup.case_at(case_matches[:MAX_LISTED_MATCHES]).tolist()
+    if case_options and st.session_state.get('drill_case') not in case_options:
+        st.session_state['drill_case'] = case_options[0]
+    drill_case = st.session_state.get('drill_case') if case_options else None
+    if drill_case is not None:
+        start, end = case_lookup.bounds_of(drill_case)
+        drill_steps = case_steps(kpi_results['df_with_waiting'].iloc[start:end], kpi_results['activity_stats'])
+        charts['case_timeline'] = chart_renderer.submit('case_timeline', dataset, kpi_results, params=(drill_case,),
+                                                        case_id=drill_case, steps=drill_steps)
+
+
+def chart_png(chart):
+    """PNG bytes of a submitted chart; the wait is its own stage in the trace."""
+    with stage(f"chart:{chart}"):
+        return charts[chart].result()
+
+
+def data_explorer(index, key, filters=True):
+    """Server-side filtered, sorted and paginated table; only the visible page reaches the browser."""
+    frame = index.frame
+    query = {}
+    if filters:
+        c1,c2,c3,c4 = st.columns(4)
+        query['case_id'] = c1.text_input("Case ID", key=f"{key}_case", placeholder="exact, prefix* or *part*").strip() or None
+        query['activities'] = tuple(c2.multiselect("Activity", list(index.log.activities), key=f"{key}_activity"))
+        if index.log.has_resource:
+            query['resources'] = tuple(c3.multiselect("Resource", list(index.log.resources), key=f"{key}_resource"))
+        first, last = frame['timestamp'].min().date(), frame['timestamp'].max().date()
+        days = c4.date_input("Date range", value=(first, last), min_value=first, max_value=last, key=f"{key}_dates")
+        if isinstance(days, tuple) and len(days) == 2 and days != (first, last):
+            query['start'] = pd.Timestamp(days[0])
+            query['end'] = pd.Timestamp(days[1]) + pd.Timedelta(days=1)
+        query = {k: v for k, v in query.items() if v}
+
+    s1,s2,s3,s4 = st.columns([3,2,2,2])
+    columns = ([frame.index.name] if frame.index.name else []) + list(frame.columns)
+    sort_by = s1.selectbox("Sort by", [None] + columns, key=f"{key}_sort", format_func=lambda c: c or "Row order")
+    ascending = s2.radio("Order", ["Ascending", "Descending"], key=f"{key}_order", horizontal=True) == "Ascending"
+    page_size = s3.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                             key=f"{key}_page_size")
+    # A filtered selection is sorted once and cached, so paging through it is a slice
+    rows = None
+    if query:
+        rows = cached(f"explore:{key}", dataset, lambda: index.sorted_rows(index.query(**query), sort_by, ascending),
+                      params=(tuple(sorted(query.items())), sort_by, ascending))
+        sort_by = None
+    total = len(index) if rows is None else len(rows)
+    pages = max(-(-total // page_size), 1)
+    if st.session_state.get(f"{key}_page", 1) > pages:  # the selection shrank under the current page
+        st.session_state[f"{key}_page"] = pages
+    page = s4.number_input("Page", min_value=1, max_value=pages, key=f"{key}_page")
+    view, total, pages = index.page(rows, sort_by, ascending, page - 1, page_size)
+    st.dataframe(view.round(2), use_container_width=True, height=min(400, 35 * (len(view) + 1) + 3))
+    first_row = (page - 1) * page_size
+    st.caption(f"Rows {first_row + 1 if total else 0:,}–{first_row + len(view):,} of {total:,}"
+               + ("" if rows is None else f" matching (of {len(index):,})") + f" · page {page:,} of {pages:,}")
+
 
 summary        = kpi_results['summary']
 case_stats     = kpi_results['case_stats']
@@ -143,101 +323,228 @@ kpi_card(k6, summary['unique_activities'],          "Process Steps")
 st.markdown("<br>", unsafe_allow_html=True)
 
 # ── Tabs ─────────────────────────────────────────────────────────────────────
-tab1,tab2,tab3,tab4,tab5,tab6 = st.tabs([
-    "🔴 Bottlenecks","🔥 Heatmap","📈 Charts","🤖 AI Suggestions","⚙️ Rule Suggestions","📋 Raw Data"
-])
+view = st.radio("View", TABS, horizontal=True, label_visibility="collapsed", key="view")
 
 # Tab 1 — Bottlenecks
-with tab1:
+if view == tab1:
     st.markdown("### 🔴 Top Bottleneck Activities")
+    st.selectbox(
+        "Rank by", RANKING_METRICS, key="rank_metric",
+        format_func=metric_label,
+    )
     for _, row in findings['bottlenecks'].iterrows():
         sev = row.get('severity','Low').lower()
         st.markdown(f"""
         <div class='scard {"" if sev=="critical" else sev}'>
             <div class='stitle'>#{int(row.get('rank',0))} &nbsp; {row['activity']} &nbsp; <span class='badge-{sev}'>{row.get('severity','')}</span></div>
-            <div class='sissue'>Avg Wait: <b>{row['avg_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Max: <b>{row['max_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Std Dev: <b>{row['std_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Freq: <b>{int(row['frequency'])}</b></div>
+            <div class='sissue'>Avg Wait: <b>{row['avg_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Max: <b>{row['max_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Std Dev: <b>{row['std_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; P90: <b>{row['p90_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; P99: <b>{row['p99_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Freq: <b>{int(row['frequency'])}</b></div>
         </div>""", unsafe_allow_html=True)
     st.markdown("---")
     st.markdown("### 📊 All Activities — Waiting Time")
-    st.image(plot_bottleneck_bar(activity_stats), use_container_width=True)
+    st.image(chart_png('bottleneck_bar'), use_container_width=True)
     if not findings['inconsistent_steps'].empty:
         st.markdown("### ⚠️ Inconsistent Steps")
         st.dataframe(findings['inconsistent_steps'][['activity','avg_waiting_hrs','std_waiting_hrs','max_waiting_hrs']].round(2), use_container_width=True)
     if not findings['single_resource_risk'].empty:
         st.markdown("### 🔺 Single Resource Risk")
         st.dataframe(findings['single_resource_risk'], use_container_width=True)
+    if not findings['rising_delays'].empty:
+        st.markdown("### 📈 Rising Delays")
+        st.caption(f"Daily waiting time trending up by {RISING_MIN_CHANGE_PCT}% or more over the last "
+                   f"{TREND_LOOKBACK} days — see the Trends view.")
+        st.dataframe(findings['rising_delays'].drop(columns='rising').round(2), use_container_width=True)
+    if not findings['overloaded_resources'].empty:
+        st.markdown("### 🏋️ Overloaded Resources")
+        st.caption(f"Resources with open work for at least {OVERLOAD_UTILIZATION_PCT}% of the log span.")
+        st.dataframe(findings['overloaded_resources'].round(2), use_container_width=True)
 
 # Tab 2 — Heatmap
-with tab2:
+if view == tab2:
     st.markdown("### 🔥 Delay Heatmap")
-    st.image(plot_heatmap(df_waiting), use_container_width=True)
+    st.selectbox(
+        "Heatmap mode", HEATMAP_MODES, key="heatmap_mode",
+        format_func=lambda m: {'auto': 'Auto (by log size)', 'full': 'Every case', 'top': 'Top worst cases',
+                               'quantile': 'Case percentile buckets', 'time': 'Case start-time buckets'}[m],
+    )
+    st.image(chart_png('heatmap'), use_container_width=True)
 
-# Tab 3 — Charts
-with tab3:
+# Tab 3 — Process Map
+if view == tab3:
+    st.markdown("### 🔀 Process Map — Directly-Follows Transitions")
+    st.caption("Each waiting time is attributed to the transition it follows (previous activity → activity), "
+               "so the same step reached through different paths is measured separately.")
+    buf = chart_png('process_map')
+    if buf:
+        st.image(buf, use_container_width=True)
+    else:
+        st.info("No transitions found — every case has a single event.")
+    if not findings['transition_bottlenecks'].empty:
+        st.markdown("### 🐢 Slowest Transitions")
+        for _, row in findings['transition_bottlenecks'].iterrows():
+            sev = row['severity'].lower()
+            st.markdown(f"""
+            <div class='scard {"" if sev=="critical" else sev}'>
+                <div class='stitle'>#{int(row['rank'])} &nbsp; {row['source']} → {row['target']} &nbsp; <span class='badge-{sev}'>{row['severity']}</span></div>
+                <div class='sissue'>Avg Wait: <b>{row['avg_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; P90: <b>{row['p90_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Max: <b>{row['max_waiting_hrs']:.2f}h</b> &nbsp;|&nbsp; Freq: <b>{int(row['frequency'])}</b></div>
+            </div>""", unsafe_allow_html=True)
+    st.markdown("### 📋 All Transitions")
+    st.dataframe(kpi_results['transition_stats'].round(2), use_container_width=True)
+
+# Tab 4 — Charts
+if view == tab4:
     c1,c2 = st.columns(2)
     with c1:
         st.markdown("### 📊 Cycle Time Distribution")
-        st.image(plot_cycle_time_distribution(case_stats), use_container_width=True)
+        st.image(chart_png('cycle_time'), use_container_width=True)
     with c2:
         st.markdown("### 👤 Resource Workload")
-        buf = plot_resource_workload(df_waiting)
+        buf = chart_png('resource_workload')
         if buf:
             st.image(buf, use_container_width=True)
         else:
             st.info("No resource column found.")
     st.markdown("---")
+    st.markdown("### ⏳ Queues & Utilization Over Time")
+if view == tab4 and utilization is None:
+    st.info("The log spans too long, across too many activities or resources, to chart queues even by month.")
+elif view == tab4:
+    st.selectbox(
+        "Time resolution", util_options, key="util_resolution",
+        format_func=lambda r: f"Auto ({utilization['resolution']})" if r == 'auto' else r,
+    )
+    buf = chart_png('queue_timeline')
+    if buf:
+        st.image(buf, use_container_width=True)
+    else:
+        st.info("No waiting intervals found — every case has a single event.")
+    buf = chart_png('resource_utilization')
+    if buf:
+        st.image(buf, use_container_width=True)
+    c1,c2 = st.columns(2)
+    with c1:
+        st.markdown("#### Activity Queues")
+        st.dataframe(utilization['activity_queue_stats'].round(2), use_container_width=True)
+    with c2:
+        if utilization['resource_utilization_stats'] is not None:
+            st.markdown("#### Resource Utilization")
+            st.dataframe(utilization['resource_utilization_stats'].round(2), use_container_width=True)
+if view == tab4:
+    st.markdown("---")
     st.markdown("### 📋 Case-Level Summary")
-    d = case_stats.copy().reset_index()
-    d['cycle_time_hrs'] = d['cycle_time_hrs'].round(2)
-    st.dataframe(d, use_container_width=True)
+    data_explorer(cached('case_index', dataset, TableIndex, case_stats), "cases", filters=False)
+    st.markdown("### 🧬 Process Variants")
+    st.caption("Cases grouped by their exact sequence of activities; variant 1 is the most common path.")
+    st.dataframe(variant_stats.round(2), use_container_width=True, hide_index=True)
+
+# Tab 5 — Trends
+if view == tab5 and not default_window:
+    st.markdown("### 📆 Bottleneck Trends Over Time")
+    st.info("The log spans too long to trend even by week.")
+elif view == tab5:
+    st.markdown("### 📆 Bottleneck Trends Over Time")
+    c1,c2 = st.columns(2)
+    c1.selectbox("Window", trend_windows, index=trend_windows.index(default_window),
+                 key="trend_window", format_func=str.capitalize)
+    c2.selectbox(
+        "Sliding over", [1, 2, 4, 7, 12, 24], key="trend_span",
+        format_func=lambda n: "Tumbling (no overlap)" if n == 1 else f"Last {n} windows",
+    )
+    buf = chart_png('delay_trend')
+    if buf:
+        st.image(buf, use_container_width=True)
+    else:
+        st.info("No activities with waiting times to trend.")
+    st.markdown(f"### 📈 Delay Trend — Last {TREND_LOOKBACK} Windows")
+    st.caption(f"Slope of mean wait per window, weighted by event count; activities rising by "
+               f"{RISING_MIN_CHANGE_PCT}% or more are flagged. An incomplete last window is left out.")
+    st.dataframe(trends['trend'].round(2), use_container_width=True)
+    st.markdown("### 🚚 Throughput per Window")
+    st.dataframe(trends['throughput'].round(2), use_container_width=True)
 
-# Tab 4 — AI Suggestions
-with tab4:
+# Tab 6 — AI Suggestions
+if view == tab6:
     st.markdown("### 🤖 AI-Powered Suggestions")
     st.markdown("<span class='ai-badge'>✦ POWERED BY CLAUDE AI</span>", unsafe_allow_html=True)
     st.markdown("")
 
+    def render_exec_summary(text):
+        st.markdown(f"""
+        <div class='exec-box'>
+            <div style='font-family:Space Mono,monospace;color:#a855f7;font-size:0.78rem;letter-spacing:2px;margin-bottom:10px;'>✦ EXECUTIVE SUMMARY</div>
+            <p>{text}</p>
+        </div>""", unsafe_allow_html=True)
+
+    def render_ai_card(s):
+        sev    = s.get('severity','Low')
+        stype  = s.get('type','')
+        lean   = s.get('lean_principle','')
+        impact = s.get('expected_impact','')
+        type_badge = ""
+        if stype == "Quick Win":
+            type_badge = "<span class='badge-quickwin'>⚡ Quick Win</span>"
+        elif stype == "Strategic":
+            type_badge = "<span class='badge-strategic'>🎯 Strategic</span>"
+        st.markdown(f"""
+        <div class='scard ai'>
+            <div class='stitle'>{s.get('activity','')} &nbsp; <span class='badge-{sev.lower()}'>{sev}</span> &nbsp; {type_badge}</div>
+            <div class='sissue'>{s.get('issue','')}</div>
+            <div class='stext'>{s.get('suggestion','')}</div>
+            {"<div class='simpact'>💚 " + impact + "</div>" if impact else ""}
+            {"<div><span class='lean-tag'>📐 " + lean + "</span></div>" if lean else ""}
+        </div>""", unsafe_allow_html=True)
+
+    def render_ai_stats(ai_result):
+        prompt_stats = ai_result.get('prompt_stats')
+        stream_stats = ai_result.get('stream_stats')
+        parts = []
+        if prompt_stats:
+            parts.append(f"Prompt: {prompt_stats['activities_listed']} of {prompt_stats['activities_total']} activities "
+                         f"listed · ~{prompt_stats['estimated_tokens']:,} tokens "
+                         f"(~{prompt_stats['tokens_saved']:,} saved by compaction)")
+        if stream_stats and stream_stats.get('first_suggestion_s') is not None:
+            parts.append(f"first suggestion after {stream_stats['first_suggestion_s']:.1f}s, "
+                         f"complete after {stream_stats['total_s']:.1f}s")
+        if parts:
+            st.caption(" · ".join(parts))
+        if ai_result.get('truncated'):
+            st.warning("The AI response was cut off; showing the suggestions that arrived complete.")
+
     if st.button("✦ Generate AI Suggestions", use_container_width=False):
-        with st.spinner("🤖 Claude AI is analyzing your process..."):
-            try:
-                ai_result = get_ai_suggestions(kpi_results, findings)
-                st.session_state['ai_result'] = ai_result
-                st.success("✅ AI analysis complete!")
-            except Exception as e:
-                st.error(f"❌ Error: {str(e)}")
-
-    if 'ai_result' in st.session_state:
+        # Stream the reply: the summary and each card appear as soon as they
+        # are complete instead of after the whole response.
+        st.session_state.pop('ai_result', None)
+        status = st.empty()
+        status.info("🤖 Claude AI is analyzing your process...")
+        summary_slot = st.empty()
+        cards = st.container()
+        try:
+            for kind, value in stream_ai_suggestions(kpi_results, findings):
+                if kind == 'summary':
+                    with summary_slot.container():
+                        render_exec_summary(value)
+                elif kind == 'suggestion':
+                    with cards:
+                        render_ai_card(value)
+                elif kind == 'done':
+                    st.session_state['ai_result'] = value
+            status.success("✅ AI analysis complete!")
+            render_ai_stats(st.session_state['ai_result'])
+        except Exception as e:
+            status.error(f"❌ Error: {str(e)}")
+
+    elif 'ai_result' in st.session_state:
         ai_result = st.session_state['ai_result']
+        render_ai_stats(ai_result)
 
         if 'executive_summary' in ai_result:
-            st.markdown(f"""
-            <div class='exec-box'>
-                <div style='font-family:Space Mono,monospace;color:#a855f7;font-size:0.78rem;letter-spacing:2px;margin-bottom:10px;'>✦ EXECUTIVE SUMMARY</div>
-                <p>{ai_result['executive_summary']}</p>
-            </div>""", unsafe_allow_html=True)
+            render_exec_summary(ai_result['executive_summary'])
 
         sev_order = {'Critical':0,'High':1,'Medium':2,'Low':3}
         for s in sorted(ai_result.get('suggestions',[]), key=lambda x: sev_order.get(x.get('severity','Low'),4)):
-            sev    = s.get('severity','Low')
-            stype  = s.get('type','')
-            lean   = s.get('lean_principle','')
-            impact = s.get('expected_impact','')
-            type_badge = ""
-            if stype == "Quick Win":
-                type_badge = "<span class='badge-quickwin'>⚡ Quick Win</span>"
-            elif stype == "Strategic":
-                type_badge = "<span class='badge-strategic'>🎯 Strategic</span>"
-            st.markdown(f"""
-            <div class='scard ai'>
-                <div class='stitle'>{s.get('activity','')} &nbsp; <span class='badge-{sev.lower()}'>{sev}</span> &nbsp; {type_badge}</div>
-                <div class='sissue'>{s.get('issue','')}</div>
-                <div class='stext'>{s.get('suggestion','')}</div>
-                {"<div class='simpact'>💚 " + impact + "</div>" if impact else ""}
-                {"<div><span class='lean-tag'>📐 " + lean + "</span></div>" if lean else ""}
-            </div>""", unsafe_allow_html=True)
+            render_ai_card(s)
 
-# Tab 5 — Rule Suggestions
-with tab5:
+# Tab 7 — Rule Suggestions
+if view == tab7:
     st.markdown("### ⚙️ Rule-Based Suggestions")
     st.caption("Fixed logic rules — shown for comparison with AI suggestions above.")
     sev_order = {'Critical':0,'High':1,'Medium':2,'Low':3}
@@ -250,14 +557,76 @@ with tab5:
             <div class='stext'>{s['suggestion']}</div>
         </div>""", unsafe_allow_html=True)
 
-# Tab 6 — Raw Data
-with tab6:
+# Tab 8 — Raw Data
+if view == tab8:
     st.markdown("### 📋 Raw Event Log")
-    st.dataframe(df, use_container_width=True, height=400)
+    data_explorer(cached('log_index', dataset, LogIndex, df_waiting), "events")
+    if quarantine is not None and not quarantine.empty:
+        st.markdown("### 🚫 Quarantined Rows")
+        st.caption("Rows skipped during loading because their timestamp could not be parsed.")
+        st.dataframe(quarantine, use_container_width=True)
     st.markdown("### 📊 Activity Statistics")
     st.dataframe(activity_stats.round(2), use_container_width=True)
 
+# Tab 9 — Case Drill-down
+if view == tab9:
+    st.markdown("### 🔎 Case Drill-down")
+    c1,c2 = st.columns([3,1])
+    c1.text_input("Search case IDs", key="drill_search", placeholder="any part of a case ID (not case-sensitive)")
+    c2.radio("Match", ["substring", "prefix"], key="drill_mode", horizontal=True)
+    listed = f" — showing the first {MAX_LISTED_MATCHES}" if len(case_matches) > MAX_LISTED_MATCHES else ""
+    st.caption(f"{len(case_matches):,} of {len(case_lookup):,} cases match{listed}")
+    if drill_case is None:
+        st.info("No case ID matches the search.")
+    else:
+        st.selectbox("Case", case_options, key="drill_case")
+        case = case_stats.iloc[case_lookup.position_of(drill_case)]
+        variant = kpi_results['variant_stats'].iloc[int(case['variant_id']) - 1]
+        k1,k2,k3,k4,k5 = st.columns(5)
+        kpi_card(k1, int(case['num_activities']), "Events")
+        kpi_card(k2, f"{case['cycle_time_hrs']:.1f}h", "Cycle Time")
+        kpi_card(k3, f"{drill_steps['waiting_time_hrs'].max():.1f}h", "Longest Wait")
+        kpi_card(k4, f"#{int(case['variant_id'])}", "Variant")
+        kpi_card(k5, f"{variant['share_pct']:.1f}%", "Cases on Variant")
+        st.caption(f"{case['start_time']} → {case['end_time']} · variant {int(case['variant_id'])} of "
+                   f"{len(kpi_results['variant_stats']):,}: {' → '.join(drill_steps['activity'].astype(str))}")
+        st.image(chart_png('case_timeline'), use_container_width=True)
+        st.markdown("#### Steps")
+        st.caption("Each step's wait is the time since the previous step; vs_avg_hrs compares it with the "
+                   "activity's average wait.")
+        st.dataframe(drill_steps.round(2), use_container_width=True, hide_index=True)
+
 # ── Export ───────────────────────────────────────────────────────────────────
+# A callable download (Streamlit >= 1.52) defers building the file to the click
 st.markdown("---")
-csv_data = export_summary_csv(kpi_results, findings, rule_suggestions)
-st.download_button("⬇ Download Full Report (CSV)", data=csv_data, file_name="bottleneck_report.csv", mime="text/csv")
+c1,c2 = st.columns([3,1])
+export = c1.selectbox("Export", list(EXPORTS), key="export", format_func=lambda e: EXPORTS[e][0],
+                      label_visibility="collapsed")
+export_label, export_name, export_mime, _ = EXPORTS[export]
+
+
+def export_file():
+    """The chosen export streamed to a temporary file; runs only when the download is clicked."""
+    out = tempfile.TemporaryFile(buffering=0)
+    write_report(export, out, kpi_results, findings, rule_suggestions)
+    out.seek(0)
+    return out
+
+
+c2.download_button("⬇ Download", data=export_file, file_name=export_name, mime=export_mime)
+
+cache_stats = pipeline_cache.stats()
+st.sidebar.caption(
+    f"Cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+    f"{cache_stats['entries']} entries · {cache_stats['bytes'] / 1024 ** 2:.1f} MB"
+)
+
+# ── Diagnostics ──────────────────────────────────────────────────────────────
+if trace:
+    trace.stop()
+    with st.expander(f"🩺 Diagnostics — {trace.wall_s:.2f}s this run", expanded=True):
+        st.caption("Every pipeline stage of this run, nested by call. Cached stages show cache=hit and cost "
+                   "nothing; charts render in worker processes, so their rows time the wait for the image.")
+        st.dataframe(trace.to_frame(), use_container_width=True, hide_index=True)
+        st.download_button("⬇ Download trace (JSON)", data=trace.to_json(), file_name="trace.json",
+                           mime="application/json")
@@ -0,0 +1,203 @@
+"""Scaling benchmark: python benchmark.py --events 1000 100000 1000000
+
+Generates seeded synthetic logs (synthetic.py), times and memory-profiles
+every pipeline stage on each, and appends one JSON line per stage to a
+history file. Each run is compared with earlier runs of the same stage and
+size on the same machine so slow-downs show up as regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+
+from processor import load_and_validate, calculate_kpis
+from analyzer import full_analysis
+from suggester import generate_suggestions
+from reporter import export_summary_csv
+from synthetic import write_log
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_HISTORY = os.path.join('benchmarks', 'history.jsonl')
+# A stage regresses when it is this much slower than the median of its last
+# REGRESSION_WINDOW runs, and by more than the timer-noise floor.
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.05
+REGRESSION_WINDOW = 5
+
+PLOTS = ['plot_bottleneck_bar', 'plot_heatmap', 'plot_process_map',
+         'plot_cycle_time_distribution', 'plot_resource_workload']
+
+
+def pipeline_stages(path, charts=True):
+    """(name, fn) per stage; each fn takes the outputs of the stages before it."""
+    stages = [
+        ('load_and_validate', lambda out: load_and_validate(path)),
+        ('calculate_kpis', lambda out: calculate_kpis(out['load_and_validate'])),
+        ('full_analysis', lambda out: full_analysis(out['calculate_kpis'])),
+        ('generate_suggestions', lambda out: generate_suggestions(
+            out['full_analysis'], out['calculate_kpis']['summary'])),
+    ]
+    if charts:
+        import visualizer as viz  # matplotlib only when plots are benchmarked
+
+        plot_args = {
+            'plot_bottleneck_bar': lambda k: (k['activity_stats'],),
+            'plot_heatmap': lambda k: (k['df_with_waiting'],),
+            'plot_process_map': lambda k: (k['transition_stats'], k['activity_stats']['activity']),
+            'plot_cycle_time_distribution': lambda k: (k['case_stats'],),
+            'plot_resource_workload': lambda k: (k['df_with_waiting'],),
+        }
+        for name in PLOTS:
+            plot = getattr(viz, name)
+            stages.append((name, lambda out, plot=plot, args=plot_args[name]:
+                           plot(*args(out['calculate_kpis']))))
+    stages.append(('export_summary_csv', lambda out: export_summary_csv(
+        out['calculate_kpis'], out['full_analysis'], out['generate_suggestions'])))
+    return stages
+
+
+def measure(fn, repeats=1, memory=True):
+    """(result, best wall seconds, peak traced MB) of fn().
+
+    Timing runs are untraced; the peak allocation comes from one extra run
+    under tracemalloc (numpy reports its buffers to it), so tracing overhead
+    never inflates the times.
+    """
+    best = float('inf')
+    for _ in range(max(repeats, 1)):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+    return result, best, peak_mb
+
+
+def _rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def environment():
+    """Fields identifying the code and machine a run belongs to."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'commit': commit or None,
+        'machine': f'{platform.node()}/{platform.machine()}/{os.cpu_count()}cpu',
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def run_size(n_events, seed=0, repeats=1, memory=True, charts=True, data_dir=None):
+    """Benchmark every stage on one synthetic log; returns a row per stage."""
+    with tempfile.TemporaryDirectory(dir=data_dir) as tmp:
+        path = os.path.join(tmp, f'synthetic_{n_events}_{seed}.csv')
+        events = write_log(path, n_events=n_events, seed=seed)
+        outputs, rows = {}, []
+        for name, fn in pipeline_stages(path, charts):
+            outputs[name], seconds, peak_mb = measure(lambda: fn(outputs), repeats, memory)
+            rss_mb = _rss_mb()
+            rows.append({
+                'stage': name,
+                'events': events,
+                'target_events': n_events,
+                'seconds': round(seconds, 4),
+                'events_per_sec': round(events / seconds) if seconds > 0 else None,
+                'peak_alloc_mb': None if peak_mb is None else round(peak_mb, 1),
+                'max_rss_mb': None if rss_mb is None else round(rss_mb, 1),
+            })
+    return rows
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def append_history(path, records):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as fh:
+        for record in records:
+            fh.write(json.dumps(record) + '\n')
+
+
+def find_regressions(history, records, ratio=REGRESSION_RATIO, min_seconds=REGRESSION_MIN_SECONDS,
+                     window=REGRESSION_WINDOW):
+    """Records slower than the median of the same stage/size/machine's last `window` runs."""
+    previous = {}
+    for h in history:
+        previous.setdefault((h['machine'], h['target_events'], h['stage']), []).append(h['seconds'])
+    regressions = []
+    for r in records:
+        past = previous.get((r['machine'], r['target_events'], r['stage']), [])[-window:]
+        if not past:
+            continue
+        baseline = statistics.median(past)
+        if r['seconds'] > baseline * ratio and r['seconds'] - baseline > min_seconds:
+            regressions.append({**r, 'baseline_seconds': baseline,
+                                'ratio': round(r['seconds'] / baseline, 2)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory-profile each pipeline stage on synthetic logs.')
+    parser.add_argument('--events', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='log sizes in events (default: 10^3 .. 10^6)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=1, help='timing runs per stage; the best is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced memory run')
+    parser.add_argument('--no-charts', action='store_true', help='skip the visualizer plots')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help=f'JSONL history file (default: {DEFAULT_HISTORY})')
+    parser.add_argument('--data-dir', help='where to write the temporary synthetic CSVs')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit 1 if any stage regressed')
+    args = parser.parse_args(argv)
+
+    run = {'run_id': datetime.now(timezone.utc).isoformat(timespec='seconds'), **environment()}
+    records = []
+    for n_events in args.events:
+        for row in run_size(n_events, args.seed, args.repeats, not args.no_memory,
+                            not args.no_charts, args.data_dir):
+            records.append({**run, **row})
+            print(f"{row['events']:>12,}  {row['stage']:<30} {row['seconds']:>9.3f}s  "
+                  f"{row['peak_alloc_mb'] if row['peak_alloc_mb'] is not None else '-':>8} MB")
+
+    regressions = find_regressions(load_history(args.history), records)
+    append_history(args.history, records)
+    print(f'{len(records)} results appended to {args.history}')
+    for r in regressions:
+        print(f"REGRESSION {r['stage']} @ {r['target_events']:,} events: "
+              f"{r['seconds']:.3f}s vs median {r['baseline_seconds']:.3f}s (x{r['ratio']})", file=sys.stderr)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
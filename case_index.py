@@ -0,0 +1,199 @@
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+from eventlog import EventLog
+from profiling import profiled
+from rules import severity_of
+
+SEARCH_MEMO_SIZE = 64
+MIN_GRAM = 3
+MAX_LISTED_MATCHES = 200  # search matches offered for drill-down
+
+
+def concat_ranges(starts, ends):
+    """Concatenation of np.arange(s, e) over paired non-empty bounds, without a Python loop."""
+    lengths = ends - starts
+    if not len(lengths):
+        return np.zeros(0, dtype=np.int64)
+    steps = np.ones(int(lengths.sum()), dtype=np.int64)
+    steps[0] = starts[0]
+    steps[np.cumsum(lengths)[:-1]] = starts[1:] - ends[:-1] + 1
+    return np.cumsum(steps)
+
+
+def _trigram_codes(keys):
+    """(n, width - 2) int32 codes of every byte trigram in a fixed-width bytes array (-1 past the end)."""
+    width = keys.dtype.itemsize
+    if width < MIN_GRAM:
+        return np.zeros((len(keys), 0), dtype=np.int32)
+    b = keys.view(np.uint8).reshape(len(keys), width).astype(np.int32)
+    codes = (b[:, :-2] << 16) | (b[:, 1:-1] << 8) | b[:, 2:]
+    codes[b[:, 2:] == 0] = -1  # trigram runs into the NUL padding
+    return codes
+
+
+class CaseIndex:
+    """case_id → (start, end) row range of a (case_id, timestamp)-sorted log, plus case ID search.
+
+    Lookups hash the id to its dictionary code and read the range from the
+    case offsets: O(1) per case. Search is case-insensitive; prefix search is
+    a binary search over the lower-cased ids in sorted order, substring search
+    reads candidates off a trigram index and verifies only those. Each
+    structure is built on the first search that needs it. Results of recent
+    searches are memoised, and a search that extends an earlier one (the next
+    keystroke) only re-checks that one's matches.
+    """
+
+    def __init__(self, log):
+        self.case_ids = log.case_ids
+        starts = log.case_starts
+        self.start_codes = log.case_codes[starts]
+        self.bounds = np.append(starts, len(log))
+        # Dictionary code → case position (-1 for ids without rows)
+        self.position = np.full(len(log.case_ids), -1, dtype=np.int64)
+        self.position[self.start_codes] = np.arange(len(starts))
+        self._keys = None
+        self._sorted_keys = self._by_key = None
+        self._grams = None
+        self._memo = OrderedDict()
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(EventLog.from_frame(df))
+
+    def __len__(self):
+        return len(self.start_codes)
+
+    def __contains__(self, case_id):
+        return self.position_of(case_id) >= 0
+
+    def __sizeof__(self):
+        arrays = [self.start_codes, self.bounds, self.position, self._keys, self._sorted_keys, self._by_key]
+        if self._grams is not None:
+            arrays += list(self._grams)
+        return object.__sizeof__(self) + sum(a.nbytes for a in arrays if a is not None)
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+    def position_of(self, case_id):
+        """Case position of an id; -1 if it has no events."""
+        try:
+            code = self.case_ids.get_loc(case_id)
+        except (KeyError, TypeError):
+            try:
+                code = self.case_ids.get_loc(pd.Series([case_id]).astype(self.case_ids.dtype).iloc[0])
+            except (KeyError, TypeError, ValueError):
+                return -1
+        return int(self.position[code])
+
+    def bounds_of(self, case_id):
+        """(start, end) rows of a case; KeyError if it has no events."""
+        pos = self.position_of(case_id)
+        if pos < 0:
+            raise KeyError(case_id)
+        return int(self.bounds[pos]), int(self.bounds[pos + 1])
+
+    def case_at(self, positions):
+        """Case ids at case positions."""
+        return self.case_ids.take(self.start_codes[positions])
+
+    def rows(self, positions):
+        """Ascending rows of the cases at the given (ascending) positions."""
+        positions = np.asarray(positions, dtype=np.int64)
+        return concat_ranges(self.bounds[positions], self.bounds[positions + 1])
+
+    # ── Search ───────────────────────────────────────────────────────────────
+    def _search_keys(self):
+        """Lower-cased UTF-8 ids by case position, as fixed-width bytes."""
+        if self._keys is None:
+            ids = pd.Series(self.case_at(np.arange(len(self))), dtype=object).astype(str)
+            self._keys = np.array(ids.str.lower().str.encode('utf-8').tolist(), dtype=bytes)
+        return self._keys
+
+    def _trigram_index(self):
+        """CSR postings: sorted distinct trigram codes, offsets, and ascending case positions per trigram."""
+        if self._grams is None:
+            codes = np.sort(_trigram_codes(self._search_keys()), axis=1)
+            # A trigram repeated inside one id is posted once
+            keep = codes >= 0
+            keep[:, 1:] &= codes[:, 1:] != codes[:, :-1]
+            positions = np.repeat(np.arange(len(codes), dtype=np.int32), codes.shape[1])[keep.ravel()]
+            codes = codes[keep]
+            order = np.argsort(codes, kind='stable')
+            positions = positions[order]
+            grams, counts = np.unique(codes[order], return_counts=True)
+            offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._grams = (grams, offsets, positions)
+        return self._grams
+
+    def _postings(self, gram):
+        grams, offsets, positions = self._trigram_index()
+        at = np.searchsorted(grams, gram)
+        if at == len(grams) or grams[at] != gram:
+            return positions[:0]
+        return positions[offsets[at]:offsets[at + 1]]
+
+    def _substring(self, needle, within=None):
+        """Positions among `within` (all when None) whose key contains needle."""
+        keys = self._search_keys()
+        if len(needle) >= MIN_GRAM:
+            b = np.frombuffer(needle, dtype=np.uint8).astype(np.int32)
+            query = np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+            lists = sorted((self._postings(g) for g in query), key=len)
+            if within is None or len(lists[0]) < len(within):
+                within = lists[0]
+                for other in lists[1:4]:  # a few more lists prune most false positives cheaply
+                    if not len(within):
+                        break
+                    within = within[np.isin(within, other, assume_unique=True)]
+        if within is None:
+            return np.flatnonzero(np.char.find(keys, needle) >= 0)
+        return within[np.char.find(keys[within], needle) >= 0].astype(np.int64)
+
+    @profiled()
+    def search(self, text, mode='substring'):
+        """Ascending case positions whose id contains (or, mode='prefix', starts with) text; any case."""
+        needle = str(text).lower().encode('utf-8')
+        key = (mode, needle)
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        if not needle:
+            found = np.arange(len(self))
+        elif mode == 'prefix':
+            self._prefix_order()
+            lo, hi = np.searchsorted(self._sorted_keys, [needle, needle + b'\xff'])
+            found = np.sort(self._by_key[lo:hi])
+        else:
+            # An extension of an earlier search (the next keystroke) only re-checks that one's matches
+            earlier = [found for (m, n), found in self._memo.items() if m == mode and n and n in needle]
+            found = self._substring(needle, min(earlier, key=len) if earlier else None)
+        self._memo[key] = found
+        if len(self._memo) > SEARCH_MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return found
+
+    def _prefix_order(self):
+        """Ids sorted lower-cased, with their case positions (ids themselves sort case-sensitively)."""
+        if self._by_key is None:
+            keys = self._search_keys()
+            self._by_key = np.argsort(keys, kind='stable')
+            self._sorted_keys = keys[self._by_key]
+
+
+def case_steps(events, activity_stats):
+    """Per-step frame of one case's (time-ordered) rows from calculate_kpis' df_with_waiting.
+
+    Each step's wait is the time since the previous step; vs_avg_hrs compares
+    it with its activity's average wait over the whole log.
+    """
+    steps = events.drop(columns='case_id').reset_index(drop=True)
+    steps.insert(0, 'step', np.arange(1, len(steps) + 1))
+    steps['elapsed_hrs'] = (steps['timestamp'] - steps['timestamp'].iloc[0]).dt.total_seconds() / 3600
+    steps['severity'] = severity_of(steps['waiting_time_hrs'])
+    avg = activity_stats.set_index('activity')['avg_waiting_hrs']
+    steps['vs_avg_hrs'] = steps['waiting_time_hrs'] - steps['activity'].map(avg).astype(np.float64)
+    steps.loc[0, ['severity', 'vs_avg_hrs']] = None  # the first step has nothing to wait for
+    return steps
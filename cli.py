@@ -0,0 +1,254 @@
+"""Headless batch analysis: python cli.py sample_data/ -o reports/
+
+Analyses every log given (files, directories or glob patterns) in a worker
+pool, writes one report per log (plus any --export tables, streamed in
+chunks) and a consolidated summary.csv, and exits
+with a machine-readable status code. Plotting libraries are imported only
+when --charts is given.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from processor import load_and_validate, calculate_kpis
+from analyzer import full_analysis, RANKING_METRICS
+from suggester import generate_suggestions
+from reporter import EXPORTS, export_summary_csv, write_report
+
+EXIT_OK = 0          # every log analysed, nothing at or above --fail-on
+EXIT_FAILED = 1      # at least one log could not be read or analysed
+EXIT_USAGE = 2       # bad arguments or no input logs found
+EXIT_FINDINGS = 3    # every log analysed, but a bottleneck reached --fail-on
+
+LOG_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+SEVERITIES = ['Low', 'Medium', 'High', 'Critical']
+CHARTS = ['bottleneck_bar', 'heatmap', 'process_map', 'cycle_time', 'resource_workload']
+
+SUMMARY_COLUMNS = [
+    'file', 'status', 'error', 'rows', 'total_cases', 'unique_activities',
+    'avg_cycle_time_hrs', 'avg_waiting_time_hrs', 'top_bottleneck', 'top_severity',
+    'report', 'ai_report', 'wall_s', 'cpu_s', 'peak_rss_mb',
+]
+
+
+def find_logs(inputs):
+    """Expand files, directories and glob patterns into a sorted, de-duplicated list of logs."""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = glob.glob(os.path.join(item, '*'))
+        elif any(ch in item for ch in '*?['):
+            candidates = glob.glob(item, recursive=True)
+        else:
+            # Named explicitly: kept even if missing, so it is reported as failed
+            found.add(os.path.normpath(item))
+            continue
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(LOG_EXTENSIONS):
+                found.add(os.path.normpath(path))
+    return sorted(found)
+
+
+def report_stems(logs):
+    """Output file stem per log; logs sharing a file name are prefixed with their directory."""
+    names = [os.path.splitext(os.path.basename(p))[0] for p in logs]
+    stems = {}
+    for path, name in zip(logs, names):
+        if names.count(name) > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            name = f'{parent}_{name}'
+        stems[path] = name
+    return stems
+
+
+def _reset_peak_rss():
+    """Restart this process's peak-RSS count (Linux only); False where it cannot be reset."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _usage():
+    """(cpu seconds, peak RSS in MB) of this process so far."""
+    if resource is None:
+        return time.process_time(), float('nan')
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / scale
+
+
+def _write_charts(kpi_results, out_dir, stem):
+    import visualizer as viz  # only when charts are requested
+
+    renders = {
+        'bottleneck_bar': lambda: viz.plot_bottleneck_bar(kpi_results['activity_stats']),
+        'heatmap': lambda: viz.plot_heatmap(kpi_results['df_with_waiting']),
+        'process_map': lambda: viz.plot_process_map(kpi_results['transition_stats'],
+                                                    kpi_results['activity_stats']['activity']),
+        'cycle_time': lambda: viz.plot_cycle_time_distribution(kpi_results['case_stats']),
+        'resource_workload': lambda: viz.plot_resource_workload(kpi_results['df_with_waiting']),
+    }
+    for name in CHARTS:
+        buf = renders[name]()
+        if buf is not None:
+            with open(os.path.join(out_dir, f'{stem}_{name}.png'), 'wb') as fh:
+                fh.write(buf.getvalue())
+
+
+def _write_ai_suggestions(kpi_results, findings, out_dir, stem):
+    """AI suggestions JSON path, or 'failed: ...' (AI problems never fail the log)."""
+    from ai_suggester import get_ai_suggestions  # only when --ai is given
+
+    try:
+        result = get_ai_suggestions(kpi_results, findings)
+    except Exception as e:
+        return f'failed: {type(e).__name__}: {e}'
+    path = os.path.join(out_dir, f'{stem}_ai.json')
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(result, fh, indent=2)
+    return path
+
+
+def analyze_log(path, out_dir, stem=None, metric='avg_waiting_hrs', charts=False, ai=False, exports=()):
+    """Analyse one log and write its report; returns a summary row (never raises)."""
+    wall0 = time.perf_counter()
+    # Workers analyse many logs in turn, so the peak is only this file's once reset
+    per_file_peak = _reset_peak_rss()
+    cpu0, _ = _usage()
+    stem = stem or os.path.splitext(os.path.basename(path))[0]
+    row = {'file': path, 'status': 'ok', 'error': ''}
+    try:
+        df = load_and_validate(path)
+        kpi_results = calculate_kpis(df)
+        findings = full_analysis(kpi_results, metric=metric)
+        suggestions = generate_suggestions(findings, kpi_results['summary'])
+
+        report = os.path.join(out_dir, f'{stem}_report.csv')
+        with open(report, 'w', newline='', encoding='utf-8') as fh:
+            fh.write(export_summary_csv(kpi_results, findings, suggestions))
+        for export in exports:
+            with open(os.path.join(out_dir, f'{stem}_{EXPORTS[export][1]}'), 'wb') as fh:
+                write_report(export, fh, kpi_results, findings, suggestions)
+        if charts:
+            _write_charts(kpi_results, out_dir, stem)
+        if ai:
+            row['ai_report'] = _write_ai_suggestions(kpi_results, findings, out_dir, stem)
+
+        summary = kpi_results['summary']
+        bottlenecks = findings['bottlenecks']
+        row.update({
+            'rows': len(df),
+            'total_cases': summary['total_cases'],
+            'unique_activities': summary['unique_activities'],
+            'avg_cycle_time_hrs': summary['avg_cycle_time_hrs'],
+            'avg_waiting_time_hrs': summary['avg_waiting_time_hrs'],
+            'top_bottleneck': str(bottlenecks['activity'].iloc[0]) if len(bottlenecks) else '',
+            'top_severity': max(bottlenecks['severity'], key=SEVERITIES.index) if len(bottlenecks) else '',
+            'report': report,
+        })
+    except Exception as e:
+        row.update({'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+
+    cpu1, peak = _usage()
+    row.update({
+        'wall_s': round(time.perf_counter() - wall0, 3),
+        'cpu_s': round(cpu1 - cpu0, 3),
+        # Left blank where the peak cannot be reset (not Linux): it would include earlier files
+        'peak_rss_mb': round(peak, 1) if per_file_peak else float('nan'),
+    })
+    return row
+
+
+def write_summary(rows, path):
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.DictWriter(fh, fieldnames=SUMMARY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({c: row.get(c, '') for c in SUMMARY_COLUMNS})
+
+
+def exit_code(rows, fail_on=None):
+    if any(r['status'] != 'ok' for r in rows):
+        return EXIT_FAILED
+    if fail_on:
+        threshold = SEVERITIES.index(fail_on)
+        if any(r.get('top_severity') and SEVERITIES.index(r['top_severity']) >= threshold for r in rows):
+            return EXIT_FINDINGS
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description='Analyse process event logs without the web UI.',
+        epilog=f'Exit codes: {EXIT_OK} ok, {EXIT_FAILED} a log failed, {EXIT_USAGE} usage error / no logs, '
+               f'{EXIT_FINDINGS} a bottleneck reached --fail-on.',
+    )
+    parser.add_argument('inputs', nargs='+', help='log files, directories or glob patterns (CSV/Excel)')
+    parser.add_argument('-o', '--out-dir', default='reports', help='output directory (default: reports)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='parallel worker processes (default: CPU count)')
+    parser.add_argument('--metric', choices=RANKING_METRICS, default='avg_waiting_hrs',
+                        help='waiting-time metric to rank bottlenecks on')
+    parser.add_argument('--charts', action='store_true', help='also write PNG charts per log')
+    parser.add_argument('--ai', action='store_true',
+                        help='also write Claude AI suggestions per log (requests run concurrently across workers)')
+    parser.add_argument('--export', nargs='+', default=[], choices=[e for e in EXPORTS if e != 'summary_csv'],
+                        metavar='EXPORT', help='also write these exports per log: '
+                        + ', '.join(e for e in EXPORTS if e != 'summary_csv'))
+    parser.add_argument('--fail-on', choices=SEVERITIES,
+                        help=f'exit {EXIT_FINDINGS} if any log has a bottleneck of this severity or worse')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON lines instead of a table')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logs = find_logs(args.inputs)
+    if not logs:
+        print('No CSV/Excel logs found in: ' + ', '.join(args.inputs), file=sys.stderr)
+        return EXIT_USAGE
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    workers = max(1, min(args.workers, len(logs)))
+    stems = report_stems(logs)
+    options = dict(out_dir=args.out_dir, metric=args.metric, charts=args.charts, ai=args.ai,
+                   exports=tuple(args.export))
+    if workers == 1:
+        rows = [analyze_log(path, stem=stems[path], **options) for path in logs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(analyze_log, path, stem=stems[path], **options) for path in logs]
+            rows = [f.result() for f in as_completed(futures)]
+        rows.sort(key=lambda r: r['file'])
+
+    write_summary(rows, os.path.join(args.out_dir, 'summary.csv'))
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, default=str))
+    else:
+        for row in rows:
+            detail = (f"{row['total_cases']} cases, top: {row['top_bottleneck']} ({row['top_severity']})"
+                      if row['status'] == 'ok' else row['error'])
+            print(f"{row['status']:<6} {row['file']}  {detail}  "
+                  f"[{row['wall_s']}s wall, {row['cpu_s']}s cpu, {row['peak_rss_mb']} MB peak]")
+        print(f"Summary: {os.path.join(args.out_dir, 'summary.csv')}")
+    return exit_code(rows, args.fail_on)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import pandas as pd
+import numpy as np
+
+from eventlog import EventLog
+from profiling import profiled
+from sketches import sparse_sketch_counts, sparse_percentile_frame, PERCENTILE_COLUMNS
+
+# Above this many possible (source, target) pairs the edge table is built
+# from the observed pairs only instead of a dense activities² grid.
+DENSE_MAX_PAIRS = 4_000_000
+
+
+def dfg_kernel(log, waiting):
+    """Directly-follows edges of a sorted EventLog with waiting-time aggregates.
+
+    Each event after the first of its case contributes its waiting time to
+    the edge (previous activity code, activity code). Pairs are coded as
+    source * k + target and reduced with bincount, so the cost is linear in
+    the number of events. The waiting-time sketch is sparse ('sketch_key',
+    'sketch_count'; see sketches.sparse_sketch_counts), as most edges fill
+    only a few buckets.
+    """
+    n = len(log)
+    k = len(log.activities)
+    act = log.activity_codes.astype(np.int64)
+    prev = np.empty(n, dtype=np.int64)
+    if n:
+        prev[0] = -1
+        prev[1:] = act[:-1]
+        prev[log.case_starts] = -1
+    valid = (prev >= 0) & (act >= 0)
+    pair = prev[valid] * k + act[valid]
+    w = np.asarray(waiting, dtype=np.float64)[valid]
+
+    if k * k <= DENSE_MAX_PAIRS:
+        pair_count = np.bincount(pair, minlength=k * k)
+        pairs = np.flatnonzero(pair_count)
+        edge_of_pair = np.full(k * k, -1, dtype=np.int64)
+        edge_of_pair[pairs] = np.arange(len(pairs))
+        edge = edge_of_pair[pair]
+    else:
+        pairs, edge = np.unique(pair, return_inverse=True)
+
+    m = len(pairs)
+    count = np.bincount(edge, minlength=m)
+    total = np.bincount(edge, weights=w, minlength=m)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        dev = w - mean[edge]
+    m2 = np.bincount(edge, weights=dev * dev, minlength=m)
+    wmin = np.full(m, np.inf)
+    wmax = np.full(m, -np.inf)
+    np.minimum.at(wmin, edge, w)
+    np.maximum.at(wmax, edge, w)
+    sketch_key, sketch_count = sparse_sketch_counts(edge, w)
+
+    return {
+        'source': pairs // max(k, 1),
+        'target': pairs % max(k, 1),
+        'count': count,
+        'sum': total,
+        'm2': m2,
+        'min': wmin,
+        'max': wmax,
+        'sketch_key': sketch_key,
+        'sketch_count': sketch_count,
+    }
+
+
+@profiled()
+def transition_stats(log, waiting, kern=None):
+    """Per-edge frequency and waiting-time stats, most frequent edges first.
+
+    kern is an optional precomputed dfg_kernel result for the same log.
+    """
+    if kern is None:
+        kern = dfg_kernel(log, waiting)
+    count = kern['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(kern['m2'] / np.maximum(count - 1, 1))
+    edges = pd.DataFrame({
+        'source': log.decode_activities(kern['source']),
+        'target': log.decode_activities(kern['target']),
+        'frequency': count.astype('int64'),
+        'avg_waiting_hrs': kern['sum'] / count,
+        'max_waiting_hrs': kern['max'],
+        'min_waiting_hrs': kern['min'],
+        'std_waiting_hrs': np.where(count > 1, std, 0.0),
+        'total_waiting_hrs': kern['sum'],
+    })
+    percentiles = sparse_percentile_frame(kern['sketch_key'], kern['sketch_count'], len(count),
+                                          kern['min'], kern['max'])
+    for col in PERCENTILE_COLUMNS:
+        edges.insert(edges.columns.get_loc('total_waiting_hrs'), col, percentiles[col].to_numpy())
+    order = np.lexsort((kern['target'], kern['source'], -count))
+    return edges.iloc[order].reset_index(drop=True)
+
+
+def directly_follows(df_with_waiting):
+    """transition_stats for the (case_id, timestamp)-sorted frame from calculate_kpis."""
+    log = EventLog.from_frame(df_with_waiting)
+    return transition_stats(log, df_with_waiting['waiting_time_hrs'].to_numpy(dtype=float))
+
+
+def transition_matrix(edges, activities, value='frequency'):
+    """activities × activities matrix (rows: source, columns: target) of one edge column."""
+    activities = pd.Index(activities).astype(str)
+    src = activities.get_indexer(edges['source'].astype(str))
+    dst = activities.get_indexer(edges['target'].astype(str))
+    keep = (src >= 0) & (dst >= 0)
+    fill = 0 if value == 'frequency' else np.nan
+    matrix = np.full((len(activities), len(activities)), fill, dtype=float)
+    matrix[src[keep], dst[keep]] = edges[value].to_numpy(dtype=float)[keep]
+    return pd.DataFrame(matrix, index=activities, columns=activities)
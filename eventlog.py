@@ -0,0 +1,82 @@
+import pandas as pd
+import numpy as np
+
+ENCODED_COLUMNS = ['case_id', 'activity', 'resource']
+
+
+def encode_columns(df):
+    """Store case_id, activity and resource as dictionary-encoded categoricals."""
+    for col in ENCODED_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def decode(series):
+    """Plain-valued copy of a (possibly categorical) column, for display."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.cat.categories.dtype)
+    return series
+
+
+def column_codes(series):
+    """Integer codes and their dictionary for a column (-1 marks missing)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes, pd.Index(uniques)
+
+
+class EventLog:
+    """Compact, array-based view of a validated event log.
+
+    case_codes, activity_codes and resource_codes index into the case_ids,
+    activities and resources dictionaries; timestamps are int64 nanoseconds
+    since the epoch. Rows keep the (case_id, timestamp) order of the frame,
+    so every case is a contiguous slice.
+    """
+
+    def __init__(self, case_codes, activity_codes, timestamps, case_ids, activities,
+                 resource_codes=None, resources=None):
+        self.case_codes = case_codes
+        self.activity_codes = activity_codes
+        self.timestamps = timestamps
+        self.case_ids = case_ids
+        self.activities = activities
+        self.resource_codes = resource_codes
+        self.resources = resources
+
+    @classmethod
+    def from_frame(cls, df):
+        case_codes, case_ids = column_codes(df['case_id'])
+        activity_codes, activities = column_codes(df['activity'])
+        timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+        resource_codes = resources = None
+        if 'resource' in df.columns:
+            resource_codes, resources = column_codes(df['resource'])
+        return cls(case_codes, activity_codes, timestamps, case_ids, activities,
+                   resource_codes, resources)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def has_resource(self):
+        return self.resource_codes is not None
+
+    @property
+    def case_starts(self):
+        """Row offset of the first event of each case (in row order)."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        change = np.flatnonzero(self.case_codes[1:] != self.case_codes[:-1]) + 1
+        return np.concatenate(([0], change))
+
+    def decode_activities(self, codes):
+        return self.activities.take(codes)
+
+    def decode_cases(self, codes):
+        return self.case_ids.take(codes)
+
+    def decode_resources(self, codes):
+        return self.resources.take(codes)
@@ -0,0 +1,213 @@
+import pandas as pd
+import numpy as np
+
+from case_index import CaseIndex, concat_ranges
+from eventlog import EventLog
+from profiling import profiled
+
+PAGE_SIZES = [25, 50, 100, 500]
+DEFAULT_PAGE_SIZE = 50
+# Filtered sets smaller than this share of the table are sorted directly;
+# larger ones are read off the column's full sort order
+DIRECT_SORT_SHARE = 1 / 16
+
+
+def _postings(codes, n_codes):
+    """CSR row lists per code: rows[offsets[c]:offsets[c + 1]] are code c's rows, ascending."""
+    rows = np.argsort(codes, kind='stable')
+    offsets = np.zeros(n_codes + 2, dtype=np.int64)
+    np.cumsum(np.bincount(codes + 1, minlength=n_codes + 1), out=offsets[1:])
+    return rows, offsets[1:]  # code -1 (missing) sorts first and is skipped
+
+
+def _plain(values):
+    """Categorical column or index decoded to its values, so a page does not carry the whole dictionary."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.dtype.categories.dtype)
+    return values
+
+
+class TableIndex:
+    """Server-side sorting and paging of a frame; only a page is ever materialised.
+
+    Full-table sort orders are computed once per column on first use and
+    reused for every filter and page after that.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sum(o.nbytes for o in self._orders.values())
+
+    def _sort_values(self, column):
+        values = self.frame.index if column == self.frame.index.name else self.frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categories are sorted, so codes order like the values; missing (-1) becomes NaN
+            codes = np.asarray(values.codes if isinstance(values, pd.Index) else values.cat.codes)
+            return np.where(codes >= 0, codes, np.nan)
+        return np.asarray(values)
+
+    @staticmethod
+    def _descending(order, values):
+        """A stable ascending order of rows reversed run by run: ties keep row order, missing stays last."""
+        ranked = values[order]
+        present = len(ranked) - int(pd.isna(ranked).sum())
+        if not present:
+            return order
+        starts = np.flatnonzero(np.r_[True, ranked[1:present] != ranked[:present - 1]])
+        ends = np.r_[starts[1:], present]
+        return np.concatenate([order[concat_ranges(starts[::-1], ends[::-1])], order[present:]])
+
+    def sort_order(self, column, ascending=True):
+        """Row positions of the whole table in `column` order (stable either way, missing values last)."""
+        if (column, ascending) not in self._orders:
+            if ascending:
+                order = np.argsort(self._sort_values(column), kind='stable')
+            else:
+                order = self._descending(self.sort_order(column), self._sort_values(column))
+            self._orders[column, ascending] = order
+        return self._orders[column, ascending]
+
+    def sorted_rows(self, rows=None, sort_by=None, ascending=True):
+        """rows (all when None) reordered by sort_by."""
+        if sort_by is None:
+            return np.arange(len(self)) if rows is None else rows
+        if rows is None:
+            return self.sort_order(sort_by, ascending)
+        if len(rows) < len(self) * DIRECT_SORT_SHARE:
+            values = self._sort_values(sort_by)
+            order = rows[np.argsort(values[rows], kind='stable')]
+            return order if ascending else self._descending(order, values)
+        member = np.zeros(len(self), dtype=bool)
+        member[rows] = True
+        order = self.sort_order(sort_by, ascending)
+        return order[member[order]]
+
+    @profiled()
+    def page(self, rows=None, sort_by=None, ascending=True, page=0, page_size=DEFAULT_PAGE_SIZE):
+        """(frame of one page, total matching rows, page count) for a row selection."""
+        total = len(self) if rows is None else len(rows)
+        pages = max(-(-total // page_size), 1)
+        page = min(max(page, 0), pages - 1)
+        lo, hi = page * page_size, min((page + 1) * page_size, total)
+        if sort_by is None:
+            picked = np.arange(lo, hi) if rows is None else rows[lo:hi]
+        elif rows is None:
+            picked = self.sort_order(sort_by, ascending)[lo:hi]
+        else:
+            picked = self.sorted_rows(rows, sort_by, ascending)[lo:hi]
+        view = self.frame.iloc[picked]
+        view = pd.DataFrame({c: _plain(view[c]) for c in view.columns}, index=_plain(view.index))
+        return view, total, pages
+
+
+class LogIndex(TableIndex):
+    """Prebuilt lookups over a (case_id, timestamp)-sorted event frame.
+
+    Cases are contiguous runs looked up through a CaseIndex; activities and resources are CSR row-index arrays per code; time
+    ranges are binary searches in the timestamp sort order (built on first
+    use). Filters intersect by probing the smallest candidate set against the
+    code arrays, so a query touches only the rows it could return.
+    """
+
+    def __init__(self, df):
+        super().__init__(df)
+        log = EventLog.from_frame(df)
+        self.log = log
+        self.cases = CaseIndex(log)
+        self.activity_rows, self.activity_offsets = _postings(log.activity_codes, len(log.activities))
+        self.resource_rows = self.resource_offsets = None
+        if log.has_resource:
+            self.resource_rows, self.resource_offsets = _postings(log.resource_codes, len(log.resources))
+        self._sorted_ts = None
+
+    def __sizeof__(self):
+        arrays = [self.activity_rows, self.activity_offsets, self.resource_rows, self.resource_offsets,
+                  self.log.case_codes, self.log.activity_codes, self.log.timestamps, self.log.resource_codes,
+                  self._sorted_ts]
+        return super().__sizeof__() + self.cases.__sizeof__() + sum(a.nbytes for a in arrays if a is not None)
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+    def case_positions(self, case_id):
+        """Case positions matching case_id: exact, '*'-suffixed prefix, or '*'-wrapped substring.
+
+        Prefix and substring matches ignore case.
+        """
+        if isinstance(case_id, str) and len(case_id) > 1 and case_id.startswith('*') and case_id.endswith('*'):
+            return self.cases.search(case_id[1:-1])
+        if isinstance(case_id, str) and case_id.endswith('*'):
+            return self.cases.search(case_id[:-1], mode='prefix')
+        pos = self.cases.position_of(case_id)
+        return np.array([pos] if pos >= 0 else [], dtype=np.int64)
+
+    def case_rows(self, case_id):
+        """Rows of the matching case(s), in case then time order."""
+        return self.cases.rows(self.case_positions(case_id))
+
+    def _coded_rows(self, values, dictionary, rows, offsets):
+        codes = dictionary.get_indexer(list(values))
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return np.zeros(0, dtype=np.int64)
+        if len(codes) == 1:
+            return rows[offsets[codes[0]]:offsets[codes[0] + 1]]
+        return np.sort(np.concatenate([rows[offsets[c]:offsets[c + 1]] for c in codes]))
+
+    def activity_rows_for(self, activities):
+        """Ascending rows of any of the given activities."""
+        return self._coded_rows(activities, self.log.activities, self.activity_rows, self.activity_offsets)
+
+    def resource_rows_for(self, resources):
+        """Ascending rows handled by any of the given resources (none without a resource column)."""
+        if self.resource_rows is None:
+            return np.zeros(0, dtype=np.int64)
+        return self._coded_rows(resources, self.log.resources, self.resource_rows, self.resource_offsets)
+
+    def time_rows(self, start=None, end=None):
+        """Rows with start <= timestamp < end, in timestamp order."""
+        order = self.sort_order('timestamp')
+        if self._sorted_ts is None:
+            self._sorted_ts = self.log.timestamps[order]
+        lo = 0 if start is None else np.searchsorted(self._sorted_ts, pd.Timestamp(start).value)
+        hi = len(order) if end is None else np.searchsorted(self._sorted_ts, pd.Timestamp(end).value)
+        return order[lo:hi]
+
+    @profiled()
+    def query(self, case_id=None, activities=None, resources=None, start=None, end=None):
+        """Ascending rows matching every given filter, or None when nothing is filtered."""
+        candidates = []
+        if case_id not in (None, ''):
+            candidates.append(self.case_rows(case_id))
+        if activities:
+            candidates.append(self.activity_rows_for(activities))
+        if resources:
+            candidates.append(self.resource_rows_for(resources))
+        timed = start is not None or end is not None
+        if not candidates:
+            return np.sort(self.time_rows(start, end)) if timed else None
+
+        # Probe the smallest set against the other filters' code arrays
+        candidates.sort(key=len)
+        rows = candidates[0]
+        if activities and len(candidates) > 1:
+            rows = rows[np.isin(self.log.activity_codes[rows], self.log.activities.get_indexer(list(activities)))]
+        if resources and self.resource_rows is not None and len(candidates) > 1:
+            rows = rows[np.isin(self.log.resource_codes[rows], self.log.resources.get_indexer(list(resources)))]
+        if case_id not in (None, '') and len(candidates) > 1:
+            positions = self.cases.position[self.log.case_codes[rows]]
+            rows = rows[np.isin(positions, self.case_positions(case_id))]
+        if timed:
+            ts = self.log.timestamps[rows]
+            keep = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                keep &= ts >= pd.Timestamp(start).value
+            if end is not None:
+                keep &= ts < pd.Timestamp(end).value
+            rows = rows[keep]
+        return np.sort(rows)
+
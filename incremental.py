@@ -0,0 +1,324 @@
+import heapq
+import io
+import os
+import time
+
+import pandas as pd
+import numpy as np
+
+from analyzer import detect_bottlenecks, full_analysis
+from processor import normalize_columns
+from sketches import sketch_counts, percentile_frame, PERCENTILE_COLUMNS, N_BUCKETS
+from timeparse import parse_timestamps
+
+_INITIAL_CAPACITY = 1024
+
+
+def _grow(array, size, fill):
+    """Return `array` with room for at least `size` entries (amortised doubling)."""
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class IncrementalAnalyzer:
+    """Append-only KPI engine: each batch costs time proportional to its size.
+
+    Keeps per-case state (start, last timestamp, event count) and per-activity
+    running moments (count, mean, M2, min, max), merged batch by batch with
+    the parallel form of Welford's update, plus a waiting-time quantile
+    sketch per activity. Events of a case must arrive in
+    time order; an event older than its case's last one is counted in
+    late_events and gets a waiting time of 0.
+    """
+
+    def __init__(self):
+        self.case_slot = {}
+        self.case_labels = []
+        self.case_start = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.case_end = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.case_count = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+
+        self.activity_code = {}
+        self.activity_labels = []
+        self.act_count = np.zeros(0)
+        self.act_mean = np.zeros(0)
+        self.act_m2 = np.zeros(0)
+        self.act_min = np.zeros(0)
+        self.act_max = np.zeros(0)
+        self.act_sketch = np.zeros((0, N_BUCKETS), dtype=np.int64)
+        self.act_first = []  # (case_id, timestamp) of each activity's first event
+
+        self.activity_resources = set()
+        self.has_resource = False
+        self.total_rows = 0
+        self.total_waiting_hrs = 0.0
+        self.late_events = 0
+        self.quarantined_rows = 0
+
+        # Running cycle-time aggregates; cycle times only grow, so the max is
+        # monotone and the min is kept in a lazily-invalidated heap.
+        self.cycle_sum_hrs = 0.0
+        self.cycle_max_ns = 0
+        self._cycle_heap = []
+
+    # ── Ingestion ────────────────────────────────────────────────────────────
+
+    def _slots(self, case_ids):
+        """Slot of each case id, allocating slots for unseen cases."""
+        inverse, uniques = pd.factorize(case_ids)
+        slots = np.empty(len(uniques), dtype=np.int64)
+        for i, cid in enumerate(uniques):
+            slot = self.case_slot.get(cid)
+            if slot is None:
+                slot = len(self.case_labels)
+                self.case_slot[cid] = slot
+                self.case_labels.append(cid)
+            slots[i] = slot
+        n = len(self.case_labels)
+        self.case_start = _grow(self.case_start, n, 0)
+        self.case_end = _grow(self.case_end, n, 0)
+        self.case_count = _grow(self.case_count, n, 0)
+        return slots[inverse]
+
+    def _activity_codes(self, activities):
+        inverse, uniques = pd.factorize(activities)
+        codes = np.empty(len(uniques), dtype=np.int64)
+        for i, act in enumerate(uniques):
+            code = self.activity_code.get(act)
+            if code is None:
+                code = len(self.activity_labels)
+                self.activity_code[act] = code
+                self.activity_labels.append(act)
+                self.act_first.append(None)
+            codes[i] = code
+        k = len(self.activity_labels)
+        if k > len(self.act_count):
+            pad = k - len(self.act_count)
+            self.act_count = np.append(self.act_count, np.zeros(pad))
+            self.act_mean = np.append(self.act_mean, np.zeros(pad))
+            self.act_m2 = np.append(self.act_m2, np.zeros(pad))
+            self.act_min = np.append(self.act_min, np.full(pad, np.inf))
+            self.act_max = np.append(self.act_max, np.full(pad, -np.inf))
+            self.act_sketch = np.vstack([self.act_sketch, np.zeros((pad, N_BUCKETS), dtype=np.int64)])
+        return codes[inverse]
+
+    def append(self, events):
+        """Fold a batch of new events (raw or validated frame) into the state."""
+        events = normalize_columns(events.copy())
+        parsed, failed = parse_timestamps(events['timestamp'])
+        self.quarantined_rows += int(failed.sum())
+        events = events[~failed].dropna(subset=['case_id', 'activity'])
+        parsed = parsed[events.index]
+        if events.empty:
+            return self
+
+        case_ids = events['case_id'].to_numpy()
+        activities = events['activity'].to_numpy()
+        ts = parsed.to_numpy(dtype='datetime64[ns]').view('int64')
+
+        slots = self._slots(case_ids)
+        codes = self._activity_codes(activities)
+        is_new_case = self.case_count[slots] == 0
+
+        order = np.lexsort((ts, slots))
+        slots, codes, ts, case_ids = slots[order], codes[order], ts[order], case_ids[order]
+        is_new_case = is_new_case[order]
+
+        # Previous timestamp: the row before within the batch, else the case's last seen
+        first_in_batch = np.ones(len(ts), dtype=bool)
+        first_in_batch[1:] = slots[1:] != slots[:-1]
+        prev = np.empty_like(ts)
+        prev[1:] = ts[:-1]
+        prev[first_in_batch] = self.case_end[slots[first_in_batch]]
+        gap = ts - prev
+        has_prev = ~(first_in_batch & is_new_case)
+        late = has_prev & (gap < 0)
+        self.late_events += int(late.sum())
+        waiting = np.where(has_prev & ~late, gap, 0) / 1e9 / 3600
+
+        self._update_activities(codes, waiting)
+        self._update_first_seen(codes, case_ids, ts)
+        self._update_cases(slots, ts, first_in_batch, is_new_case)
+
+        self.total_rows += len(ts)
+        self.total_waiting_hrs += float(waiting.sum())
+
+        if 'resource' in events.columns:
+            self.has_resource = True
+            pairs = events[['activity', 'resource']].dropna().drop_duplicates()
+            self.activity_resources.update(zip(pairs['activity'], pairs['resource']))
+        return self
+
+    def _update_activities(self, codes, waiting):
+        k = len(self.activity_labels)
+        nb = np.bincount(codes, minlength=k).astype(float)
+        touched = nb > 0
+        sums = np.bincount(codes, weights=waiting, minlength=k)
+        mb = np.divide(sums, nb, out=np.zeros(k), where=touched)
+        dev = waiting - mb[codes]
+        m2b = np.bincount(codes, weights=dev * dev, minlength=k)
+
+        na = self.act_count
+        n = na + nb
+        delta = mb - self.act_mean
+        frac = np.divide(nb, n, out=np.zeros(k), where=n > 0)
+        self.act_mean = np.where(touched, self.act_mean + delta * frac, self.act_mean)
+        self.act_m2 = self.act_m2 + np.where(touched, m2b + delta ** 2 * na * frac, 0.0)
+        self.act_count = n
+        np.minimum.at(self.act_min, codes, waiting)
+        np.maximum.at(self.act_max, codes, waiting)
+        self.act_sketch += sketch_counts(codes, waiting, k)
+
+    def _update_first_seen(self, codes, case_ids, ts):
+        # Rows are sorted by case slot, not case id, so take each code's
+        # smallest (case_id, timestamp) explicitly.
+        case_rank = pd.factorize(case_ids, sort=True)[0]
+        order = np.lexsort((ts, case_rank, codes))
+        firsts = order[np.r_[True, codes[order][1:] != codes[order][:-1]]]
+        for row in firsts:
+            code = codes[row]
+            candidate = (case_ids[row], ts[row])
+            current = self.act_first[code]
+            if current is None or candidate < current:
+                self.act_first[code] = candidate
+
+    def _update_cases(self, slots, ts, first_in_batch, is_new_case):
+        starts = np.flatnonzero(first_in_batch)
+        batch_slots = slots[starts]
+        batch_first = ts[starts]
+        batch_last = np.maximum.reduceat(ts, starts)
+        batch_count = np.diff(np.append(starts, len(ts)))
+        new = is_new_case[starts]
+
+        old_cycle = np.where(new, 0, self.case_end[batch_slots] - self.case_start[batch_slots])
+        self.case_start[batch_slots] = np.where(new, batch_first,
+                                                np.minimum(self.case_start[batch_slots], batch_first))
+        self.case_end[batch_slots] = np.where(new, batch_last,
+                                              np.maximum(self.case_end[batch_slots], batch_last))
+        self.case_count[batch_slots] += batch_count
+        cycle = self.case_end[batch_slots] - self.case_start[batch_slots]
+
+        self.cycle_sum_hrs += float((cycle - old_cycle).sum(dtype=np.float64)) / 1e9 / 3600
+        if len(cycle):
+            self.cycle_max_ns = max(self.cycle_max_ns, int(cycle.max()))
+        for slot, c in zip(batch_slots.tolist(), cycle.tolist()):
+            heapq.heappush(self._cycle_heap, (c, slot))
+
+    def _min_cycle_ns(self):
+        heap = self._cycle_heap
+        while heap:
+            c, slot = heap[0]
+            if c == self.case_end[slot] - self.case_start[slot]:
+                return c
+            heapq.heappop(heap)  # stale entry: the case has grown since
+        return None
+
+    # ── Results ──────────────────────────────────────────────────────────────
+
+    @property
+    def total_cases(self):
+        return len(self.case_labels)
+
+    def activity_stats(self):
+        """Per-activity waiting-time stats in the calculate_kpis layout."""
+        k = len(self.activity_labels)
+        count = self.act_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.act_m2 / (count - 1))
+        stats = pd.DataFrame({
+            'activity': self.activity_labels,
+            'avg_waiting_hrs': self.act_mean,
+            'max_waiting_hrs': self.act_max,
+            'min_waiting_hrs': self.act_min,
+            'std_waiting_hrs': np.where(count > 1, std, 0.0),
+            'frequency': count.astype('int64'),
+        })
+        percentiles = percentile_frame(self.act_sketch, self.act_min, self.act_max)
+        for col in PERCENTILE_COLUMNS:
+            stats.insert(stats.columns.get_loc('frequency'), col, percentiles[col].to_numpy())
+        # Natural process order: by each activity's first (case_id, timestamp)
+        first = sorted(range(k), key=lambda c: self.act_first[c])
+        return stats.iloc[first].reset_index(drop=True)
+
+    def summary(self):
+        n_cases = self.total_cases
+        hours = 1e9 * 3600
+        min_ns = self._min_cycle_ns()
+        return {
+            'total_cases': int(n_cases),
+            'avg_cycle_time_hrs': round(self.cycle_sum_hrs / n_cases, 2) if n_cases else float('nan'),
+            'max_cycle_time_hrs': round(self.cycle_max_ns / hours, 2) if n_cases else float('nan'),
+            'min_cycle_time_hrs': round(min_ns / hours, 2) if min_ns is not None else float('nan'),
+            'total_activities_logged': int(self.total_rows),
+            'unique_activities': int(len(self.activity_labels)),
+            'avg_waiting_time_hrs': round(self.total_waiting_hrs / self.total_rows, 2) if self.total_rows else float('nan'),
+        }
+
+    def bottlenecks(self, top_n=3):
+        return detect_bottlenecks(self.activity_stats(), top_n=top_n)
+
+    def case_stats(self):
+        """Per-case stats in the calculate_kpis layout (O(cases); build on demand)."""
+        n = self.total_cases
+        case_stats = pd.DataFrame(
+            {
+                'start_time': pd.to_datetime(self.case_start[:n]),
+                'end_time': pd.to_datetime(self.case_end[:n]),
+                'num_activities': self.case_count[:n],
+            },
+            index=pd.Index(self.case_labels, name='case_id'),
+        ).sort_index()
+        case_stats['cycle_time_hrs'] = (case_stats['end_time'] - case_stats['start_time']).dt.total_seconds() / 3600
+        return case_stats
+
+    def kpi_results(self, include_cases=True):
+        """Results shaped like calculate_kpis (with activity_resources instead of the event frame)."""
+        results = {
+            'activity_stats': self.activity_stats(),
+            'summary': self.summary(),
+        }
+        if include_cases:
+            results['case_stats'] = self.case_stats()
+        if self.has_resource:
+            results['activity_resources'] = pd.DataFrame(
+                sorted(self.activity_resources), columns=['activity', 'resource']
+            )
+        else:
+            results['activity_resources'] = pd.DataFrame(columns=['activity'])
+        return results
+
+    def findings(self):
+        return full_analysis(self.kpi_results(include_cases=False))
+
+
+def tail_csv(path, analyzer=None, poll_interval=1.0, chunksize=100_000, stop=None):
+    """Follow a growing CSV event log, feeding appended rows to an IncrementalAnalyzer.
+
+    Yields the analyzer after each batch of new complete lines. A partial
+    last line is held back until its newline arrives. Stops when stop()
+    returns True; raises ValueError if the file shrinks (rotated/truncated).
+    """
+    analyzer = analyzer or IncrementalAnalyzer()
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        if not header.endswith(b'\n'):
+            raise ValueError("CSV header line is incomplete")
+        pending = b''
+        while not (stop and stop()):
+            data = fh.read(chunksize * 128)
+            if not data:
+                if os.path.getsize(path) < fh.tell():
+                    raise ValueError(f"{path} was truncated or rotated")
+                time.sleep(poll_interval)
+                continue
+            pending += data
+            cut = pending.rfind(b'\n') + 1
+            if not cut:
+                continue
+            lines, pending = pending[:cut], pending[cut:]
+            batch = pd.read_csv(io.BytesIO(header + lines))
+            analyzer.append(batch)
+            yield analyzer
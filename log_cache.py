@@ -0,0 +1,156 @@
+import hashlib
+import os
+
+import pandas as pd
+
+from processor import load_and_validate
+from profiling import profiled
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # cache is disabled without pyarrow
+    pa = None
+    pq = None
+
+# Bump whenever load_and_validate changes the columns or dtypes it produces,
+# so stale entries are never served.
+SCHEMA_VERSION = 3
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'process-bottleneck-analyzer')
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+_BLOCK_SIZE = 1024 * 1024
+_META_KEY = b'pba_schema_version'
+
+
+def file_fingerprint(file):
+    """SHA-256 of the file content (path or file-like; file-likes are rewound)."""
+    digest = hashlib.sha256()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as fh:
+            for block in iter(lambda: fh.read(_BLOCK_SIZE), b''):
+                digest.update(block)
+    else:
+        file.seek(0)
+        for block in iter(lambda: file.read(_BLOCK_SIZE), b''):
+            digest.update(block)
+        file.seek(0)
+    return digest.hexdigest()
+
+
+_QUARANTINE_SUFFIX = '.quarantine.parquet'
+
+
+def _entry_path(cache_dir, fingerprint):
+    return os.path.join(cache_dir, f"{fingerprint}-v{SCHEMA_VERSION}.parquet")
+
+
+def _quarantine_path(path):
+    return path[:-len('.parquet')] + _QUARANTINE_SUFFIX
+
+
+def _read_entry(path):
+    """Read a cached entry into a frame; return None if it is unreadable or stale.
+
+    The file is memory-mapped rather than read into a buffer, but Parquet
+    pages are decoded into new Arrow buffers, so the load is not zero-copy.
+    Converting with split_blocks and self_destruct releases each Arrow column
+    as it becomes a pandas column, which keeps the peak near one copy of the
+    frame instead of two.
+    """
+    try:
+        table = pq.read_table(path, memory_map=True)
+    except Exception:
+        return None
+    meta = table.schema.metadata or {}
+    if meta.get(_META_KEY) != str(SCHEMA_VERSION).encode():
+        return None
+    categorical = [c['name'] for c in (table.schema.pandas_metadata or {}).get('columns', ())
+                   if c.get('pandas_type') == 'categorical']
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    # Parquet keeps dictionaries of strings only: re-encode other categoricals (sorted, as loaded)
+    for c in categorical:
+        if not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype('category')
+    return df
+
+
+def _write_entry(path, df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[_META_KEY] = str(SCHEMA_VERSION).encode()
+    table = table.replace_schema_metadata(meta)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Delete least-recently-used entries until the cache fits in max_bytes."""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.parquet') or name.endswith(_QUARANTINE_SUFFIX):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        size = st.st_size
+        try:
+            size += os.path.getsize(_quarantine_path(path))
+        except OSError:
+            pass
+        entries.append((st.st_mtime, size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove_entry(path)
+        total -= size
+
+
+def _remove_entry(path):
+    for p in (path, _quarantine_path(path)):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+@profiled()
+def load_cached(file, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, return_quarantine=False,
+                fingerprint=None):
+    """load_and_validate with a content-addressed Parquet cache in front of it.
+
+    The quarantined rows are cached next to the log, so return_quarantine
+    behaves as in load_and_validate. Falls back to a plain load when pyarrow
+    is not installed or the cache directory is not writable. Pass a
+    precomputed file_fingerprint to skip re-hashing the content.
+    """
+    if pq is None:
+        return load_and_validate(file, return_quarantine=return_quarantine)
+
+    if fingerprint is None:
+        fingerprint = file_fingerprint(file)
+    path = _entry_path(cache_dir, fingerprint)
+    if os.path.exists(path):
+        df = _read_entry(path)
+        quarantine = _read_entry(_quarantine_path(path)) if df is not None else None
+        if df is not None and quarantine is not None:
+            os.utime(path)  # mark as recently used
+            return (df, quarantine) if return_quarantine else df
+        _remove_entry(path)
+
+    df, quarantine = load_and_validate(file, return_quarantine=True)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_entry(_quarantine_path(path), quarantine.astype('string'))
+        _write_entry(path, df)
+        evict(cache_dir, max_bytes)
+    except (OSError, pa.ArrowException):
+        pass
+    return (df, quarantine) if return_quarantine else df
@@ -0,0 +1,362 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import pandas as pd
+import numpy as np
+
+from analyzer import full_analysis
+from dfg import dfg_kernel
+from eventlog import EventLog
+from processor import assemble_kpis, calculate_kpis, kpi_kernel, sorted_log
+from profiling import profiled
+from sketches import merge_sparse_sketches, N_BUCKETS
+from variants import case_hashes
+from workers import spawn_pool, without_main_script
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Below this many rows the pool start-up and reduce cost more than they save
+PARALLEL_MIN_ROWS = 2_000_000
+MIN_PARTITION_ROWS = 10_000
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _executor(max_workers):
+    with _pools_lock:
+        if max_workers not in _pools:
+            _pools[max_workers] = spawn_pool(max_workers)
+        return _pools[max_workers]
+
+
+def _evict(max_workers, pool):
+    """Drop a pool broken by a dead worker, so the next call starts a fresh one."""
+    with _pools_lock:
+        if _pools.get(max_workers) is pool:
+            del _pools[max_workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Pools live as long as the process; stop their workers when it exits
+atexit.register(shutdown)
+
+
+# ── Shared memory ────────────────────────────────────────────────────────────
+
+class SharedArrays:
+    """Named numpy arrays in shared memory; workers attach by spec, nothing is pickled."""
+
+    def __init__(self, arrays=None, empty=None):
+        self._blocks = []
+        self.arrays = {}
+        self.specs = {}
+        for name, value in (arrays or {}).items():
+            self._alloc(name, value.shape, value.dtype)[...] = value
+        for name, (shape, dtype) in (empty or {}).items():
+            self._alloc(name, shape, dtype)
+
+    def _alloc(self, name, shape, dtype):
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks.append(block)
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.specs[name] = (block.name, shape, dtype.str)
+        return self.arrays[name]
+
+    def close(self):
+        self.arrays.clear()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(specs):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        # Spawned workers share the parent's resource tracker, which unlinks
+        # the segment only when the parent does
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+
+# ── Map ──────────────────────────────────────────────────────────────────────
+
+def partition_of_case(case_codes, n_partitions):
+    """Hash partition of each case code; every row of a case lands in one partition."""
+    with np.errstate(over='ignore'):
+        mixed = (case_codes.astype(np.int64) + 1).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return ((mixed >> np.uint64(32)) % np.uint64(n_partitions)).astype(np.int64)
+
+
+def _partition_aggregate(in_specs, out_specs, lo, hi, n_activities, n_resources):
+    """Worker: aggregate rows order[lo:hi] (whole cases) into mergeable partials.
+
+    Row-level waiting times and case-level results are written straight into
+    the shared output arrays; only per-activity and per-edge partials are
+    returned.
+    """
+    arrays, in_blocks = _attach(in_specs)
+    out, out_blocks = _attach(out_specs)
+    try:
+        rows = arrays['order'][lo:hi]
+        activities = pd.RangeIndex(n_activities)
+        resource_codes = arrays['resource_codes'][rows] if 'resource_codes' in arrays else None
+        log = EventLog(arrays['case_codes'][rows], arrays['activity_codes'][rows],
+                       arrays['timestamps'][rows], None, activities,
+                       resource_codes, pd.RangeIndex(n_resources) if resource_codes is not None else None)
+        kern = kpi_kernel(log)
+        out['waiting'][rows] = kern['waiting_hrs']
+
+        slots = log.case_codes[kern['case_starts']].astype(np.int64) + 1
+        out['case_start'][slots] = kern['case_start_ts']
+        out['case_end'][slots] = kern['case_end_ts']
+        out['case_count'][slots] = kern['case_counts']
+        hashes = case_hashes(log)
+        out['hash0'][slots] = hashes[:, 0]
+        out['hash1'][slots] = hashes[:, 1]
+
+        # First global row of each activity, for the natural process order
+        first_row = np.full(n_activities, np.iinfo(np.int64).max)
+        valid_rows = rows[log.activity_codes >= 0]
+        first_row[kern['activity_codes']] = valid_rows[kern['activity_first_row']]
+
+        pairs = None
+        if resource_codes is not None:
+            ok = (log.activity_codes >= 0) & (resource_codes >= 0)
+            pairs = np.unique(log.activity_codes[ok].astype(np.int64) * max(n_resources, 1) + resource_codes[ok])
+
+        return {
+            'count': kern['activity_count'],
+            'sum': kern['activity_sum'],
+            'm2': kern['activity_m2'],
+            'min': kern['activity_min'],
+            'max': kern['activity_max'],
+            'sketch': kern['activity_sketch'],
+            'first_row': first_row,
+            'edges': dfg_kernel(log, kern['waiting_hrs']),
+            'resource_pairs': pairs,
+        }
+    finally:
+        del arrays, out
+        for block in in_blocks + out_blocks:
+            block.close()
+
+
+# ── Reduce ───────────────────────────────────────────────────────────────────
+
+def combine_moments(group, count, total, m2, n_groups):
+    """Pool per-part (count, sum, m2) into per-group moments.
+
+    Parallel-variance form: M2 = Σ m2_i + Σ n_i (mean_i − mean)².
+    """
+    n = np.bincount(group, weights=count, minlength=n_groups)
+    s = np.bincount(group, weights=total, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s / n
+        part_mean = np.where(count > 0, total / np.maximum(count, 1), 0.0)
+    shift = np.where(count > 0, count * (part_mean - mean[group]) ** 2, 0.0)
+    merged_m2 = np.bincount(group, weights=m2 + shift, minlength=n_groups)
+    return n.astype(np.int64), s, merged_m2
+
+
+def _reduce_activities(parts, k):
+    stack = {key: np.stack([p[key] for p in parts]) for key in ('count', 'sum', 'm2', 'min', 'max')}
+    group = np.tile(np.arange(k), len(parts))
+    count, total, m2 = combine_moments(group, stack['count'].ravel(), stack['sum'].ravel(),
+                                       stack['m2'].ravel(), k)
+    first_row = np.min([p['first_row'] for p in parts], axis=0)
+    codes = np.flatnonzero(count > 0)
+    return {
+        'activity_codes': codes,
+        'activity_first_row': first_row[codes],
+        'activity_count': count,
+        'activity_sum': total,
+        'activity_m2': m2,
+        'activity_min': stack['min'].min(axis=0),
+        'activity_max': stack['max'].max(axis=0),
+        'activity_sketch': np.sum([p['sketch'] for p in parts], axis=0),
+    }
+
+
+def _reduce_edges(parts, k):
+    edges = [p['edges'] for p in parts]
+    pair = np.concatenate([e['source'] * k + e['target'] for e in edges])
+    pairs, group = np.unique(pair, return_inverse=True)
+    m = len(pairs)
+    count, total, m2 = combine_moments(group, np.concatenate([e['count'] for e in edges]),
+                                       np.concatenate([e['sum'] for e in edges]),
+                                       np.concatenate([e['m2'] for e in edges]), m)
+    wmin = np.full(m, np.inf)
+    wmax = np.full(m, -np.inf)
+    np.minimum.at(wmin, group, np.concatenate([e['min'] for e in edges]))
+    np.maximum.at(wmax, group, np.concatenate([e['max'] for e in edges]))
+    # Renumber each part's sketch keys from its local edges to the merged ones
+    offsets = np.cumsum([0] + [len(e['count']) for e in edges[:-1]])
+    sketch_key, sketch_count = merge_sparse_sketches(
+        [group[o + e['sketch_key'] // N_BUCKETS] * N_BUCKETS + e['sketch_key'] % N_BUCKETS
+         for o, e in zip(offsets, edges)],
+        [e['sketch_count'] for e in edges])
+    return {
+        'source': pairs // max(k, 1),
+        'target': pairs % max(k, 1),
+        'count': count,
+        'sum': total,
+        'm2': m2,
+        'min': wmin,
+        'max': wmax,
+        'sketch_key': sketch_key,
+        'sketch_count': sketch_count,
+    }
+
+
+def _resource_pairs(parts, log):
+    if not log.has_resource:
+        return pd.DataFrame(columns=['activity'])
+    r = max(len(log.resources), 1)
+    pairs = np.unique(np.concatenate([p['resource_pairs'] for p in parts]))
+    return pd.DataFrame({
+        'activity': log.decode_activities(pairs // r),
+        'resource': log.decode_resources(pairs % r),
+    })
+
+
+def _map_partitions(tasks, max_workers, retries=1):
+    """_partition_aggregate of every task on the pool.
+
+    If a worker dies (e.g. OOM-killed) the broken pool is evicted and all
+    tasks rerun on a fresh one, up to `retries` times, then in this process.
+    Partitions write disjoint output slots, so a rerun is safe.
+    """
+    for _ in range(retries + 1):
+        pool = _executor(max_workers)
+        try:
+            with without_main_script():  # workers are spawned lazily on submit
+                futures = [pool.submit(_partition_aggregate, *t) for t in tasks]
+            return [f.result() for f in futures]
+        except BrokenProcessPool:
+            _evict(max_workers, pool)
+    return [_partition_aggregate(*t) for t in tasks]
+
+
+# ── Entry points ─────────────────────────────────────────────────────────────
+
+@profiled()
+def analyze_parallel(df, max_workers=DEFAULT_WORKERS, metric='avg_waiting_hrs'):
+    """calculate_kpis + full_analysis as a map-reduce over case-hash partitions.
+
+    The encoded log goes into shared memory once; each worker aggregates the
+    cases of one partition and writes row/case-level results into shared
+    output arrays. Returns (kpi_results, findings) in the same shape as the
+    single-process path.
+    """
+    df, log = sorted_log(df)
+    n = len(log)
+    n_slots = len(log.case_ids) + 1  # slot 0: events without a case_id
+    n_parts = max(1, min(max_workers, n // MIN_PARTITION_ROWS))
+
+    part = partition_of_case(log.case_codes, n_parts)
+    order = np.argsort(part, kind='stable')  # rows of a partition stay in (case, time) order
+    bounds = np.searchsorted(part[order], np.arange(n_parts + 1))
+
+    inputs = {'order': order, 'case_codes': log.case_codes,
+              'activity_codes': log.activity_codes, 'timestamps': log.timestamps}
+    if log.has_resource:
+        inputs['resource_codes'] = log.resource_codes
+    outputs = {'waiting': ((n,), np.float64), 'case_start': ((n_slots,), np.int64),
+               'case_end': ((n_slots,), np.int64), 'case_count': ((n_slots,), np.int64),
+               'hash0': ((n_slots,), np.uint64), 'hash1': ((n_slots,), np.uint64)}
+    n_resources = len(log.resources) if log.has_resource else 0
+
+    with SharedArrays(inputs) as shared_in, SharedArrays(empty=outputs) as shared_out:
+        tasks = [(shared_in.specs, shared_out.specs, int(bounds[p]), int(bounds[p + 1]),
+                  len(log.activities), n_resources) for p in range(n_parts)]
+        if max_workers > 1 and n_parts > 1:
+            parts = _map_partitions(tasks, max_workers)
+        else:
+            parts = [_partition_aggregate(*t) for t in tasks]
+        out = {name: array.copy() for name, array in shared_out.arrays.items()}
+
+    # Gather case-level results back into row order of the cases
+    starts = log.case_starts
+    slots = log.case_codes[starts].astype(np.int64) + 1
+    kern = {
+        'waiting_hrs': out['waiting'],
+        'case_starts': starts,
+        'case_start_ts': out['case_start'][slots],
+        'case_end_ts': out['case_end'][slots],
+        'case_counts': out['case_count'][slots],
+        **_reduce_activities(parts, len(log.activities)),
+    }
+    hashes = np.stack([out['hash0'][slots], out['hash1'][slots]], axis=1)
+    kpi_results = assemble_kpis(df, log, kern, edges=_reduce_edges(parts, len(log.activities)),
+                                case_hashes=hashes)
+
+    # Resource risk from the partitions' distinct pairs, not a rescan of the frame
+    findings = full_analysis({**kpi_results, 'df_with_waiting': None,
+                              'activity_resources': _resource_pairs(parts, log)}, metric=metric)
+    return kpi_results, findings
+
+
+@profiled()
+def calculate_kpis_parallel(df, max_workers=DEFAULT_WORKERS):
+    """Drop-in for calculate_kpis that spreads the work over max_workers processes.
+
+    Logs under PARALLEL_MIN_ROWS, or a single worker, take the in-process path.
+    """
+    if len(df) < PARALLEL_MIN_ROWS or max_workers < 2:
+        return calculate_kpis(df)
+    return analyze_parallel(df, max_workers)[0]
+
+
+def scaling_benchmark(df, worker_counts=(1, 2, 4, 8), repeats=3):
+    """Wall time of analyze_parallel per worker count (best of `repeats`), with speed-up vs 1 worker."""
+    rows = []
+    for workers in worker_counts:
+        analyze_parallel(df, workers)  # warm the pool
+        best = min(_timed(analyze_parallel, df, workers) for _ in range(repeats))
+        rows.append({'workers': workers, 'seconds': round(best, 3)})
+    result = pd.DataFrame(rows)
+    result['speedup'] = (result['seconds'].iloc[0] / result['seconds']).round(2)
+    result['rows_per_sec'] = (len(df) / result['seconds']).round(0).astype('int64')
+    return result
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    from processor import load_and_validate
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python parallel.py <event_log.csv> [worker counts ...]")
+    log_df = load_and_validate(sys.argv[1])
+    counts = [int(w) for w in sys.argv[2:]] or [1, 2, 4, 8]
+    print(f"{len(log_df):,} events")
+    print(scaling_benchmark(log_df, counts).to_string(index=False))
+    shutdown()
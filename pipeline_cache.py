@@ -0,0 +1,119 @@
+import io
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+from profiling import count_rows, stage as profile_stage
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+DEFAULT_MAX_ENTRIES = 256
+
+
+def estimate_size(value):
+    """Rough in-memory size of a cached value, in bytes (object and string columns included)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, io.BytesIO):
+        return len(value.getbuffer())
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU of computed results, bounded by entry count and bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value  # too big to keep; hand it back uncached
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute, *args, **kwargs):
+        """Return the cached value for key, computing and storing it on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute(*args, **kwargs))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Shared by every Streamlit session in this process; survives script reruns.
+pipeline_cache = ResultCache()
+
+
+def cached(stage, dataset, compute, *args, params=(), **kwargs):
+    """Memoise compute(*args, **kwargs) under (dataset fingerprint, stage, params).
+
+    Each call is a span of the active profiling trace, marked cache=hit/miss.
+    """
+    key = (dataset, stage, tuple(params))
+    with profile_stage(stage) as span:
+        missing = object()
+        value = pipeline_cache.get(key, missing)
+        span.set(cache='miss' if value is missing else 'hit')
+        if value is missing:
+            value = pipeline_cache.put(key, compute(*args, **kwargs))
+        span.set(rows_out=count_rows(value))
+        return value
+
+
+def cached_png(chart, dataset, render, *args, params=(), **kwargs):
+    """Memoise a chart render as PNG bytes (None stays None)."""
+    def _render():
+        buf = render(*args, **kwargs)
+        return None if buf is None else buf.getvalue()
+    return cached(f"chart:{chart}", dataset, _render, params=params)
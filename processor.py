@@ -1,80 +1,213 @@
 import pandas as pd
 import numpy as np
 
-def load_and_validate(file):
-    """Load CSV or Excel and validate required columns."""
-    try:
-        if hasattr(file, 'name'):
-            if file.name.endswith('.xlsx') or file.name.endswith('.xls'):
-                df = pd.read_excel(file)
-            else:
-                df = pd.read_csv(file)
-        else:
-            df = pd.read_csv(file)
-    except Exception as e:
-        raise ValueError(f"Could not read file: {e}")
+from dfg import transition_stats
+from eventlog import EventLog, encode_columns
+from profiling import profiled, stage
+from sketches import sketch_counts, percentile_frame, PERCENTILE_COLUMNS
+from timeparse import parse_timestamps, split_quarantine
+from variants import variant_index
+
+REQUIRED_COLUMNS = ['case_id', 'activity', 'timestamp']
+
 
+def normalize_columns(df):
+    """Normalise column names and check the required columns are present."""
     df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
 
-    required = ['case_id', 'activity', 'timestamp']
-    missing = [c for c in required if c not in df.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
     if missing:
         raise ValueError(f"Missing required columns: {missing}. Your file must have: case_id, activity, timestamp")
+    return df
+
 
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values(['case_id', 'timestamp']).reset_index(drop=True)
+@profiled()
+def load_and_validate(file, return_quarantine=False):
+    """Load CSV or Excel and validate required columns.
+
+    Rows whose timestamp cannot be parsed are set aside instead of aborting
+    the load; pass return_quarantine=True to get them back as a second value.
+    """
+    with stage('read_file') as span:
+        try:
+            if hasattr(file, 'name'):
+                if file.name.endswith('.xlsx') or file.name.endswith('.xls'):
+                    df = pd.read_excel(file)
+                else:
+                    df = pd.read_csv(file)
+            else:
+                df = pd.read_csv(file)
+        except Exception as e:
+            raise ValueError(f"Could not read file: {e}")
+        span.set(rows_out=len(df))
+
+    df = normalize_columns(df)
+    parsed, failed = parse_timestamps(df['timestamp'])
+    df, quarantine = split_quarantine(df, failed, 'unparseable timestamp')
+    df['timestamp'] = parsed[~failed]
+    with stage('sort_and_encode', rows_in=len(df)):
+        df = df.sort_values(['case_id', 'timestamp']).reset_index(drop=True)
+        df = encode_columns(df)
+    if return_quarantine:
+        return df, quarantine.reset_index(drop=True)
     return df
 
 
+def is_sorted_log(log):
+    """True if rows are ordered by case code, then timestamp within each case."""
+    if len(log) < 2:
+        return True
+    case_step = np.diff(log.case_codes)
+    if (case_step < 0).any():
+        return False
+    same_case = case_step == 0
+    return not (np.diff(log.timestamps)[same_case] < 0).any()
+
+
+@profiled()
+def kpi_kernel(log):
+    """Single pass over a sorted EventLog: waiting times, case and activity aggregates.
+
+    Uses segment reductions over the code arrays (bincount per activity code,
+    case boundaries from the sorted case codes) instead of pandas group-bys.
+    """
+    n = len(log)
+    ts = log.timestamps
+    starts = log.case_starts
+    ends = np.append(starts[1:], n)[:len(starts)] - 1
+
+    # Waiting time: gap to the previous event of the same case, 0 for a case's first event
+    waiting = np.empty(n, dtype=np.float64)
+    if n:
+        waiting[0] = 0.0
+        np.subtract(ts[1:], ts[:-1], out=waiting[1:], casting='unsafe')
+        waiting /= 1e9 * 3600
+        waiting[starts] = 0.0
+
+    act = log.activity_codes
+    valid = act >= 0
+    if not valid.all():
+        act, w = act[valid], waiting[valid]
+    else:
+        w = waiting
+    k = len(log.activities)
+    count = np.bincount(act, minlength=k)
+    total = np.bincount(act, weights=w, minlength=k)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        dev = w - mean[act]
+        m2 = np.bincount(act, weights=dev * dev, minlength=k)
+    wmin = np.full(k, np.inf)
+    wmax = np.full(k, -np.inf)
+    np.minimum.at(wmin, act, w)
+    np.maximum.at(wmax, act, w)
+    sketch = sketch_counts(act, w, k)
+
+    # First row at which each activity code appears (natural process order)
+    codes, first_row = np.unique(act, return_index=True)
+
+    return {
+        'waiting_hrs': waiting,
+        'case_starts': starts,
+        'case_start_ts': ts[starts],
+        'case_end_ts': ts[ends],
+        'case_counts': ends - starts + 1,
+        'activity_codes': codes,
+        'activity_first_row': first_row,
+        'activity_count': count,
+        'activity_sum': total,
+        'activity_m2': m2,
+        'activity_min': wmin,
+        'activity_max': wmax,
+        'activity_sketch': sketch,
+    }
+
+
+@profiled()
+def sorted_log(df):
+    """(df, EventLog) ordered by (case_id, timestamp), re-sorting only if needed."""
+    log = EventLog.from_frame(df)
+    if not is_sorted_log(log):
+        df = df.sort_values(['case_id', 'timestamp'], kind='stable').reset_index(drop=True)
+        log = EventLog.from_frame(df)
+    return df, log
+
+
+@profiled()
 def calculate_kpis(df):
     """Calculate all KPIs per case and per activity."""
+    df, log = sorted_log(df)
+    return assemble_kpis(df, log, kpi_kernel(log))
+
+
+@profiled()
+def assemble_kpis(df, log, kern, edges=None, case_hashes=None):
+    """Build kpi_results from kpi_kernel aggregates over the sorted frame df.
+
+    edges (a dfg_kernel result) and case_hashes may be given precomputed,
+    e.g. reduced from partitions; otherwise they are computed from log.
+    """
     results = {}
 
-    # Per-case metrics
-    case_groups = df.groupby('case_id')
-    case_stats = case_groups.agg(
-        start_time=('timestamp', 'min'),
-        end_time=('timestamp', 'max'),
-        num_activities=('activity', 'count')
+    # Per-case metrics (cases are contiguous, so first/last row give start/end)
+    starts = kern['case_starts']
+    case_stats = pd.DataFrame(
+        {
+            'start_time': df['timestamp'].array.take(starts),
+            'end_time': df['timestamp'].array.take(starts + kern['case_counts'] - 1),
+            'num_activities': kern['case_counts'],
+        },
+        index=pd.Index(df['case_id'].array.take(starts), name='case_id'),
     )
-    case_stats['cycle_time_hrs'] = (case_stats['end_time'] - case_stats['start_time']).dt.total_seconds() / 3600
+    case_stats['cycle_time_hrs'] = (kern['case_end_ts'] - kern['case_start_ts']) / 1e9 / 3600
+    # Process variants: cases hashed on their activity sequence, 1 = most frequent
+    case_stats['variant_id'], results['variant_stats'] = variant_index(log, case_stats['cycle_time_hrs'], case_hashes)
     results['case_stats'] = case_stats
 
-    # Per-activity waiting time (time from previous step end to this step start)
-    df_sorted = df.sort_values(['case_id', 'timestamp'])
-    df_sorted['prev_timestamp'] = df_sorted.groupby('case_id')['timestamp'].shift(1)
-    df_sorted['waiting_time_hrs'] = (
-        df_sorted['timestamp'] - df_sorted['prev_timestamp']
-    ).dt.total_seconds() / 3600
-    df_sorted['waiting_time_hrs'] = df_sorted['waiting_time_hrs'].fillna(0)
-    results['df_with_waiting'] = df_sorted
-
-    # Activity-level aggregation
-    activity_stats = df_sorted.groupby('activity').agg(
-        avg_waiting_hrs=('waiting_time_hrs', 'mean'),
-        max_waiting_hrs=('waiting_time_hrs', 'max'),
-        min_waiting_hrs=('waiting_time_hrs', 'min'),
-        std_waiting_hrs=('waiting_time_hrs', 'std'),
-        frequency=('activity', 'count')
-    ).fillna(0).reset_index()
-
-    # Preserve natural process order
-    activity_order = df['activity'].unique().tolist()
-    activity_stats['order'] = activity_stats['activity'].map(
-        {a: i for i, a in enumerate(activity_order)}
-    )
-    activity_stats = activity_stats.sort_values('order').drop(columns='order')
+    # Per-activity waiting time (time from previous step end to this step start).
+    # Columns are shared with df, not copied.
+    columns = {c: df[c] for c in df.columns}
+    columns['waiting_time_hrs'] = pd.Series(kern['waiting_hrs'], index=df.index)
+    results['df_with_waiting'] = pd.DataFrame(columns, copy=False)
+
+    # Activity-level aggregation, in natural process order
+    codes = kern['activity_codes']
+    count = kern['activity_count'][codes]
+    std = np.sqrt(kern['activity_m2'][codes] / np.maximum(count - 1, 1))
+    activity_stats = pd.DataFrame({
+        'activity': log.decode_activities(codes),
+        'avg_waiting_hrs': kern['activity_sum'][codes] / count,
+        'max_waiting_hrs': kern['activity_max'][codes],
+        'min_waiting_hrs': kern['activity_min'][codes],
+        'std_waiting_hrs': np.where(count > 1, std, 0.0),
+        'frequency': count.astype('int64'),
+    })
+    percentiles = percentile_frame(kern['activity_sketch'][codes],
+                                   kern['activity_min'][codes], kern['activity_max'][codes])
+    for col in PERCENTILE_COLUMNS:
+        activity_stats.insert(activity_stats.columns.get_loc('frequency'), col, percentiles[col].to_numpy())
+    order = np.argsort(kern['activity_first_row'], kind='stable')
+    activity_stats = activity_stats.iloc[order]
     results['activity_stats'] = activity_stats
+    # Mergeable per-activity waiting-time sketches (bucket counts), same row order
+    results['activity_sketch'] = pd.DataFrame(
+        kern['activity_sketch'][codes[order]],
+        index=pd.Index(activity_stats['activity'].to_numpy(), name='activity'),
+    )
+
+    # Directly-follows edges: waiting time attributed to (previous activity, activity)
+    results['transition_stats'] = transition_stats(log, kern['waiting_hrs'], edges)
 
     # Summary KPIs
+    cycle = case_stats['cycle_time_hrs']
     results['summary'] = {
         'total_cases': int(case_stats.shape[0]),
-        'avg_cycle_time_hrs': round(float(case_stats['cycle_time_hrs'].mean()), 2),
-        'max_cycle_time_hrs': round(float(case_stats['cycle_time_hrs'].max()), 2),
-        'min_cycle_time_hrs': round(float(case_stats['cycle_time_hrs'].min()), 2),
+        'avg_cycle_time_hrs': round(float(cycle.mean()), 2),
+        'max_cycle_time_hrs': round(float(cycle.max()), 2),
+        'min_cycle_time_hrs': round(float(cycle.min()), 2),
         'total_activities_logged': int(len(df)),
-        'unique_activities': int(df['activity'].nunique()),
-        'avg_waiting_time_hrs': round(float(df_sorted['waiting_time_hrs'].mean()), 2),
+        'unique_activities': int(len(codes)),
+        'avg_waiting_time_hrs': round(float(kern['waiting_hrs'].mean()), 2),
     }
 
     return results
@@ -0,0 +1,250 @@
+import contextvars
+import functools
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# The trace collecting spans in this thread/context, or None. Every hook
+# checks it first, so with no active trace instrumentation is one lookup.
+_current = contextvars.ContextVar('trace', default=None)
+
+MB = 1024 ** 2
+
+
+def _rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    scale = MB if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def count_rows(value):
+    """Row count of a frame/array/list (first item of a tuple; event rows of kpi_results), else None."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, dict) and 'df_with_waiting' in value:
+        value = value['df_with_waiting']
+    if hasattr(value, 'shape') and getattr(value, 'shape', ()):
+        return int(value.shape[0])
+    if isinstance(value, list):
+        return len(value)
+    return None
+
+
+class Span:
+    """One timed stage: wall/CPU seconds, peak traced memory, rows and free-form metadata."""
+
+    __slots__ = ('name', 'depth', 'start_s', 'wall_s', 'cpu_s', 'peak_mb', 'rows_in', 'rows_out',
+                 'meta', 'error', '_t0', '_c0', '_base', '_peak')
+
+    def __init__(self, name, depth, start_s):
+        self.name = name
+        self.depth = depth
+        self.start_s = start_s
+        self.wall_s = self.cpu_s = self.peak_mb = None
+        self.rows_in = self.rows_out = None
+        self.meta = {}
+        self.error = None
+
+    def set(self, rows_in=None, rows_out=None, **meta):
+        if rows_in is not None:
+            self.rows_in = rows_in
+        if rows_out is not None:
+            self.rows_out = rows_out
+        self.meta.update(meta)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'depth': self.depth,
+            'start_s': round(self.start_s, 6),
+            'wall_s': None if self.wall_s is None else round(self.wall_s, 6),
+            'cpu_s': None if self.cpu_s is None else round(self.cpu_s, 6),
+            'peak_mb': None if self.peak_mb is None else round(self.peak_mb, 3),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'error': self.error,
+            **({'meta': self.meta} if self.meta else {}),
+        }
+
+
+class _NullSpan:
+    """Stand-in yielded by stage() when no trace is active."""
+
+    def set(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Spans recorded while the trace is active, in start order (nesting via depth).
+
+    Activate with `with Trace(...)` or start()/stop(). memory=True runs
+    tracemalloc for the duration and records each span's peak allocation
+    above what was live when it started; it slows allocation-heavy Python
+    code, so it is opt-in.
+    """
+
+    def __init__(self, name='analysis', memory=False):
+        self.name = name
+        self.memory = memory
+        self.spans = []
+        self.started_at = None
+        self.wall_s = None
+        self.max_rss_mb = None
+        self._stack = []
+        self._token = None
+        self._t0 = None
+        self._owns_tracemalloc = False
+
+    # ── Activation ───────────────────────────────────────────────────────────
+    def start(self):
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self._t0 = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        self._token = _current.set(self)
+        return self
+
+    def stop(self):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        self.wall_s = time.perf_counter() - self._t0
+        self.max_rss_mb = _rss_mb()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    # ── Spans ────────────────────────────────────────────────────────────────
+    def _open(self, name):
+        span = Span(name, len(self._stack), time.perf_counter() - self._t0)
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent._peak = max(parent._peak, peak)
+            tracemalloc.reset_peak()
+            span._base = span._peak = current
+        self.spans.append(span)
+        self._stack.append(span)
+        span._c0 = time.process_time()
+        span._t0 = time.perf_counter()
+        return span
+
+    def _close(self, span, error=None):
+        span.wall_s = time.perf_counter() - span._t0
+        span.cpu_s = time.process_time() - span._c0
+        span.error = error
+        if self.memory and tracemalloc.is_tracing():
+            span._peak = max(span._peak, tracemalloc.get_traced_memory()[1])
+            span.peak_mb = (span._peak - span._base) / MB
+        self._stack.pop()
+        if self._stack and self.memory:
+            parent = self._stack[-1]
+            parent._peak = max(parent._peak, span._peak)
+
+    # ── Export ───────────────────────────────────────────────────────────────
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'wall_s': None if self.wall_s is None else round(self.wall_s, 6),
+            'max_rss_mb': None if self.max_rss_mb is None else round(self.max_rss_mb, 1),
+            'spans': [s.to_dict() for s in self.spans],
+        }
+
+    def to_json(self, path=None, indent=2):
+        """JSON text of the trace; also written to path when given."""
+        text = json.dumps(self.to_dict(), indent=indent, default=str)
+        if path:
+            with open(path, 'w', encoding='utf-8') as fh:
+                fh.write(text)
+        return text
+
+    def to_frame(self):
+        """One row per span; stage names indented by nesting depth."""
+        rows = [s.to_dict() for s in self.spans]
+        frame = pd.DataFrame(rows, columns=['name', 'depth', 'start_s', 'wall_s', 'cpu_s', 'peak_mb',
+                                            'rows_in', 'rows_out', 'error', 'meta'])
+        frame['stage'] = ['  ' * s.depth + s.name for s in self.spans]
+        frame[['rows_in', 'rows_out']] = frame[['rows_in', 'rows_out']].astype('Int64')
+        frame['meta'] = frame['meta'].map(lambda m: ', '.join(f'{k}={v}' for k, v in m.items())
+                                          if isinstance(m, dict) else '')
+        return frame[['stage', 'wall_s', 'cpu_s', 'peak_mb', 'rows_in', 'rows_out', 'meta', 'error', 'start_s']]
+
+
+def current_trace():
+    return _current.get()
+
+
+class _Stage:
+    __slots__ = ('trace', 'name', 'meta', 'span')
+
+    def __init__(self, trace, name, meta):
+        self.trace = trace
+        self.name = name
+        self.meta = meta
+
+    def __enter__(self):
+        self.span = self.trace._open(self.name)
+        if self.meta:
+            self.span.set(**self.meta)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace._close(self.span, None if exc_type is None else f'{exc_type.__name__}: {exc}')
+        return False
+
+
+def stage(name, **meta):
+    """Context manager recording a span in the active trace (a no-op without one).
+
+    Yields the span; call span.set(rows_in=..., rows_out=..., key=value) to
+    attach row counts and metadata.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Stage(trace, name, meta)
+
+
+def profiled(name=None):
+    """Decorator recording each call as a span, with rows of the first argument and the result."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with _Stage(trace, label, None) as span:
+                result = fn(*args, **kwargs)
+                span.set(rows_in=count_rows(args[0]) if args else None, rows_out=count_rows(result))
+                return result
+        return wrapper
+    return decorate
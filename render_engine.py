@@ -0,0 +1,174 @@
+import atexit
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from pipeline_cache import pipeline_cache
+from profiling import stage
+from workers import spawn_pool, without_main_script
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _chart_inputs():
+    """chart name → (prepare, render); prepare runs in the caller, render in a worker."""
+    import visualizer as viz
+    return {
+        'bottleneck_bar': (
+            lambda kpi_results: kpi_results['activity_stats'][['activity', 'avg_waiting_hrs']],
+            viz.plot_bottleneck_bar,
+        ),
+        'heatmap': (
+            lambda kpi_results, mode='auto': viz.heatmap_data(kpi_results['df_with_waiting'], mode=mode),
+            viz.render_heatmap,
+        ),
+        'process_map': (
+            lambda kpi_results: viz.process_map_data(kpi_results['transition_stats'],
+                                                     kpi_results['activity_stats']['activity']),
+            viz.render_process_map,
+        ),
+        'cycle_time': (
+            lambda kpi_results: viz.cycle_time_data(kpi_results['case_stats']),
+            viz.render_cycle_time_distribution,
+        ),
+        'resource_workload': (
+            lambda kpi_results: viz.resource_workload_data(kpi_results['df_with_waiting']),
+            viz.render_resource_workload,
+        ),
+        'queue_timeline': (
+            lambda kpi_results, utilization: viz.queue_timeline_data(utilization),
+            viz.render_queue_timeline,
+        ),
+        'resource_utilization': (
+            lambda kpi_results, utilization: viz.resource_utilization_data(utilization),
+            viz.render_resource_utilization,
+        ),
+        'delay_trend': (
+            lambda kpi_results, trends: viz.delay_trend_data(trends),
+            viz.render_delay_trend,
+        ),
+        'case_timeline': (
+            lambda kpi_results, case_id, steps: viz.case_timeline_data(case_id, steps),
+            viz.render_case_timeline,
+        ),
+    }
+
+
+def _render_png(chart, data):
+    """Worker entry point: render one chart from its compact input, return PNG bytes."""
+    render = _chart_inputs()[chart][1]
+    buf = render(data)
+    return None if buf is None else buf.getvalue()
+
+
+class ChartRenderer:
+    """Renders charts in a process pool from compact, pre-aggregated inputs.
+
+    Only the small per-chart inputs (activity table, heatmap matrix, histogram
+    counts, resource counts) are pickled to workers, never the event log.
+    Finished PNGs go into the shared pipeline cache; a chart already cached
+    or in flight for the same key is not rendered twice. With max_workers=0
+    charts render synchronously in the calling thread. A pool broken by a
+    dead worker (e.g. OOM-killed) is replaced, and its renders are retried
+    once on the new pool, then run in-process.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = spawn_pool(self.max_workers)
+            return self._pool
+
+    def _discard(self, pool):
+        """Drop a broken pool, so the next render starts a fresh one."""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _render(self, chart, data, retries=1):
+        """Future of one render in the pool (in this thread with max_workers=0)."""
+        done = Future()
+
+        def render_here():
+            try:
+                done.set_result(_render_png(chart, data))
+            except Exception as e:
+                done.set_exception(e)
+
+        def relay(source):
+            if source.cancelled():
+                done.cancel()
+            elif source.exception() is not None:
+                done.set_exception(source.exception())
+            else:
+                done.set_result(source.result())
+
+        def settle(future):
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._discard(pool)
+                if retries:
+                    self._render(chart, data, retries - 1).add_done_callback(relay)
+                else:
+                    render_here()
+            else:
+                relay(future)
+
+        if not self.max_workers:
+            render_here()
+            return done
+        pool = self._executor()
+        try:
+            with without_main_script():  # workers are spawned lazily on submit
+                future = pool.submit(_render_png, chart, data)
+        except BrokenProcessPool as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(settle)
+        return done
+
+    def submit(self, chart, dataset, kpi_results, params=(), **options):
+        """Future resolving to the PNG bytes of `chart` (None if not applicable)."""
+        key = (dataset, f"chart:{chart}", tuple(params))
+        missing = object()
+        png = pipeline_cache.get(key, missing)
+        if png is not missing:
+            done = Future()
+            done.set_result(png)
+            return done
+
+        with self._lock:
+            if key in self._inflight:
+                return self._inflight[key]
+            with stage(f'prepare:{chart}'):
+                data = _chart_inputs()[chart][0](kpi_results, **options)
+            future = self._render(chart, data)
+            self._inflight[key] = future
+
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            pipeline_cache.put(key, future.result())
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Shared by every Streamlit session in this process.
+chart_renderer = ChartRenderer()
+atexit.register(chart_renderer.shutdown)
@@ -1,48 +1,220 @@
 import csv
 import io
+import json
+from importlib.util import find_spec
 
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+
+# pyarrow and openpyxl are imported by the writers that need them, so importing
+# this module (as the CLI does) stays cheap; without them those exports are not offered
+HAS_PYARROW = find_spec('pyarrow') is not None
+HAS_OPENPYXL = find_spec('openpyxl') is not None
+
+# Rows converted and written at a time: memory use is bounded by one chunk,
+# whatever the size of the log
+EXPORT_CHUNK_ROWS = 100_000
+EXCEL_MAX_ROWS = 1_048_576  # per sheet, header included; longer tables continue on further sheets
 
-def export_summary_csv(kpi_results, findings, suggestions):
-    """Generate a downloadable CSV summary report."""
-    output = io.StringIO()
-    writer = csv.writer(output)
 
-    # Summary KPIs
-    writer.writerow(['=== PROCESS BOTTLENECK ANALYSIS REPORT ==='])
-    writer.writerow([])
-    writer.writerow(['--- SUMMARY KPIs ---'])
-    writer.writerow(['Metric', 'Value'])
+def _summary_rows(kpi_results, findings, suggestions):
+    """Rows of the sectioned summary report, one list per CSV line."""
+    yield ['=== PROCESS BOTTLENECK ANALYSIS REPORT ===']
+    yield []
+    yield ['--- SUMMARY KPIs ---']
+    yield ['Metric', 'Value']
     for k, v in kpi_results['summary'].items():
-        writer.writerow([k.replace('_', ' ').title(), v])
-
-    writer.writerow([])
-    writer.writerow(['--- TOP BOTTLENECKS ---'])
-    writer.writerow(['Rank', 'Activity', 'Avg Waiting Time (hrs)', 'Max Waiting (hrs)', 'Severity'])
-    for _, row in findings['bottlenecks'].iterrows():
-        writer.writerow([
-            row.get('rank', ''),
-            row['activity'],
-            round(row['avg_waiting_hrs'], 2),
-            round(row['max_waiting_hrs'], 2),
-            row.get('severity', '')
-        ])
-
-    writer.writerow([])
-    writer.writerow(['--- ALL ACTIVITY STATS ---'])
-    writer.writerow(['Activity', 'Avg Wait (hrs)', 'Max Wait (hrs)', 'Std Dev (hrs)', 'Frequency'])
-    for _, row in findings['activity_stats'].iterrows():
-        writer.writerow([
-            row['activity'],
-            round(row['avg_waiting_hrs'], 2),
-            round(row['max_waiting_hrs'], 2),
-            round(row['std_waiting_hrs'], 2),
-            row['frequency']
-        ])
-
-    writer.writerow([])
-    writer.writerow(['--- IMPROVEMENT SUGGESTIONS ---'])
-    writer.writerow(['Activity', 'Type', 'Severity', 'Issue', 'Suggestion'])
+        yield [k.replace('_', ' ').title(), v]
+
+    yield []
+    yield ['--- TOP BOTTLENECKS ---']
+    yield ['Rank', 'Activity', 'Avg Waiting Time (hrs)', 'Max Waiting (hrs)', 'Severity']
+    b = findings['bottlenecks']
+    n = len(b)
+    rank = b['rank'].tolist() if 'rank' in b else [''] * n
+    severity = b['severity'].tolist() if 'severity' in b else [''] * n
+    for row in zip(rank, b['activity'].tolist(), b['avg_waiting_hrs'].round(2).tolist(),
+                   b['max_waiting_hrs'].round(2).tolist(), severity):
+        yield list(row)
+
+    yield []
+    yield ['--- ALL ACTIVITY STATS ---']
+    yield ['Activity', 'Avg Wait (hrs)', 'Max Wait (hrs)', 'Std Dev (hrs)', 'Frequency']
+    a = findings['activity_stats']
+    for row in zip(a['activity'].tolist(), a['avg_waiting_hrs'].round(2).tolist(),
+                   a['max_waiting_hrs'].round(2).tolist(), a['std_waiting_hrs'].round(2).tolist(),
+                   a['frequency'].tolist()):
+        yield list(row)
+
+    yield []
+    yield ['--- IMPROVEMENT SUGGESTIONS ---']
+    yield ['Activity', 'Type', 'Severity', 'Issue', 'Suggestion']
     for s in suggestions:
-        writer.writerow([s['activity'], s['type'], s['severity'], s['issue'], s['suggestion']])
+        yield [s['activity'], s['type'], s['severity'], s['issue'], s['suggestion']]
 
+
+@profiled()
+def export_summary_csv(kpi_results, findings, suggestions):
+    """Generate a downloadable CSV summary report."""
+    output = io.StringIO()
+    csv.writer(output).writerows(_summary_rows(kpi_results, findings, suggestions))
     return output.getvalue()
+
+
+def summary_tables(kpi_results, findings, suggestions):
+    """The summary report's sections as named frames (the small sheets of the Excel export)."""
+    summary = kpi_results['summary']
+    return {
+        'Summary': pd.DataFrame({'Metric': [k.replace('_', ' ').title() for k in summary],
+                                 'Value': list(summary.values())}),
+        'Bottlenecks': findings['bottlenecks'],
+        'Activity Stats': findings['activity_stats'],
+        'Suggestions': pd.DataFrame(suggestions, columns=['activity', 'type', 'severity', 'issue', 'suggestion']),
+        'Variants': kpi_results['variant_stats'],
+    }
+
+
+def event_table(kpi_results):
+    """Per-event rows: the (case_id, timestamp)-sorted log with waiting times."""
+    return kpi_results['df_with_waiting']
+
+
+def case_table(kpi_results):
+    """Per-case rows, case_id as a column."""
+    return kpi_results['case_stats'].reset_index()
+
+
+def _chunks(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Row slices of frame with categoricals decoded, so no chunk carries a whole dictionary."""
+    for lo in range(0, max(len(frame), 1), chunk_rows):
+        chunk = frame.iloc[lo:lo + chunk_rows]
+        yield chunk.assign(**{c: chunk[c].astype(chunk[c].cat.categories.dtype)
+                              for c in chunk.columns if isinstance(chunk[c].dtype, pd.CategoricalDtype)})
+
+
+@profiled()
+def write_csv(frame, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream a frame to a binary file as UTF-8 CSV, one chunk at a time."""
+    for i, chunk in enumerate(_chunks(frame, chunk_rows)):
+        out.write(chunk.to_csv(index=False, header=i == 0).encode('utf-8'))
+
+
+@profiled()
+def write_parquet(frame, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream a frame to a binary file as Parquet, one row group per chunk."""
+    if not HAS_PYARROW:
+        raise RuntimeError("Parquet export requires pyarrow")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in _chunks(frame, chunk_rows):
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(out, table.schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _excel_rows(chunk):
+    """Rows of a chunk as Excel cell values: missing values become empty cells."""
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+@profiled()
+def write_excel(sheets, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream named frames to a binary file as one workbook, a sheet per frame.
+
+    The workbook is write-only: rows go straight to disk as they are
+    appended, so memory does not grow with the table. A frame longer than
+    an Excel sheet continues on sheets suffixed ' 2', ' 3', ...
+    """
+    if not HAS_OPENPYXL:
+        raise RuntimeError("Excel export requires openpyxl")
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, frame in sheets.items():
+        header = [str(c) for c in frame.columns]
+        part, room = 0, 0
+        for chunk in _chunks(frame, chunk_rows):
+            for row in _excel_rows(chunk):
+                if not room:
+                    part += 1
+                    ws = wb.create_sheet(name if part == 1 else f"{name} {part}")
+                    ws.append(header)
+                    room = EXCEL_MAX_ROWS - 1
+                ws.append(row)
+                room -= 1
+        if not part:  # empty table: header only
+            wb.create_sheet(name).append(header)
+    wb.save(out)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _records(frame):
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+
+@profiled()
+def export_summary_json(kpi_results, findings, suggestions):
+    """Summary report as JSON for machine consumers: KPIs, findings, suggestions and table sizes."""
+    report = {
+        'summary': kpi_results['summary'],
+        'bottlenecks': _records(findings['bottlenecks']),
+        'activity_stats': _records(findings['activity_stats']),
+        'variants': _records(kpi_results['variant_stats']),
+        'suggestions': list(suggestions),
+        'rows': {'events': len(kpi_results['df_with_waiting']), 'cases': len(kpi_results['case_stats'])},
+    }
+    return json.dumps(report, indent=2, default=_json_default)
+
+
+# Export name → label, file name, MIME type, and writer(out, kpi_results, findings, suggestions)
+EXPORTS = {
+    'summary_csv': ('Summary report (CSV)', 'bottleneck_report.csv', 'text/csv',
+                    lambda out, k, f, s: out.write(export_summary_csv(k, f, s).encode('utf-8'))),
+    'summary_json': ('Summary report (JSON)', 'bottleneck_report.json', 'application/json',
+                     lambda out, k, f, s: out.write(export_summary_json(k, f, s).encode('utf-8'))),
+    'events_csv': ('Events (CSV)', 'events.csv', 'text/csv',
+                   lambda out, k, f, s: write_csv(event_table(k), out)),
+    'cases_csv': ('Cases (CSV)', 'cases.csv', 'text/csv',
+                  lambda out, k, f, s: write_csv(case_table(k), out)),
+}
+if HAS_PYARROW:
+    EXPORTS.update({
+        'events_parquet': ('Events (Parquet)', 'events.parquet', 'application/vnd.apache.parquet',
+                           lambda out, k, f, s: write_parquet(event_table(k), out)),
+        'cases_parquet': ('Cases (Parquet)', 'cases.parquet', 'application/vnd.apache.parquet',
+                          lambda out, k, f, s: write_parquet(case_table(k), out)),
+    })
+if HAS_OPENPYXL:
+    EXPORTS['workbook_xlsx'] = (
+        'Full workbook (Excel)', 'bottleneck_report.xlsx',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        lambda out, k, f, s: write_excel({**summary_tables(k, f, s), 'Cases': case_table(k),
+                                          'Events': event_table(k)}, out),
+    )
+
+
+@profiled()
+def write_report(export, out, kpi_results, findings, suggestions):
+    """Write one of EXPORTS to a binary file-like object."""
+    if export not in EXPORTS:
+        raise ValueError(f"Unknown export: {export}. Choose one of {list(EXPORTS)}")
+    EXPORTS[export][3](out, kpi_results, findings, suggestions)
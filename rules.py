@@ -0,0 +1,153 @@
+import operator
+from string import Formatter
+
+import pandas as pd
+import numpy as np
+
+# Severity of a waiting time in hours: the first band whose lower bound it reaches.
+# Also the colour bands of visualizer.plot_bottleneck_bar.
+SEVERITY_BANDS = [
+    ('Critical', 5.0),
+    ('High', 2.0),
+    ('Medium', 0.5),
+    ('Low', -np.inf),
+]
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq}
+
+# Suggestion rules, evaluated in order. Each rule reads a findings frame
+# ('source'; 'summary' is the KPI summary as one row), keeps the rows
+# matching every (column, operator, value) in 'when', and emits one
+# suggestion per row. 'severity' is a fixed label, or a column name prefixed
+# with '$'; 'templates' maps a severity to (issue, suggestion) format
+# strings over the row's columns ('*' matches any other severity). Columns
+# listed in 'round' are rounded to 2 decimals before formatting.
+SUGGESTION_RULES = [
+    {
+        'type': 'Bottleneck',
+        'source': 'bottlenecks',
+        'activity': '{activity}',
+        'severity': '$severity',
+        'round': ['rank_value'],
+        'templates': {
+            'Critical': (
+                "{rank_metric} of {rank_value} hrs — critically high delay",
+                "🔴 CRITICAL: '{activity}' is your biggest bottleneck. Immediately assign additional resources, consider parallel processing, or automate this step. Review if this step can be split into sub-tasks.",
+            ),
+            'High': (
+                "{rank_metric} of {rank_value} hrs — high delay",
+                "🟠 HIGH: '{activity}' is causing significant delay. Consider adding a dedicated agent, setting SLA alerts, or reviewing the approval workflow for this step.",
+            ),
+            '*': (
+                "{rank_metric} of {rank_value} hrs — moderate delay",
+                "🟡 MEDIUM: '{activity}' has above-average wait times. Monitor closely and set performance benchmarks for this step.",
+            ),
+        },
+    },
+    {
+        'type': 'Inconsistency',
+        'source': 'inconsistent_steps',
+        'activity': '{activity}',
+        'severity': 'Medium',
+        'round': ['std_waiting_hrs'],
+        'templates': {'*': (
+            "High variability (std dev: {std_waiting_hrs} hrs) — inconsistent performance",
+            "⚠️ INCONSISTENCY: '{activity}' shows unpredictable performance. Standardize the process with SOPs (Standard Operating Procedures), ensure all agents follow the same workflow.",
+        )},
+    },
+    {
+        'type': 'Resource Risk',
+        'source': 'single_resource_risk',
+        'activity': '{activity}',
+        'severity': 'High',
+        'templates': {'*': (
+            "Only 1 resource handles this step — single point of failure",
+            "🔺 RISK: '{activity}' is dependent on a single resource. Cross-train at least one backup agent and document the process to reduce dependency.",
+        )},
+    },
+    {
+        'type': 'Process Health',
+        'source': 'summary',
+        'when': [('avg_cycle_time_hrs', '>', 24)],
+        'activity': 'Overall Process',
+        'severity': 'High',
+        'templates': {'*': (
+            "Average cycle time is {avg_cycle_time_hrs} hrs (over 24 hours)",
+            "🕐 CYCLE TIME: Overall process exceeds 24 hours on average. Conduct an end-to-end value stream mapping exercise to eliminate non-value-adding steps.",
+        )},
+    },
+]
+
+# Emitted when no rule matches anything
+HEALTHY_SUGGESTION = {
+    'activity': 'All Steps',
+    'severity': 'Low',
+    'issue': 'No major issues detected',
+    'suggestion': '✅ Your process looks healthy! Continue monitoring KPIs and set up regular reviews to maintain performance.',
+    'type': 'Process Health',
+}
+
+
+def severity_of(hours, bands=SEVERITY_BANDS):
+    """Severity label of each waiting time (array-like), by SEVERITY_BANDS."""
+    hours = np.asarray(hours, dtype=np.float64)
+    labels = [label for label, _ in bands]
+    return np.select([hours >= low for _, low in bands[:-1]], labels[:-1], labels[-1])
+
+
+def band_floor(severity, bands=SEVERITY_BANDS):
+    """Lower bound in hours of a severity band."""
+    return dict(bands)[severity]
+
+
+def _source_frame(rule, findings, kpi_summary):
+    if rule['source'] == 'summary':
+        return pd.DataFrame([kpi_summary])
+    frame = findings.get(rule['source'])
+    return frame if frame is not None else pd.DataFrame()
+
+
+def _matching(frame, conditions):
+    """Rows of frame meeting every (column, op, value) condition, as one mask."""
+    mask = np.ones(len(frame), dtype=bool)
+    for column, op, value in conditions:
+        mask &= OPERATORS[op](frame[column].to_numpy(), value)
+    return frame[mask] if not mask.all() else frame
+
+
+def apply_rule(rule, frame):
+    """Suggestion dicts of one rule over the rows of a frame, in row order."""
+    frame = _matching(frame, rule.get('when', ()))
+    if frame.empty:
+        return []
+    # Only the columns the templates use are pulled out of the frame
+    texts = [rule['activity']] + [t for pair in rule['templates'].values() for t in pair]
+    fields = {name for text in texts for _, name, _, _ in Formatter().parse(text) if name}
+    columns = {c: frame[c].tolist() for c in fields}
+    for c in rule.get('round', ()):
+        if c in columns:
+            columns[c] = [round(v, 2) for v in columns[c]]
+    rows = [dict(zip(columns, values)) for values in zip(*columns.values())] if columns else [{}] * len(frame)
+
+    severity = rule['severity']
+    severities = frame[severity[1:]].tolist() if severity.startswith('$') else [severity] * len(rows)
+    templates = rule['templates']
+    out = []
+    for row, sev in zip(rows, severities):
+        issue, suggestion = templates.get(sev, templates.get('*'))
+        out.append({
+            'activity': rule['activity'].format(**row),
+            'severity': sev,
+            'issue': issue.format(**row),
+            'suggestion': suggestion.format(**row),
+            'type': rule['type'],
+        })
+    return out
+
+
+def evaluate_rules(findings, kpi_summary, rules=SUGGESTION_RULES):
+    """Suggestions of every rule in order; HEALTHY_SUGGESTION if none fire."""
+    suggestions = []
+    for rule in rules:
+        suggestions.extend(apply_rule(rule, _source_frame(rule, findings, kpi_summary)))
+    return suggestions or [dict(HEALTHY_SUGGESTION)]
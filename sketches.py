@@ -0,0 +1,143 @@
+import pandas as pd
+import numpy as np
+
+# Log-bucketed quantile sketch (DDSketch-style): every positive value falls in
+# bucket ceil(log_gamma(x)), so any quantile is returned within RELATIVE_ACCURACY
+# of the true value. Sketches are fixed-size count vectors, so they merge
+# exactly by addition across chunks, partitions and appended batches; many
+# sparsely filled sketches (one per DFG edge) are kept as (key, count) pairs.
+RELATIVE_ACCURACY = 0.01
+MIN_TRACKED_HRS = 1e-4   # ~0.4 s; smaller positive waits share the lowest bucket
+MAX_TRACKED_HRS = 1e5    # ~11 years; larger waits share the highest bucket
+PERCENTILES = (50, 90, 95, 99)
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+_OFFSET = int(np.ceil(np.log(MIN_TRACKED_HRS) / _LOG_GAMMA)) - 1
+# Bucket 0 holds zero (and non-positive) waits
+N_BUCKETS = int(np.ceil(np.log(MAX_TRACKED_HRS) / _LOG_GAMMA)) - _OFFSET + 1
+
+
+def percentile_column(p):
+    return f'p{p}_waiting_hrs'
+
+
+PERCENTILE_COLUMNS = [percentile_column(p) for p in PERCENTILES]
+
+
+def bucket_index(values):
+    """Sketch bucket of each value."""
+    values = np.asarray(values, dtype=np.float64)
+    idx = np.zeros(len(values), dtype=np.int64)
+    pos = values > 0
+    if pos.any():
+        raw = np.ceil(np.log(values[pos]) / _LOG_GAMMA).astype(np.int64) - _OFFSET
+        idx[pos] = np.clip(raw, 1, N_BUCKETS - 1)
+    return idx
+
+
+def bucket_value(idx):
+    """Representative value of each bucket (0 for the zero bucket)."""
+    idx = np.asarray(idx)
+    value = 2 * _GAMMA ** (idx + _OFFSET) / (_GAMMA + 1)
+    return np.where(idx > 0, value, 0.0)
+
+
+def sketch_counts(codes, values, n_groups):
+    """(n_groups, N_BUCKETS) bucket counts of values grouped by integer code."""
+    flat = np.asarray(codes, dtype=np.int64) * N_BUCKETS + bucket_index(values)
+    return np.bincount(flat, minlength=n_groups * N_BUCKETS).reshape(n_groups, N_BUCKETS)
+
+
+def chunk_sketch(keys, values):
+    """Per-key bucket counts of one chunk, as a frame indexed by key."""
+    codes, labels = pd.factorize(keys, sort=False)
+    valid = codes >= 0
+    counts = sketch_counts(codes[valid], np.asarray(values)[valid], len(labels))
+    return pd.DataFrame(counts, index=pd.Index(labels, name=getattr(keys, 'name', None)))
+
+
+def merge_sketches(a, b):
+    """Merge two per-key sketch frames (bucket counts add)."""
+    if a.empty:
+        return b.copy()
+    if b.empty:
+        return a.copy()
+    return a.add(b, fill_value=0).astype(np.int64)
+
+
+def sparse_sketch_counts(codes, values):
+    """Nonzero bucket counts of values grouped by integer code, as (key, count).
+
+    key = code * N_BUCKETS + bucket, sorted; memory grows with the distinct
+    (group, bucket) pairs seen rather than groups × N_BUCKETS.
+    """
+    flat = np.asarray(codes, dtype=np.int64) * N_BUCKETS + bucket_index(values)
+    key, count = np.unique(flat, return_counts=True)
+    return key, count.astype(np.int64)
+
+
+def merge_sparse_sketches(keys, counts):
+    """Sum (key, count) sketches whose keys share one group numbering."""
+    key, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    count = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(key))
+    return key, count.astype(np.int64)
+
+
+def sparse_quantiles(key, count, n_groups, percentiles=PERCENTILES, low=None, high=None):
+    """(n_groups, len(percentiles)) quantile estimates from a (key, count) sketch.
+
+    Same estimates as sketch_quantiles on the dense counts.
+    """
+    key = np.asarray(key, dtype=np.int64)
+    count = np.asarray(count, dtype=np.int64)
+    group = key // N_BUCKETS
+    bucket = key % N_BUCKETS
+    total = np.bincount(group, weights=count, minlength=n_groups).astype(np.int64)
+    first = np.searchsorted(group, np.arange(n_groups))
+    last = np.maximum(first + (np.bincount(group, minlength=n_groups) - 1), first)
+    cum = count.cumsum()
+    base = np.concatenate([[0], cum])[first]
+    out = np.full((n_groups, len(percentiles)), np.nan)
+    if not len(key):
+        return out
+
+    def bucket_at(rank):
+        # First entry of the group whose running count exceeds rank
+        pos = np.searchsorted(cum, base + rank, side='right')
+        return bucket_value(bucket[np.minimum(np.minimum(pos, last), len(key) - 1)])
+
+    for j, p in enumerate(percentiles):
+        # Linear interpolation between the two nearest ranks, as pandas' quantile
+        rank = p / 100 * np.maximum(total - 1, 0)
+        below, frac = np.floor(rank), rank - np.floor(rank)
+        lo = bucket_at(below)
+        hi = bucket_at(below + 1)
+        out[:, j] = lo + (hi - lo) * frac
+    if low is not None and high is not None:
+        out = np.clip(out, np.asarray(low, dtype=np.float64)[:, None], np.asarray(high, dtype=np.float64)[:, None])
+    out[total == 0] = np.nan
+    return out
+
+
+def sketch_quantiles(counts, percentiles=PERCENTILES, low=None, high=None):
+    """(n_groups, len(percentiles)) quantile estimates from bucket counts.
+
+    Estimates are clipped to the exact per-group min/max when given; groups
+    with no values get NaN.
+    """
+    counts = np.asarray(counts)
+    key = np.flatnonzero(counts)
+    return sparse_quantiles(key, counts.ravel()[key], len(counts), percentiles, low, high)
+
+
+def percentile_frame(counts, low=None, high=None):
+    """p50/p90/p95/p99 waiting-time columns for each row of a count matrix."""
+    q = sketch_quantiles(counts, PERCENTILES, low, high)
+    return pd.DataFrame(q, columns=PERCENTILE_COLUMNS)
+
+
+def sparse_percentile_frame(key, count, n_groups, low=None, high=None):
+    """percentile_frame of a (key, count) sketch over n_groups groups."""
+    q = sparse_quantiles(key, count, n_groups, PERCENTILES, low, high)
+    return pd.DataFrame(q, columns=PERCENTILE_COLUMNS)
@@ -0,0 +1,282 @@
+import pandas as pd
+import numpy as np
+
+from processor import normalize_columns
+from sketches import chunk_sketch, merge_sketches, percentile_frame, PERCENTILE_COLUMNS
+from timeparse import detect_format, parse_timestamps, split_quarantine, SAMPLE_SIZE
+
+DEFAULT_CHUNKSIZE = 500_000
+
+
+def merge_moments(a, b):
+    """Merge two per-key (count, mean, m2, min, max) frames (Chan et al.)."""
+    a, b = a.align(b, join='outer')
+    na = a['count'].fillna(0)
+    nb = b['count'].fillna(0)
+    n = na + nb
+    ma = a['mean'].fillna(0)
+    mb = b['mean'].fillna(0)
+    delta = mb - ma
+    frac = (nb / n).fillna(0)
+
+    merged = pd.DataFrame(index=a.index)
+    merged['count'] = n
+    merged['mean'] = ma + delta * frac
+    merged['m2'] = a['m2'].fillna(0) + b['m2'].fillna(0) + delta ** 2 * na * frac
+    merged['min'] = np.fmin(a['min'], b['min'])
+    merged['max'] = np.fmax(a['max'], b['max'])
+    return merged
+
+
+def chunk_moments(keys, values):
+    """Per-key (count, mean, m2, min, max) of one chunk of values."""
+    grouped = values.groupby(keys, sort=False)
+    moments = grouped.agg(['count', 'mean', 'min', 'max'])
+    centred = values - keys.map(moments['mean'])
+    moments['m2'] = (centred ** 2).groupby(keys, sort=False).sum()
+    return moments
+
+
+class _CaseTable:
+    """Start, end and event count per case, in slot-indexed arrays grown by doubling.
+
+    A dict maps case ids to slots, so folding in a chunk's cases costs time in
+    the chunk's size, not in the number of cases held.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.ids = []
+        self.start = self.end = None
+        self.count = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, ids):
+        """Slot of each case id, -1 for cases not held."""
+        get = self.slots.get
+        return np.fromiter((get(c, -1) for c in ids), dtype=np.int64, count=len(ids))
+
+    def end_times(self, ids):
+        """Last timestamp of each case id (NaT for cases not held)."""
+        if self.end is None:
+            return np.full(len(ids), np.datetime64('NaT'), dtype='M8[ns]')
+        pos = self.lookup(ids)
+        out = np.full(len(ids), np.datetime64('NaT'), dtype=self.end.dtype)
+        known = pos >= 0
+        out[known] = self.end[pos[known]]
+        return out
+
+    def _reserve(self, n, dtype):
+        if self.start is None:
+            self.start = np.empty(n, dtype=dtype)
+            self.end = np.empty(n, dtype=dtype)
+            self.count = np.zeros(n, dtype=np.int64)
+        elif n > len(self.start):
+            size = max(n, 2 * len(self.start))
+            self.start = np.resize(self.start, size)
+            self.end = np.resize(self.end, size)
+            self.count = np.resize(self.count, size)
+
+    def fold(self, cases):
+        """Combine a start_time/end_time/num_activities frame indexed by case_id."""
+        pos = self.lookup(cases.index)
+        start = cases['start_time'].to_numpy()
+        end = cases['end_time'].to_numpy()
+        count = cases['num_activities'].to_numpy(dtype=np.int64)
+        seen = pos >= 0
+        if seen.any():
+            rows = pos[seen]
+            self.start[rows] = np.fmin(self.start[rows], start[seen])
+            self.end[rows] = np.fmax(self.end[rows], end[seen])
+            self.count[rows] += count[seen]
+        new = ~seen
+        if new.any():
+            lo = len(self.ids)
+            ids = cases.index[new].tolist()
+            hi = lo + len(ids)
+            self._reserve(hi, start.dtype)
+            self.start[lo:hi] = start[new]
+            self.end[lo:hi] = end[new]
+            self.count[lo:hi] = count[new]
+            self.slots.update(zip(ids, range(lo, hi)))
+            self.ids.extend(ids)
+
+    def frame(self):
+        n = len(self.ids)
+        dtype = self.start.dtype if self.start is not None else 'datetime64[ns]'
+        return pd.DataFrame(
+            {'start_time': np.asarray(self.start[:n] if n else [], dtype=dtype),
+             'end_time': np.asarray(self.end[:n] if n else [], dtype=dtype),
+             'num_activities': self.count[:n]},
+            index=pd.Index(self.ids),
+        )
+
+
+class KPIAccumulator:
+    """Mergeable KPI state folded from successive chunks of an event log.
+
+    Memory is bounded by the number of cases and activities seen so far,
+    never by the number of rows. Events of a case must arrive in time order
+    across chunks (within a chunk they may be in any order).
+    """
+
+    def __init__(self):
+        self.cases = _CaseTable()
+        self.activities = pd.DataFrame(columns=['count', 'mean', 'm2', 'min', 'max'], dtype=float)
+        self.sketches = pd.DataFrame()
+        self.first_seen = pd.DataFrame(columns=['activity', 'case_id', 'timestamp'])
+        self.activity_resources = pd.DataFrame(columns=['activity', 'resource'])
+        self.has_resource = False
+        self.total_rows = 0
+        self.total_waiting_hrs = 0.0
+
+    def update(self, chunk):
+        """Fold one validated chunk (timestamps already parsed) into the state."""
+        if chunk.empty:
+            return self
+        chunk = chunk.sort_values(['case_id', 'timestamp'])
+
+        # Waiting time, carrying each case's last timestamp across chunk boundaries
+        prev = chunk.groupby('case_id', sort=False)['timestamp'].shift(1)
+        codes, ids = pd.factorize(chunk['case_id'])
+        carried = np.r_[self.cases.end_times(ids), np.datetime64('NaT')][codes]  # code -1: no case_id
+        prev = prev.fillna(pd.Series(carried, index=chunk.index))
+        waiting = ((chunk['timestamp'] - prev).dt.total_seconds() / 3600).fillna(0)
+
+        self.activities = merge_moments(self.activities, chunk_moments(chunk['activity'], waiting))
+        self.sketches = merge_sketches(self.sketches, chunk_sketch(chunk['activity'], waiting))
+        self.total_rows += len(chunk)
+        self.total_waiting_hrs += float(waiting.sum())
+
+        chunk_cases = chunk.groupby('case_id', sort=False).agg(
+            start_time=('timestamp', 'min'),
+            end_time=('timestamp', 'max'),
+            num_activities=('activity', 'count')
+        )
+        self.cases.fold(chunk_cases)
+
+        # First occurrence of each activity in (case_id, timestamp) order
+        firsts = chunk.drop_duplicates('activity')[['activity', 'case_id', 'timestamp']]
+        self._merge_first_seen(firsts)
+
+        if 'resource' in chunk.columns:
+            self.has_resource = True
+            pairs = chunk[['activity', 'resource']].drop_duplicates()
+            self.activity_resources = pd.concat(
+                [self.activity_resources, pairs], ignore_index=True
+            ).drop_duplicates()
+        return self
+
+    def merge(self, other):
+        """Fold another accumulator built over a disjoint set of rows into this one.
+
+        Cases split across both accumulators are combined on start/end/count;
+        waiting times at the seam are the caller's responsibility (partition by case).
+        """
+        self.activities = merge_moments(self.activities, other.activities)
+        self.sketches = merge_sketches(self.sketches, other.sketches)
+        self.total_rows += other.total_rows
+        self.total_waiting_hrs += other.total_waiting_hrs
+        self.cases.fold(other.cases.frame())
+        self._merge_first_seen(other.first_seen)
+        self.has_resource = self.has_resource or other.has_resource
+        self.activity_resources = pd.concat(
+            [self.activity_resources, other.activity_resources], ignore_index=True
+        ).drop_duplicates()
+        return self
+
+    def _merge_first_seen(self, firsts):
+        combined = firsts if self.first_seen.empty else pd.concat([self.first_seen, firsts], ignore_index=True)
+        self.first_seen = combined.sort_values(['case_id', 'timestamp'], kind='stable').drop_duplicates('activity')
+
+    def results(self):
+        """Return kpi_results in the same shape as processor.calculate_kpis."""
+        results = {}
+
+        case_stats = self.cases.frame().sort_index()
+        case_stats.index.name = 'case_id'
+        case_stats['cycle_time_hrs'] = (case_stats['end_time'] - case_stats['start_time']).dt.total_seconds() / 3600
+        results['case_stats'] = case_stats
+
+        acts = self.activities.sort_index()
+        count = acts['count']
+        activity_stats = pd.DataFrame({
+            'activity': acts.index,
+            'avg_waiting_hrs': acts['mean'].to_numpy(),
+            'max_waiting_hrs': acts['max'].to_numpy(),
+            'min_waiting_hrs': acts['min'].to_numpy(),
+            'std_waiting_hrs': np.sqrt(acts['m2'] / (count - 1)).where(count > 1).to_numpy(),
+            'frequency': count.astype('int64').to_numpy(),
+        }).fillna(0)
+        sketches = self.sketches.reindex(acts.index, fill_value=0)
+        percentiles = percentile_frame(sketches.to_numpy(), acts['min'].to_numpy(), acts['max'].to_numpy())
+        for col in PERCENTILE_COLUMNS:
+            activity_stats.insert(activity_stats.columns.get_loc('frequency'), col, percentiles[col].to_numpy())
+
+        activity_order = self.first_seen['activity'].tolist()
+        activity_stats['order'] = activity_stats['activity'].map(
+            {a: i for i, a in enumerate(activity_order)}
+        )
+        activity_stats = activity_stats.sort_values('order').drop(columns='order')
+        results['activity_stats'] = activity_stats
+        results['activity_sketch'] = sketches.loc[activity_stats['activity']].rename_axis('activity')
+
+        if self.has_resource:
+            results['activity_resources'] = self.activity_resources.reset_index(drop=True)
+        else:
+            results['activity_resources'] = pd.DataFrame(columns=['activity'])
+
+        avg_wait = self.total_waiting_hrs / self.total_rows if self.total_rows else float('nan')
+        results['summary'] = {
+            'total_cases': int(case_stats.shape[0]),
+            'avg_cycle_time_hrs': round(float(case_stats['cycle_time_hrs'].mean()), 2),
+            'max_cycle_time_hrs': round(float(case_stats['cycle_time_hrs'].max()), 2),
+            'min_cycle_time_hrs': round(float(case_stats['cycle_time_hrs'].min()), 2),
+            'total_activities_logged': int(self.total_rows),
+            'unique_activities': int(len(activity_stats)),
+            'avg_waiting_time_hrs': round(float(avg_wait), 2),
+        }
+        return results
+
+
+def iter_chunks(file, chunksize=DEFAULT_CHUNKSIZE, quarantine=None):
+    """Yield validated chunks of a CSV event log with parsed timestamps.
+
+    The timestamp format is detected once from the first chunk. Rows whose
+    timestamp cannot be parsed are dropped, and appended to the `quarantine`
+    list when one is given.
+    """
+    name = getattr(file, 'name', file)
+    if isinstance(name, str) and (name.endswith('.xlsx') or name.endswith('.xls')):
+        raise ValueError("Streaming mode supports CSV files only")
+    try:
+        reader = pd.read_csv(file, chunksize=chunksize)
+    except Exception as e:
+        raise ValueError(f"Could not read file: {e}")
+
+    fmt = None
+    for chunk in reader:
+        chunk = normalize_columns(chunk)
+        if fmt is None and pd.api.types.is_string_dtype(chunk['timestamp']):
+            fmt = detect_format(chunk['timestamp'].dropna().unique()[:SAMPLE_SIZE])
+        parsed, failed = parse_timestamps(chunk['timestamp'], fmt)
+        chunk, bad = split_quarantine(chunk, failed, 'unparseable timestamp')
+        if quarantine is not None and not bad.empty:
+            quarantine.append(bad)
+        chunk['timestamp'] = parsed[~failed]
+        yield chunk
+
+
+def calculate_kpis_streaming(file, chunksize=DEFAULT_CHUNKSIZE, quarantine=None):
+    """Compute KPIs over a CSV log in bounded-size chunks.
+
+    Returns the same case_stats, activity_stats and summary as calculate_kpis,
+    plus activity_resources (distinct activity/resource pairs) in place of
+    the per-event df_with_waiting.
+    """
+    acc = KPIAccumulator()
+    for chunk in iter_chunks(file, chunksize, quarantine):
+        acc.update(chunk)
+    return acc.results()
@@ -0,0 +1,143 @@
+import argparse
+import math
+import sys
+
+import pandas as pd
+import numpy as np
+
+DEFAULT_ACTIVITIES = [
+    'Order Received', 'Credit Check', 'Inventory Check', 'Invoice Generation',
+    'Manager Approval', 'Packaging', 'Shipping', 'Delivery Confirmation',
+]
+DEFAULT_CHUNK_CASES = 100_000
+START = '2024-01-01'
+
+
+def variant_paths(activities, n_variants, rng):
+    """n_variants activity-code paths: the happy path plus skips, rework loops and swaps."""
+    base = list(range(len(activities)))
+    paths, seen = [base], {tuple(base)}
+    attempts = 0
+    while len(paths) < n_variants and attempts < 50 * n_variants:
+        attempts += 1
+        path = list(paths[rng.integers(len(paths))])
+        kind = rng.integers(3)
+        i = int(rng.integers(1, max(len(path) - 1, 2)))
+        if kind == 0 and len(path) > 3:
+            del path[i]                           # optional step skipped
+        elif kind == 1:
+            j = int(rng.integers(max(i - 2, 0), i + 1))
+            path[i + 1:i + 1] = path[j:i + 1]     # rework loop back to an earlier step
+        elif i + 1 < len(path):
+            path[i], path[i + 1] = path[i + 1], path[i]
+        if tuple(path) not in seen:
+            seen.add(tuple(path))
+            paths.append(path)
+    return paths
+
+
+def iter_log_chunks(n_cases=1000, n_events=None, activities=None, n_variants=20, variant_skew=1.2,
+                    wait_median_hrs=1.5, wait_sigma=1.2, slow_activities=2, slow_factor=6.0,
+                    n_resources=25, arrivals_per_hr=4.0, start=START, seed=0,
+                    chunk_cases=DEFAULT_CHUNK_CASES):
+    """Yield a seeded synthetic event log as (case_id, timestamp)-ordered chunks of whole cases.
+
+    Variants follow a Zipf mix (variant i has weight 1 / i**variant_skew);
+    waits are log-normal with per-activity medians, `slow_activities` of them
+    slow_factor times slower, so the tails are heavy. Each activity draws its
+    resource from its own pool (one activity has a single resource). Pass
+    n_events instead of n_cases to size the log by event count. The same
+    arguments always give the same log.
+    """
+    activities = list(activities or DEFAULT_ACTIVITIES)
+    k = len(activities)
+    rng = np.random.default_rng(seed)
+
+    paths = variant_paths(activities, n_variants, rng)
+    weights = 1 / np.arange(1, len(paths) + 1) ** variant_skew
+    weights /= weights.sum()
+    lengths_of_variant = np.array([len(p) for p in paths])
+    path_matrix = np.full((len(paths), lengths_of_variant.max()), -1, dtype=np.int64)
+    for v, p in enumerate(paths):
+        path_matrix[v, :len(p)] = p
+    if n_events is not None:
+        n_cases = max(1, math.ceil(n_events / float(weights @ lengths_of_variant)))
+
+    # Per-activity wait medians (log-space) and resource pools
+    log_median = np.log(wait_median_hrs) + rng.normal(0, 0.5, k)
+    log_median[rng.choice(k, size=min(slow_activities, k), replace=False)] += np.log(slow_factor)
+    pool_size = rng.integers(2, max(3, n_resources // k + 2), k)
+    pool_size[rng.integers(k)] = 1
+    pool_start = np.concatenate(([0], np.cumsum(pool_size)[:-1]))
+    resources = np.array([f'Agent_{i:03d}' for i in range(pool_size.sum())], dtype=object)
+    activity_names = np.array(activities, dtype=object)
+
+    width = len(str(n_cases))
+    clock = pd.Timestamp(start).value
+    for first in range(0, n_cases, chunk_cases):
+        crng = np.random.default_rng([seed, first])
+        c = min(chunk_cases, n_cases - first)
+        variant = crng.choice(len(paths), size=c, p=weights)
+        lengths = lengths_of_variant[variant]
+        n = int(lengths.sum())
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        case_of_row = np.repeat(np.arange(c), lengths)
+        pos = np.arange(n) - starts[case_of_row]
+        act = path_matrix[variant[case_of_row], pos]
+
+        wait_hrs = np.exp(log_median[act] + wait_sigma * crng.standard_normal(n))
+        wait_hrs[starts] = 0.0
+        elapsed = np.cumsum(wait_hrs)
+        elapsed -= np.repeat(elapsed[starts], lengths)
+        arrivals = clock + np.cumsum(crng.exponential(3600e9 / arrivals_per_hr, c)).astype(np.int64)
+        clock = int(arrivals[-1])
+        ts = arrivals[case_of_row] + (elapsed * 3600e9).astype(np.int64)
+        res = pool_start[act] + (crng.random(n) * pool_size[act]).astype(np.int64)
+
+        case_ids = np.array([f'CASE_{i:0{width}d}' for i in range(first, first + c)], dtype=object)
+        yield pd.DataFrame({
+            'case_id': case_ids[case_of_row],
+            'activity': activity_names[act],
+            'timestamp': pd.to_datetime(ts).floor('s'),
+            'resource': resources[res],
+        })
+
+
+def generate_log(**params):
+    """Whole synthetic log as one DataFrame (see iter_log_chunks for parameters)."""
+    return pd.concat(iter_log_chunks(**params), ignore_index=True)
+
+
+def write_log(path, **params):
+    """Stream a synthetic log to CSV chunk by chunk; returns the number of events written."""
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        for i, chunk in enumerate(iter_log_chunks(**params)):
+            chunk.to_csv(fh, index=False, header=(i == 0), date_format='%Y-%m-%d %H:%M:%S')
+            written += len(chunk)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a seeded synthetic process event log (CSV).')
+    parser.add_argument('output', help='CSV path to write')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--events', type=int, help='approximate number of events')
+    size.add_argument('--cases', type=int, default=1000, help='number of cases (default: 1000)')
+    parser.add_argument('--variants', type=int, default=20, help='number of process variants')
+    parser.add_argument('--variant-skew', type=float, default=1.2, help='Zipf exponent of the variant mix')
+    parser.add_argument('--wait-median', type=float, default=1.5, help='median wait per step (hours)')
+    parser.add_argument('--wait-sigma', type=float, default=1.2, help='log-normal sigma of waits (tail weight)')
+    parser.add_argument('--resources', type=int, default=25, help='approximate resource pool size')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    n = write_log(args.output, n_cases=args.cases, n_events=args.events, n_variants=args.variants,
+                  variant_skew=args.variant_skew, wait_median_hrs=args.wait_median,
+                  wait_sigma=args.wait_sigma, n_resources=args.resources, seed=args.seed)
+    print(f'{n:,} events written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import json
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ai_client import AIClient, APIError
+from ai_suggester import SuggestionParser
+
+MODEL = 'test-model'
+
+
+def _reply(text, stop_reason='end_turn'):
+    return 200, {}, {'content': [{'type': 'text', 'text': text}], 'stop_reason': stop_reason}
+
+
+def _sse(text, stop_reason='end_turn'):
+    """Server-sent events of a streamed reply, the text split into two deltas."""
+    half = len(text) // 2
+    events = [{'type': 'message_start', 'message': {}}]
+    events += [{'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': part}}
+               for part in (text[:half], text[half:])]
+    events += [{'type': 'message_delta', 'delta': {'stop_reason': stop_reason}}, {'type': 'message_stop'}]
+    return 200, {'Content-Type': 'text/event-stream'}, ''.join(
+        f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events)
+
+
+class StubServer:
+    """Messages API stand-in answering each POST with the next scripted (status, headers, body)."""
+
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                status, headers, body = stub.replies.pop(0)
+                raw = (body if isinstance(body, str) else json.dumps(body)).encode()
+                self.send_response(status)
+                for name, value in {'Content-Type': 'application/json', **headers}.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/v1/messages'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_client(stub, tmp_path):
+    """AIClient against the stub, caching under tmp_path and recording sleeps instead of waiting."""
+    clients = []
+
+    def make(**kwargs):
+        sleeps = []
+        kwargs.setdefault('cache_dir', str(tmp_path / 'cache'))
+        client = AIClient('test-key', base_url=stub.url, sleep=sleeps.append, **kwargs)
+        client.sleeps = sleeps
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_retries_429_and_529_honouring_retry_after(stub, make_client):
+    client = make_client()
+    stub.replies = [(429, {'Retry-After': '3'}, {'error': 'rate limited'}),
+                    (529, {'Retry-After': '7'}, {'error': 'overloaded'}),
+                    _reply('hello')]
+    assert client.complete('hi', MODEL, 10) == 'hello'
+    assert client.sleeps == [3.0, 7.0]
+    assert client.stats == {'requests': 3, 'retries': 2, 'cache_hits': 0}
+
+
+def test_retry_after_is_capped_at_backoff_max(stub, make_client):
+    client = make_client(backoff_max=5.0)
+    stub.replies = [(429, {'Retry-After': '120'}, {}), _reply('hello')]
+    assert client.complete('hi', MODEL, 10) == 'hello'
+    assert client.sleeps == [5.0]
+
+
+def test_retries_exhausted_raises_api_error(stub, make_client):
+    client = make_client(max_retries=2)
+    stub.replies = [(529, {}, {'error': 'overloaded'})] * 3
+    with pytest.raises(APIError) as info:
+        client.complete('hi', MODEL, 10)
+    assert info.value.status == 529
+    assert len(stub.requests) == 3
+    assert len(client.sleeps) == 2
+
+
+def test_non_retryable_status_fails_at_once(stub, make_client):
+    client = make_client()
+    stub.replies = [(400, {}, {'error': 'bad request'})]
+    with pytest.raises(APIError) as info:
+        client.complete('hi', MODEL, 10)
+    assert info.value.status == 400
+    assert client.sleeps == []
+
+
+def test_repeated_request_is_served_from_cache(stub, make_client):
+    client = make_client()
+    stub.replies = [_reply('hello')]
+    assert client.complete('hi', MODEL, 10) == 'hello'
+    assert client.complete('hi', MODEL, 10) == 'hello'
+    assert len(stub.requests) == 1
+    assert client.stats['cache_hits'] == 1
+
+    # A fresh client over the same cache_dir needs no request either
+    assert make_client().complete('hi', MODEL, 10) == 'hello'
+    assert len(stub.requests) == 1
+
+
+def test_expired_cache_entry_is_fetched_again(stub, make_client, tmp_path):
+    client = make_client(cache_ttl=60)
+    stub.replies = [_reply('old'), _reply('new')]
+    assert client.complete('hi', MODEL, 10) == 'old'
+
+    [name] = os.listdir(tmp_path / 'cache')
+    path = tmp_path / 'cache' / name
+    entry = json.loads(path.read_text())
+    entry['created'] -= 61
+    path.write_text(json.dumps(entry))
+
+    assert client.complete('hi', MODEL, 10) == 'new'
+    assert len(stub.requests) == 2
+    assert client.complete('hi', MODEL, 10) == 'new'
+    assert len(stub.requests) == 2
+
+
+@pytest.mark.parametrize('call', ['complete', 'post'])
+def test_reply_cut_off_at_max_tokens_is_not_cached(stub, make_client, call):
+    client = make_client()
+    stub.replies = [_reply('partial', stop_reason='max_tokens'), _reply('partial', stop_reason='max_tokens')]
+    payload = AIClient._payload('hi', MODEL, 10)
+    for _ in range(2):
+        if call == 'complete':
+            assert client.complete('hi', MODEL, 10) == 'partial'
+        else:
+            assert client.post(payload)['stop_reason'] == 'max_tokens'
+    assert len(stub.requests) == 2
+    assert client.stats['cache_hits'] == 0
+
+
+def test_stream_yields_deltas_and_caches_clean_reply(stub, make_client):
+    client = make_client()
+    stub.replies = [_sse('streamed reply')]
+    chunks = list(client.stream('hi', MODEL, 10))
+    assert len(chunks) == 2 and ''.join(chunks) == 'streamed reply'
+    assert stub.requests[0]['stream'] is True
+
+    # Cached under the same key as complete(), and replayed as a single chunk
+    assert list(client.stream('hi', MODEL, 10)) == ['streamed reply']
+    assert client.complete('hi', MODEL, 10) == 'streamed reply'
+    assert len(stub.requests) == 1
+
+
+def test_stream_cut_off_at_max_tokens_is_not_cached(stub, make_client):
+    client = make_client()
+    stub.replies = [_sse('cut off', stop_reason='max_tokens'), _reply('complete')]
+    assert ''.join(client.stream('hi', MODEL, 10)) == 'cut off'
+    assert client.complete('hi', MODEL, 10) == 'complete'
+    assert len(stub.requests) == 2
+
+
+def test_stream_without_message_stop_raises_and_is_not_cached(stub, make_client):
+    client = make_client()
+    status, headers, body = _sse('unfinished')
+    stub.replies = [(status, headers, body.rsplit('event: message_stop', 1)[0]), _reply('complete')]
+    with pytest.raises(APIError):
+        list(client.stream('hi', MODEL, 10))
+    assert client.complete('hi', MODEL, 10) == 'complete'
+    assert len(stub.requests) == 2
+
+
+REPLY = '```json\n' + json.dumps({
+    'executive_summary': 'Approval waits dominate; the "Review" step {often} stalls.',
+    'suggestions': [
+        {'activity': 'Review', 'severity': 'Critical', 'issue': 'Waits of 40h [p95]', 'nested': {'a': [1, 2]}},
+        {'activity': 'Approve', 'severity': 'High', 'issue': 'Backslash \\ and "quotes"'},
+        {'activity': 'Ship', 'severity': 'Low', 'issue': 'Unicode – ok'},
+    ],
+}, indent=2, ensure_ascii=False) + '\n```\nTrailing note.'
+
+
+def _split(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(0, 40)))
+    return [text[lo:hi] for lo, hi in zip([0] + cuts, cuts + [len(text)])]
+
+
+def _parse(chunks):
+    parser = SuggestionParser()
+    events = [event for chunk in chunks for event in parser.feed(chunk)]
+    return parser, events
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_suggestion_parser_is_independent_of_chunk_splits(seed):
+    whole, whole_events = _parse([REPLY])
+    parser, events = _parse(_split(REPLY, random.Random(seed)))
+    assert events == whole_events
+    assert parser.result() == whole.result() == json.loads(REPLY[REPLY.index('{'):REPLY.rindex('}') + 1])
+    assert [kind for kind, _ in events] == ['summary', 'suggestion', 'suggestion', 'suggestion']
+
+
+def test_suggestion_parser_character_at_a_time():
+    parser, events = _parse(list(REPLY))
+    assert parser.complete
+    assert events == _parse([REPLY])[1]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_suggestion_parser_keeps_completed_parts_of_cut_off_reply(seed):
+    cut = REPLY[:REPLY.index('"Ship"')]
+    parser, _ = _parse(_split(cut, random.Random(seed)))
+    result = parser.result()
+    assert result['truncated'] is True
+    assert result['executive_summary'].startswith('Approval waits dominate')
+    assert [s['activity'] for s in result['suggestions']] == ['Review', 'Approve']
@@ -0,0 +1,146 @@
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental import IncrementalAnalyzer, tail_csv
+from processor import calculate_kpis, load_and_validate
+
+SAMPLE_LOGS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'sample_data', '*.csv')))
+
+
+def _plain_index(frame):
+    frame = frame.copy()
+    frame.index = frame.index.astype(str)
+    return frame
+
+
+def assert_matches_full(analyzer, path):
+    """summary, activity_stats and case_stats equal a full load_and_validate + calculate_kpis."""
+    full = calculate_kpis(load_and_validate(path))
+    assert analyzer.summary() == full['summary']
+
+    expected = full['activity_stats']
+    got = analyzer.activity_stats()
+    assert list(got['activity']) == list(expected['activity'].astype(str))
+    columns = [c for c in expected.columns if c != 'activity']
+    pd.testing.assert_frame_equal(got[columns], expected[columns].reset_index(drop=True), check_dtype=False, rtol=1e-9)
+
+    expected = _plain_index(full['case_stats'])
+    got = _plain_index(analyzer.case_stats())
+    columns = [c for c in got.columns if c in expected.columns]
+    assert len(columns) == len(got.columns)
+    pd.testing.assert_frame_equal(got[columns], expected[columns], check_dtype=False, check_index_type=False)
+
+
+def _batches(raw, rng):
+    """Random-size contiguous batches of raw rows."""
+    cuts = np.sort(rng.choice(np.arange(1, len(raw)), size=min(8, len(raw) - 1), replace=False))
+    return [raw.iloc[lo:hi] for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(raw)])]
+
+
+@pytest.mark.parametrize('path', SAMPLE_LOGS, ids=os.path.basename)
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_random_batches_match_full_recompute(path, seed):
+    rng = np.random.default_rng(seed)
+    # Time order across cases, so cases start in one batch and continue in later ones
+    raw = pd.read_csv(path)
+    raw = raw.iloc[np.argsort(pd.to_datetime(raw['timestamp']).to_numpy(), kind='stable')]
+    analyzer = IncrementalAnalyzer()
+    spanning = set()
+    seen = set()
+    for batch in _batches(raw, rng):
+        cases = set(batch['case_id'])
+        spanning |= cases & seen
+        seen |= cases
+        analyzer.append(batch)
+    assert spanning, "no case was extended by a later batch"
+    assert analyzer.late_events == 0
+    assert_matches_full(analyzer, path)
+
+
+def test_case_started_in_one_batch_and_extended_in_a_later_one():
+    analyzer = IncrementalAnalyzer()
+    analyzer.append(pd.DataFrame({'case_id': ['A', 'A'], 'activity': ['Start', 'Check'],
+                                  'timestamp': ['2024-01-01 08:00', '2024-01-01 09:00']}))
+    analyzer.append(pd.DataFrame({'case_id': ['B', 'A'], 'activity': ['Start', 'Approve'],
+                                  'timestamp': ['2024-01-01 09:30', '2024-01-01 12:00']}))
+    cases = analyzer.case_stats()
+    assert cases.loc['A', 'num_activities'] == 3
+    assert cases.loc['A', 'cycle_time_hrs'] == 4.0
+    stats = analyzer.activity_stats().set_index('activity')
+    assert stats.loc['Approve', 'avg_waiting_hrs'] == 3.0  # waits since A's event in the first batch
+    assert analyzer.summary()['total_cases'] == 2
+
+
+def test_out_of_order_event_is_counted_late():
+    analyzer = IncrementalAnalyzer()
+    analyzer.append(pd.DataFrame({'case_id': ['A', 'A'], 'activity': ['Start', 'Check'],
+                                  'timestamp': ['2024-01-01 08:00', '2024-01-01 10:00']}))
+    analyzer.append(pd.DataFrame({'case_id': ['A'], 'activity': ['Approve'], 'timestamp': ['2024-01-01 09:00']}))
+    assert analyzer.late_events == 1
+    stats = analyzer.activity_stats().set_index('activity')
+    assert stats.loc['Approve', 'avg_waiting_hrs'] == 0.0
+    assert analyzer.case_stats().loc['A', 'num_activities'] == 3
+
+
+def _follow(path, **kwargs):
+    """tail_csv in a thread; returns (snapshots of total_rows per batch, stop event, thread, errors)."""
+    rows, errors, done = [], [], threading.Event()
+
+    def run():
+        try:
+            for analyzer in tail_csv(path, poll_interval=0.01, stop=done.is_set, **kwargs):
+                rows.append(analyzer.total_rows)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return rows, done, thread, errors
+
+
+def _wait_for(condition, timeout=5.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+    return condition()
+
+
+def test_tail_csv_follows_appends_and_holds_back_partial_line(tmp_path):
+    path = tmp_path / 'log.csv'
+    path.write_bytes(b'case_id,activity,timestamp\nA,Start,2024-01-01 08:00\n')
+    analyzer = IncrementalAnalyzer()
+    rows, done, thread, errors = _follow(str(path), analyzer=analyzer)
+    assert _wait_for(lambda: rows == [1])
+
+    with open(path, 'ab') as fh:
+        fh.write(b'A,Check,2024-01-01 09:00\nA,Appr')  # last line still being written
+        fh.flush()
+    assert _wait_for(lambda: rows == [1, 2])
+    assert analyzer.total_rows == 2
+
+    with open(path, 'ab') as fh:
+        fh.write(b'ove,2024-01-01 11:00\n')
+    assert _wait_for(lambda: rows == [1, 2, 3])
+    done.set()
+    thread.join(timeout=5)
+    assert not errors
+    assert analyzer.activity_stats().set_index('activity').loc['Approve', 'avg_waiting_hrs'] == 2.0
+
+
+def test_tail_csv_raises_on_truncated_file(tmp_path):
+    path = tmp_path / 'log.csv'
+    path.write_bytes(b'case_id,activity,timestamp\nA,Start,2024-01-01 08:00\nA,Check,2024-01-01 09:00\n')
+    rows, done, thread, errors = _follow(str(path))
+    assert _wait_for(lambda: rows == [2])
+    path.write_bytes(b'case_id,activity,timestamp\n')
+    assert _wait_for(lambda: bool(errors))
+    done.set()
+    thread.join(timeout=5)
+    assert isinstance(errors[0], ValueError)
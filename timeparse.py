@@ -0,0 +1,131 @@
+import re
+
+import pandas as pd
+import numpy as np
+
+from profiling import profiled
+
+# Tried in order against a sample; the first format that parses the most
+# sample values wins. 'ISO8601' covers fractional seconds, 'T' separators,
+# 'Z' and mixed +HH:MM offsets.
+CANDIDATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    'ISO8601',
+    '%d/%m/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%m/%d/%Y %H:%M',
+    '%d-%m-%Y %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%d.%m.%Y %H:%M:%S',
+]
+
+SAMPLE_SIZE = 1000
+_EPOCH_RE = re.compile(r'^\d{9,19}(\.\d+)?$')
+_TZ_RE = re.compile(r'(?:Z|[+-]\d{2}:?\d{2})$')
+
+
+def _epoch_unit(values):
+    """Guess s/ms/us/ns from the magnitude of epoch values."""
+    magnitude = np.nanmedian(np.abs(values)) if len(values) else 0
+    if magnitude < 1e11:
+        return 's'
+    if magnitude < 1e14:
+        return 'ms'
+    if magnitude < 1e17:
+        return 'us'
+    return 'ns'
+
+
+def _to_naive(parsed):
+    """Drop timezone info after converting to UTC (mixed offsets end up comparable)."""
+    if isinstance(parsed, pd.Series):
+        parsed = pd.DatetimeIndex(parsed)
+    if parsed.tz is not None:
+        parsed = parsed.tz_convert('UTC').tz_localize(None)
+    return parsed
+
+
+def _parse(values, fmt):
+    """Parse an array of strings with one format; unparseable values become NaT."""
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce', utc=True)
+    return _to_naive(parsed)
+
+
+def detect_format(sample):
+    """Pick the candidate format that parses the most values of a string sample."""
+    sample = pd.Series(sample).dropna().astype(str).str.strip()
+    if sample.empty:
+        return None
+    if sample.str.match(_EPOCH_RE).all():
+        return 'epoch'
+    has_tz = sample.str.contains(_TZ_RE).any()
+
+    best, best_hits = None, 0
+    for fmt in CANDIDATE_FORMATS:
+        if has_tz and fmt != 'ISO8601':
+            continue
+        hits = int(_parse(sample.to_numpy(), fmt).notna().sum())
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+            if hits == len(sample):
+                break
+    return best
+
+
+@profiled()
+def parse_timestamps(values, fmt=None):
+    """Parse a timestamp column into naive (UTC if offsets are present) datetimes.
+
+    Only the distinct strings are parsed; results are broadcast back through
+    the factorized codes. Returns (parsed Series, failed boolean mask); rows
+    that cannot be parsed are NaT in the result and True in the mask.
+    """
+    values = pd.Series(values)
+
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        parsed = pd.Series(_to_naive(values), index=values.index)
+        return parsed, parsed.isna().to_numpy()
+
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        numeric = values.to_numpy(dtype=float)
+        parsed = pd.to_datetime(numeric, unit=_epoch_unit(numeric), errors='coerce')
+        parsed = pd.Series(parsed, index=values.index)
+        return parsed, parsed.isna().to_numpy()
+
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques).astype(str).str.strip()
+
+    if fmt is None:
+        sample = uniques[:SAMPLE_SIZE]
+        fmt = detect_format(sample)
+
+    if fmt == 'epoch':
+        numeric = pd.to_numeric(uniques, errors='coerce').to_numpy(dtype=float)
+        parsed_uniques = pd.DatetimeIndex(pd.to_datetime(numeric, unit=_epoch_unit(numeric), errors='coerce'))
+    elif fmt is not None:
+        parsed_uniques = _parse(uniques.to_numpy(), fmt)
+    else:
+        parsed_uniques = pd.DatetimeIndex([pd.NaT] * len(uniques), dtype='datetime64[ns]')
+
+    # Residual strings the detected format missed get one slower inference pass
+    missed = parsed_uniques.isna()
+    if missed.any():
+        fallback = _parse(uniques[missed].to_numpy(), 'mixed')
+        parsed_uniques = parsed_uniques.as_unit('ns')
+        filled = parsed_uniques.to_numpy().copy()
+        filled[missed] = fallback.as_unit('ns').to_numpy()
+        parsed_uniques = pd.DatetimeIndex(filled)
+
+    parsed = parsed_uniques.take(codes, allow_fill=True, fill_value=pd.NaT)
+    parsed = pd.Series(parsed, index=values.index)
+    return parsed, parsed.isna().to_numpy()
+
+
+def split_quarantine(df, failed, reason):
+    """Split off rows flagged in `failed` as a quarantine table tagged with a reason."""
+    quarantine = df[failed].copy()
+    quarantine['quarantine_reason'] = reason
+    return df[~failed], quarantine
@@ -0,0 +1,174 @@
+import pandas as pd
+import numpy as np
+
+from eventlog import EventLog
+from profiling import profiled
+
+WINDOWS = {'hourly': '1h', 'daily': '1D', 'weekly': '7D'}
+MAX_CELLS = 20_000_000  # activity × window cells held per stat
+
+# An activity is rising when its fitted delay grows by RISING_MIN_CHANGE_PCT or
+# more across the last TREND_LOOKBACK windows, backed by enough events
+TREND_LOOKBACK = 12
+RISING_MIN_CHANGE_PCT = 25
+RISING_MIN_EVENTS = 20
+RISING_MIN_WINDOWS = 3
+
+
+def _origin(t0, window):
+    """Start of the first window: calendar-aligned, weeks starting on Monday."""
+    day = pd.Timestamp(t0).floor('1D')
+    if window == 'weekly':
+        return (day - pd.Timedelta(days=day.dayofweek)).value
+    return pd.Timestamp(t0).floor(WINDOWS[window]).value
+
+
+def window_options(timestamps, n_activities, max_cells=MAX_CELLS):
+    """The WINDOWS whose (activity, window) grid over a span of timestamps stays within max_cells."""
+    span_ns = (timestamps.max() - timestamps.min()).value if len(timestamps) else 0
+    return [w for w in WINDOWS
+            if (span_ns // pd.Timedelta(WINDOWS[w]).value + 2) * max(n_activities, 1) <= max_cells]
+
+
+def _window_sums(values, span):
+    """Sum of each run of `span` consecutive windows (last axis), ending at each window."""
+    if span == 1:
+        return values
+    cum = np.cumsum(values, axis=-1)
+    out = cum.copy()
+    out[..., span:] -= cum[..., :-span]
+    return out
+
+
+def _window_max(values, span):
+    if span == 1:
+        return values
+    padded = np.concatenate([np.full(values.shape[:-1] + (span - 1,), -np.inf), values], axis=-1)
+    return np.lib.stride_tricks.sliding_window_view(padded, span, axis=-1).max(axis=-1)
+
+
+def rising_activities(avg_waiting, frequency, lookback=TREND_LOOKBACK, min_change_pct=RISING_MIN_CHANGE_PCT,
+                      min_events=RISING_MIN_EVENTS, min_windows=RISING_MIN_WINDOWS):
+    """Per-activity delay trend over the last `lookback` windows, rising ones flagged.
+
+    The slope is a least-squares fit of window mean wait against window
+    number, weighted by the window's event count, so sparse windows count
+    for little; change_pct is the fitted rise across the lookback relative
+    to the weighted mean. All activities are fitted at once as matrix ops.
+    """
+    y = avg_waiting.to_numpy()[-lookback:].T
+    w = frequency.to_numpy()[-lookback:].T.astype(np.float64)
+    y = np.where(w > 0, y, 0.0)
+    x = np.arange(y.shape[1], dtype=np.float64)
+    total = w.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = (w * x).sum(axis=1) / total
+        y_mean = (w * y).sum(axis=1) / total
+        dx = x - x_mean[:, None]
+        slope = (w * dx * (y - y_mean[:, None])).sum(axis=1) / (w * dx * dx).sum(axis=1)
+        change_pct = 100 * slope * max(y.shape[1] - 1, 1) / y_mean
+    windows = (w > 0).sum(axis=1)
+    trend = pd.DataFrame({
+        'activity': avg_waiting.columns,
+        'slope_hrs_per_window': slope,
+        'avg_waiting_hrs': y_mean,
+        'latest_avg_waiting_hrs': avg_waiting.ffill().iloc[-1].to_numpy() if len(avg_waiting) else np.nan,
+        'change_pct': change_pct,
+        'events': total.astype(np.int64),
+        'windows': windows,
+    })
+    trend['rising'] = (
+        (trend['change_pct'] >= min_change_pct) & (trend['events'] >= min_events) & (windows >= min_windows)
+    )
+    return trend.sort_values('change_pct', ascending=False, na_position='last').reset_index(drop=True)
+
+
+@profiled()
+def window_stats(log, waiting_hrs, window='daily', span=1, lookback=TREND_LOOKBACK):
+    """Per-window activity waiting stats and case throughput of a sorted EventLog.
+
+    window is 'hourly', 'daily' or 'weekly'. With span=1 windows tumble; with
+    span=n each row covers the n windows ending at it (a sliding window that
+    advances one window at a time). Events fall in the window of their own
+    timestamp, cases in the windows they start and complete in. Every stat is
+    a bincount over (activity, window) codes in one pass, and sliding windows
+    are differences of its running sums, so nothing is recomputed per window.
+
+    Returns a dict: window, span, avg_waiting / std_waiting / max_waiting /
+    frequency (windows × activities frames), throughput (events, cases
+    started and completed, avg cycle time of completed cases per window) and
+    trend (rising_activities over the last `lookback` complete windows).
+    """
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window: {window}. Choose one of {list(WINDOWS)}")
+    if span < 1:
+        raise ValueError("span must be at least 1")
+    ts = log.timestamps
+    width = pd.Timedelta(WINDOWS[window]).value
+    origin = _origin(int(ts.min()), window) if len(log) else 0
+    n_windows = int((int(ts.max()) - origin) // width) + 1 if len(log) else 1
+    k = len(log.activities)
+    if k * n_windows > MAX_CELLS:
+        raise ValueError(f"{n_windows:,} {window} windows × {k:,} activities exceed {MAX_CELLS:,} cells; "
+                         "choose a longer window")
+    bucket = (ts - origin) // width
+
+    # Activity waiting stats: one bincount per moment over (activity, window) cells
+    act = log.activity_codes
+    valid = act >= 0
+    cell = act[valid].astype(np.int64) * n_windows + bucket[valid]
+    w = np.asarray(waiting_hrs, dtype=np.float64)[valid]
+    size = k * n_windows
+    count = _window_sums(np.bincount(cell, minlength=size).reshape(k, n_windows), span)
+    total = _window_sums(np.bincount(cell, weights=w, minlength=size).reshape(k, n_windows), span)
+    total_sq = _window_sums(np.bincount(cell, weights=w * w, minlength=size).reshape(k, n_windows), span)
+    wmax = np.full(size, -np.inf)
+    np.maximum.at(wmax, cell, w)
+    wmax = _window_max(wmax.reshape(k, n_windows), span)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        var = (total_sq - count * mean * mean) / np.maximum(count - 1, 1)
+    std = np.where(count > 1, np.sqrt(np.clip(var, 0, None)), np.where(count == 1, 0.0, np.nan))
+    wmax[count == 0] = np.nan
+
+    # Case throughput: starts and completions per window
+    starts = log.case_starts
+    ends = np.append(starts[1:], len(log))[:len(starts)] - 1
+    cycle_hrs = (ts[ends] - ts[starts]) / 1e9 / 3600
+    started = _window_sums(np.bincount(bucket[starts], minlength=n_windows), span)
+    completed = _window_sums(np.bincount(bucket[ends], minlength=n_windows), span)
+    cycle_total = _window_sums(np.bincount(bucket[ends], weights=cycle_hrs, minlength=n_windows), span)
+    events = _window_sums(np.bincount(bucket, minlength=n_windows), span)
+
+    index = pd.DatetimeIndex(origin + np.arange(n_windows, dtype=np.int64) * width, name='window_start')
+    names = log.activities.astype(str)
+
+    def frame(values):
+        return pd.DataFrame(values.T, index=index, columns=names)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        throughput = pd.DataFrame({
+            'events': events,
+            'cases_started': started,
+            'cases_completed': completed,
+            'avg_cycle_time_hrs': cycle_total / completed,
+        }, index=index)
+    avg_waiting, frequency = frame(mean), frame(count)
+    # A last window the log ends inside holds only its slowest stragglers; keep it out of the fit
+    fitted = n_windows - 1 if len(log) and int(ts.max()) < origin + n_windows * width - 1 else n_windows
+    return {
+        'window': window,
+        'span': span,
+        'avg_waiting': avg_waiting,
+        'std_waiting': frame(std),
+        'max_waiting': frame(wmax),
+        'frequency': frequency,
+        'throughput': throughput,
+        'trend': rising_activities(avg_waiting.iloc[:fitted], frequency.iloc[:fitted], lookback),
+    }
+
+
+def window_stats_from_frame(df_with_waiting, window='daily', span=1):
+    """window_stats for the (case_id, timestamp)-sorted frame from calculate_kpis."""
+    return window_stats(EventLog.from_frame(df_with_waiting), df_with_waiting['waiting_time_hrs'].to_numpy(),
+                        window, span)
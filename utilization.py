@@ -0,0 +1,201 @@
+import pandas as pd
+import numpy as np
+
+from eventlog import EventLog, column_codes
+from profiling import profiled
+
+# 'auto' picks the finest of these giving at most TARGET_BUCKETS buckets
+RESOLUTIONS = ['15min', '1h', '6h', '1D', '7D', '30D']
+TARGET_BUCKETS = 500
+# Entity × bucket cells per series: occupancy holds several dense float arrays
+# of this size (~60 bytes per cell at peak, frames included)
+MAX_CELLS = 2_000_000
+
+
+def _fits(span_ns, resolution, n_entities, max_cells=MAX_CELLS):
+    return (span_ns // pd.Timedelta(resolution).value + 2) * max(n_entities, 1) <= max_cells
+
+
+def choose_resolution(span_ns, target=TARGET_BUCKETS, n_entities=1):
+    """Finest resolution with at most target buckets whose grid stays within MAX_CELLS."""
+    for resolution in RESOLUTIONS:
+        if span_ns / pd.Timedelta(resolution).value <= target and _fits(span_ns, resolution, n_entities):
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def resolution_options(timestamps, n_entities, max_cells=MAX_CELLS):
+    """Every resolution whose (entity, bucket) grid over a span of timestamps stays within
+    max_cells, with 'auto' first; empty when none does.
+
+    n_entities is the larger of the activity and resource counts.
+    """
+    span_ns = (timestamps.max() - timestamps.min()).value if len(timestamps) else 0
+    options = [r for r in RESOLUTIONS if _fits(span_ns, r, n_entities, max_cells)]
+    return ['auto'] + options if options else []
+
+
+def entity_count(df_with_waiting):
+    """Larger of a frame's activity and resource dictionary sizes: the rows of utilization()'s grid."""
+    counts = [len(column_codes(df_with_waiting[c])[1]) for c in ('activity', 'resource') if c in df_with_waiting]
+    return max(counts + [1])
+
+
+def waiting_intervals(log):
+    """(activity, resource, start, end) arrays of each event's waiting interval.
+
+    Events carry a single timestamp, so an event's interval runs from the
+    previous event of its case to its own timestamp: the span counted as its
+    waiting_time_hrs. While it is open the case sits in the activity's queue
+    and with the resource that completes it. First events of a case have no
+    interval. resource is None when the log has no resource column.
+    """
+    n = len(log)
+    prev = np.zeros(n, dtype=bool)
+    if n:
+        prev[1:] = True
+        prev[log.case_starts] = False
+    rows = np.flatnonzero(prev)
+    start = log.timestamps[rows - 1]
+    end = log.timestamps[rows]
+    resource = log.resource_codes[rows].astype(np.int64) if log.has_resource else None
+    return log.activity_codes[rows].astype(np.int64), resource, start, end
+
+
+def _bucket_integral(entity, times, delta, n_entities, origin, width, n_buckets):
+    """(∫ level dt, level at bucket end) per (entity, bucket) of level(t) = Σ delta·[t ≥ time].
+
+    A step at time τ in bucket j adds delta·width to every later bucket and
+    delta·(end of bucket j − τ) to bucket j itself, so the integral is a
+    running sum of per-bucket step totals plus the partial terms: no
+    interval is ever compared with another.
+    """
+    bucket = (times - origin) // width
+    partial = (origin + (bucket + 1) * width - times).astype(np.float64)
+    cell = entity * n_buckets + bucket
+    size = n_entities * n_buckets
+    steps = np.bincount(cell, weights=delta, minlength=size).reshape(n_entities, n_buckets)
+    part = np.bincount(cell, weights=delta * partial, minlength=size).reshape(n_entities, n_buckets)
+    before = np.cumsum(steps, axis=1) - steps
+    return before * width + part, np.cumsum(steps, axis=1)
+
+
+def occupancy(entity, start, end, n_entities, origin, width, n_buckets):
+    """Per (entity, bucket): mean open intervals, peak open intervals and busy fraction.
+
+    A sweep line over the 2·n interval endpoints, sorted once: the open
+    count after each endpoint is a cumulative sum, and busy time is the
+    integral of (count > 0). Closings sort before openings at equal times,
+    so back-to-back intervals do not count as overlapping; zero-length
+    intervals are never open and are dropped.
+    """
+    keep = end > start
+    entity, start, end = entity[keep], start[keep], end[keep]
+    n = len(start)
+    times = np.concatenate([end, start])
+    ent = np.concatenate([entity, entity])
+    # Sort by time (closings first; ties are interchangeable), then stably by entity,
+    # which numpy does as a radix sort on 16-bit codes
+    order = np.argsort(2 * (times - origin) + (np.arange(2 * n) >= n))
+    codes = ent[order].astype(np.int16 if n_entities <= np.iinfo(np.int16).max else np.int32)
+    order = order[np.argsort(codes, kind='stable')]
+    times, ent = times[order], ent[order]
+    delta = np.where(order >= n, 1.0, -1.0)
+
+    # Every entity's deltas sum to zero, so one global cumsum restarts at 0 per entity
+    level = np.cumsum(delta)
+    busy_delta = (level > 0).astype(np.float64) - (level - delta > 0)
+
+    level_time, level_at_end = _bucket_integral(ent, times, delta, n_entities, origin, width, n_buckets)
+    busy_time, _ = _bucket_integral(ent, times, busy_delta, n_entities, origin, width, n_buckets)
+
+    # Peak: the largest level held for any time inside the bucket, i.e. the level
+    # carried in (unless an endpoint falls on the bucket start) and the level
+    # settled after each distinct endpoint time in it
+    peak = np.zeros((n_entities, n_buckets))
+    peak[:, 1:] = level_at_end[:, :-1]
+    peak = peak.ravel()
+    if n:
+        settled = np.r_[(ent[1:] != ent[:-1]) | (times[1:] != times[:-1]), True]
+        ent, times, level = ent[settled], times[settled], level[settled]
+        bucket = (times - origin) // width
+        cell = ent * n_buckets + bucket  # sorted, so each cell is one contiguous run
+        peak[cell[times == origin + bucket * width]] = 0
+        first = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+        cells = cell[first]
+        peak[cells] = np.maximum(peak[cells], np.maximum.reduceat(level, first))
+    return level_time / width, peak.reshape(n_entities, n_buckets), busy_time / width
+
+
+def _entity_stats(names, label, mean, peak, busy, width, span):
+    """Whole-span stats from the bucketed series: levels are 0 outside [t0, t1]."""
+    return pd.DataFrame({
+        label: names,
+        'avg_wip': mean.sum(axis=1) * width / span,
+        'peak_wip': peak.max(axis=1, initial=0),
+        'utilization_pct': 100 * busy.sum(axis=1) * width / span,
+    })
+
+
+@profiled()
+def utilization(log, resolution='auto', target_buckets=TARGET_BUCKETS):
+    """Work-in-progress, queue length and utilization time series of a sorted EventLog.
+
+    Returns a dict of DataFrames indexed by bucket start (one column per
+    activity or resource) at `resolution` (a pandas offset such as '1h' or
+    '1D', or 'auto'):
+      activity_queue, activity_peak_queue   time-averaged / peak cases waiting per activity
+      resource_wip, resource_utilization    time-averaged open items / busy fraction per resource
+    plus activity_queue_stats and resource_utilization_stats over the whole
+    log span, and the resolution used. Resource entries are None without a
+    resource column.
+    """
+    activity, resource, start, end = waiting_intervals(log)
+    if len(start):
+        t0, t1 = int(start.min()), int(end.max())
+    else:
+        t0 = t1 = int(log.timestamps.min()) if len(log) else 0
+    n_entities = max(len(log.activities), len(log.resources) if log.has_resource else 0, 1)
+    if resolution == 'auto':
+        resolution = choose_resolution(t1 - t0, target_buckets, n_entities)
+    width = pd.Timedelta(resolution).value
+    origin = pd.Timestamp(t0).floor(resolution).value if len(log) else 0
+    n_buckets = max(int((t1 - origin) // width) + 1, 1)
+    if n_buckets * n_entities > MAX_CELLS:
+        raise ValueError(f"Resolution {resolution} gives {n_buckets:,} buckets × {n_entities:,} activities or "
+                         f"resources, over {MAX_CELLS:,} cells; choose a coarser one")
+    index = pd.DatetimeIndex(origin + np.arange(n_buckets, dtype=np.int64) * width, name='time')
+    span = max(t1 - t0, 1)
+
+    valid = activity >= 0
+    k = len(log.activities)
+    queue, peak_queue, nonempty = occupancy(activity[valid], start[valid], end[valid], k, origin, width, n_buckets)
+    names = log.activities.astype(str)
+    result = {
+        'resolution': resolution,
+        'activity_queue': pd.DataFrame(queue.T, index=index, columns=names),
+        'activity_peak_queue': pd.DataFrame(peak_queue.T, index=index, columns=names),
+        'activity_queue_stats': _entity_stats(names, 'activity', queue, peak_queue, nonempty, width, span)
+            .rename(columns={'avg_wip': 'avg_queue', 'peak_wip': 'peak_queue', 'utilization_pct': 'nonempty_pct'})
+            .sort_values('avg_queue', ascending=False).reset_index(drop=True),
+        'resource_wip': None,
+        'resource_utilization': None,
+        'resource_utilization_stats': None,
+    }
+    if resource is not None:
+        valid = resource >= 0
+        r = len(log.resources)
+        wip, peak_wip, busy = occupancy(resource[valid], start[valid], end[valid], r, origin, width, n_buckets)
+        names = log.resources.astype(str)
+        result['resource_wip'] = pd.DataFrame(wip.T, index=index, columns=names)
+        result['resource_utilization'] = pd.DataFrame(busy.T, index=index, columns=names)
+        result['resource_utilization_stats'] = (
+            _entity_stats(names, 'resource', wip, peak_wip, busy, width, span)
+            .sort_values('utilization_pct', ascending=False).reset_index(drop=True)
+        )
+    return result
+
+
+def utilization_from_frame(df_with_waiting, resolution='auto'):
+    """utilization for the (case_id, timestamp)-sorted frame from calculate_kpis."""
+    return utilization(EventLog.from_frame(df_with_waiting), resolution)
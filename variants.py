@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+
+from eventlog import EventLog
+from profiling import profiled
+
+# Two independent polynomial hashes (mod 2^64) of each case's activity-code
+# sequence; together they make accidental collisions negligible.
+_BASES = (np.uint64(1_000_003), np.uint64(0x9E3779B97F4A7C15))
+MAX_PATH_LABELS = 200
+
+
+def _powers(base, length):
+    """base**0 .. base**(length-1), wrapping mod 2^64."""
+    powers = np.full(max(length, 1), base, dtype=np.uint64)
+    powers[0] = 1
+    return np.multiply.accumulate(powers)[:length]
+
+
+def case_hashes(log):
+    """(n_cases, 2) uint64 hashes of each case's activity sequence, in case order.
+
+    Expects a (case, timestamp)-sorted log. Position i of a case contributes
+    (code + 1) * base**i; reduceat sums each case's contiguous slice.
+    """
+    n = len(log)
+    starts = log.case_starts
+    if not n:
+        return np.zeros((0, 2), dtype=np.uint64)
+    lengths = np.diff(np.append(starts, n))
+    pos = np.arange(n) - np.repeat(starts, lengths)
+    symbol = (log.activity_codes.astype(np.int64) + 1).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        hashes = [
+            np.add.reduceat(symbol * _powers(base, int(lengths.max()))[pos], starts)
+            for base in _BASES
+        ]
+    # Mix in the length so prefixes of zero-coded (missing) activities differ
+    hashes[1] ^= lengths.astype(np.uint64)
+    return np.stack(hashes, axis=1)
+
+
+def _group_hashes(hashes):
+    """Group codes (first-appearance order), first row and size of each distinct hash row.
+
+    Groups on the first hash with a hash table and confirms with the second;
+    only if two sequences collide on the first does it fall back to sorting.
+    """
+    group, _ = pd.factorize(hashes[:, 0])
+    first = np.flatnonzero(group > np.maximum.accumulate(np.append(-1, group[:-1])))
+    if (hashes[:, 1] != hashes[first[group], 1]).any():
+        _, first, group = np.unique(hashes, axis=0, return_index=True, return_inverse=True)
+        group = group.reshape(-1)
+    return group, first, np.bincount(group, minlength=len(first))
+
+
+@profiled()
+def variant_index(log, cycle_time_hrs, hashes=None):
+    """Assign variant IDs per case and aggregate per-variant cycle-time stats.
+
+    Variant 1 is the most frequent path; ties go to the variant seen first.
+    hashes are optional precomputed case_hashes(log). Returns (variant_id
+    per case, variant_stats frame).
+    """
+    if hashes is None:
+        hashes = case_hashes(log)
+    n_cases = len(hashes)
+    inverse, first_case, count = _group_hashes(hashes)
+    rank = np.lexsort((first_case, -count))
+    variant_of_group = np.empty(len(rank), dtype=np.int64)
+    variant_of_group[rank] = np.arange(1, len(rank) + 1)
+    variant_id = variant_of_group[inverse]
+
+    cycle = np.asarray(cycle_time_hrs, dtype=np.float64)
+    v = variant_id - 1
+    k = len(rank)
+    count = count[rank]
+    total = np.bincount(v, weights=cycle, minlength=k)
+    mean = total / np.maximum(count, 1)
+    dev = cycle - mean[v]
+    m2 = np.bincount(v, weights=dev * dev, minlength=k)
+    cmin = np.full(k, np.inf)
+    cmax = np.full(k, -np.inf)
+    np.minimum.at(cmin, v, cycle)
+    np.maximum.at(cmax, v, cycle)
+
+    starts = log.case_starts
+    lengths = np.diff(np.append(starts, len(log)))
+    example = first_case[rank]
+    variant_stats = pd.DataFrame({
+        'variant_id': np.arange(1, k + 1),
+        'cases': count.astype('int64'),
+        'share_pct': 100 * count / max(n_cases, 1),
+        'num_activities': lengths[example],
+        'avg_cycle_time_hrs': mean,
+        'std_cycle_time_hrs': np.where(count > 1, np.sqrt(m2 / np.maximum(count - 1, 1)), 0.0),
+        'min_cycle_time_hrs': cmin,
+        'max_cycle_time_hrs': cmax,
+        'example_case': log.decode_cases(log.case_codes[starts[example]]),
+    })
+    # Readable paths only for the most frequent variants (one join per variant)
+    labels = [variant_path(log, starts[c], lengths[c]) for c in example[:MAX_PATH_LABELS]]
+    variant_stats['path'] = labels + [None] * (k - len(labels))
+    return variant_id, variant_stats
+
+
+def variant_path(log, start, length):
+    """'A → B → C' label for the case occupying rows start .. start+length."""
+    codes = log.activity_codes[start:start + length]
+    return ' → '.join(str(a) for a in log.decode_activities(codes[codes >= 0]))
+
+
+def top_variant_rows(case_stats, top_n):
+    """Row mask over the sorted event frame keeping cases of variants 1..top_n."""
+    keep = case_stats['variant_id'].to_numpy() <= top_n
+    return np.repeat(keep, case_stats['num_activities'].to_numpy())
+
+
+def filter_top_variants(df_with_waiting, case_stats, top_n):
+    """Event rows (original columns) of cases following the top_n variants."""
+    mask = top_variant_rows(case_stats, top_n)
+    columns = [c for c in df_with_waiting.columns if c != 'waiting_time_hrs']
+    filtered = df_with_waiting.loc[mask, columns].reset_index(drop=True)
+    for col in filtered.columns:
+        if isinstance(filtered[col].dtype, pd.CategoricalDtype):
+            filtered[col] = filtered[col].cat.remove_unused_categories()
+    return filtered
+
+
+def variants_from_frame(df_with_waiting, case_stats):
+    """variant_index for the sorted frame and case_stats from calculate_kpis."""
+    log = EventLog.from_frame(df_with_waiting)
+    return variant_index(log, case_stats['cycle_time_hrs'].to_numpy())
@@ -7,6 +7,11 @@ import pandas as pd
 import numpy as np
 import io
 
+from dfg import transition_matrix
+from eventlog import EventLog, column_codes
+from profiling import profiled
+from rules import band_floor, severity_of
+
 COLORS = {
     'primary': '#1a1a2e',
     'accent': '#e94560',
@@ -17,31 +22,37 @@ COLORS = {
     'text': '#eaeaea'
 }
 
-def _base_fig(figsize=(10, 5)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor=COLORS['primary'])
-    ax.set_facecolor(COLORS['primary'])
-    for spine in ax.spines.values():
-        spine.set_color('#333355')
-    ax.tick_params(colors=COLORS['text'], labelsize=9)
-    ax.xaxis.label.set_color(COLORS['text'])
-    ax.yaxis.label.set_color(COLORS['text'])
-    ax.title.set_color(COLORS['text'])
-    return fig, ax
+# Bar colour of each severity band (rules.SEVERITY_BANDS); Medium and Low read as normal
+SEVERITY_COLORS = {
+    'Critical': COLORS['accent'],
+    'High': COLORS['gold'],
+    'Medium': COLORS['green'],
+    'Low': COLORS['green'],
+}
 
+def _base_fig(figsize=(10, 5), nrows=1, height_ratios=None):
+    """Figure with one styled axis, or a column of nrows axes sharing the x axis."""
+    fig, axes = plt.subplots(nrows, 1, figsize=figsize, facecolor=COLORS['primary'], sharex=True, squeeze=False,
+                             gridspec_kw={'height_ratios': height_ratios} if height_ratios else None)
+    axes = axes[:, 0]
+    for ax in axes:
+        ax.set_facecolor(COLORS['primary'])
+        for spine in ax.spines.values():
+            spine.set_color('#333355')
+        ax.tick_params(colors=COLORS['text'], labelsize=9)
+        ax.xaxis.label.set_color(COLORS['text'])
+        ax.yaxis.label.set_color(COLORS['text'])
+        ax.title.set_color(COLORS['text'])
+    return fig, (axes[0] if nrows == 1 else axes)
 
+
+@profiled()
 def plot_bottleneck_bar(activity_stats):
     """Horizontal bar chart of avg waiting time per activity."""
     fig, ax = _base_fig(figsize=(10, 6))
 
     stats = activity_stats.sort_values('avg_waiting_hrs', ascending=True)
-    colors = []
-    for v in stats['avg_waiting_hrs']:
-        if v >= 5:
-            colors.append(COLORS['accent'])
-        elif v >= 2:
-            colors.append(COLORS['gold'])
-        else:
-            colors.append(COLORS['green'])
+    colors = [SEVERITY_COLORS[s] for s in severity_of(stats['avg_waiting_hrs'])]
 
     bars = ax.barh(stats['activity'], stats['avg_waiting_hrs'], color=colors, height=0.55, edgecolor='none')
 
@@ -57,9 +68,9 @@ def plot_bottleneck_bar(activity_stats):
 
     # Legend
     patches = [
-        mpatches.Patch(color=COLORS['accent'], label='Critical (≥5h)'),
-        mpatches.Patch(color=COLORS['gold'], label='High (≥2h)'),
-        mpatches.Patch(color=COLORS['green'], label='Normal (<2h)'),
+        mpatches.Patch(color=COLORS['accent'], label=f"Critical (≥{band_floor('Critical'):g}h)"),
+        mpatches.Patch(color=COLORS['gold'], label=f"High (≥{band_floor('High'):g}h)"),
+        mpatches.Patch(color=COLORS['green'], label=f"Normal (<{band_floor('High'):g}h)"),
     ]
     ax.legend(handles=patches, loc='lower right', facecolor=COLORS['highlight'],
               labelcolor=COLORS['text'], edgecolor='none', fontsize=8)
@@ -72,36 +83,133 @@ def plot_bottleneck_bar(activity_stats):
     return buf
 
 
-def plot_heatmap(df_with_waiting):
-    """Heatmap of waiting time per case per activity."""
-    pivot = df_with_waiting.pivot_table(
-        index='case_id', columns='activity', values='waiting_time_hrs', aggfunc='mean'
-    ).fillna(0)
+HEATMAP_FULL_MAX_CASES = 50
+HEATMAP_TOP_K = 50
+HEATMAP_BUCKETS = 20
+HEATMAP_MAX_ANNOTATED_CELLS = 800
+HEATMAP_MAX_TICK_LABELS = 60
+HEATMAP_MODES = ['auto', 'full', 'top', 'quantile', 'time']
+PROCESS_MAP_MAX_ANNOTATED = 25
 
-    # Keep column order from process flow
-    activity_order = df_with_waiting.drop_duplicates('activity').sort_values(
-        df_with_waiting.columns[df_with_waiting.columns.get_loc('timestamp')] if 'timestamp' in df_with_waiting.columns else 'activity'
-    )['activity'].tolist()
-    ordered_cols = [c for c in activity_order if c in pivot.columns]
-    pivot = pivot[ordered_cols] if ordered_cols else pivot
 
-    fig, ax = plt.subplots(figsize=(12, max(4, len(pivot) * 0.5 + 2)), facecolor=COLORS['primary'])
-    ax.set_facecolor(COLORS['primary'])
+@profiled()
+def heatmap_data(df_with_waiting, mode='auto', top_k=HEATMAP_TOP_K, buckets=HEATMAP_BUCKETS):
+    """Aggregate waiting time into a bounded rows × activity matrix for the heatmap.
+
+    Modes: 'full' (one row per case), 'top' (the top_k cases by total wait),
+    'quantile' (cases bucketed by total-wait percentile) and 'time' (cases
+    bucketed by start time). 'auto' uses 'full' for small logs and
+    'quantile' otherwise, so the matrix never grows with the case count.
+    Expects the (case_id, timestamp)-sorted frame from calculate_kpis.
+    """
+    log = EventLog.from_frame(df_with_waiting)
+    waits = df_with_waiting['waiting_time_hrs'].to_numpy(dtype=float)
+    starts = log.case_starts
+    n_cases = len(starts)
+    if mode == 'auto':
+        mode = 'full' if n_cases <= HEATMAP_FULL_MAX_CASES else 'quantile'
+
+    # Columns: activities in order of the timestamp of their first occurrence
+    act = log.activity_codes
+    codes, first_row = np.unique(act[act >= 0], return_index=True)
+    first_row = np.flatnonzero(act >= 0)[first_row]
+    codes = codes[np.argsort(log.timestamps[first_row], kind='stable')]
+    col_of_code = np.full(len(log.activities), -1)
+    col_of_code[codes] = np.arange(len(codes))
+
+    case_of_row = np.repeat(np.arange(n_cases), np.diff(np.append(starts, len(log))))
+    case_total = np.add.reduceat(waits, starts) if n_cases else np.zeros(0)
 
+    if mode == 'full':
+        row_of_case = np.arange(n_cases)
+        labels = list(log.decode_cases(log.case_codes[starts]))
+        ylabel = 'Case ID'
+        title = 'Waiting Time per Case per Activity (hrs)'
+    elif mode == 'top':
+        top = np.argsort(-case_total, kind='stable')[:top_k]
+        row_of_case = np.full(n_cases, -1)
+        row_of_case[top] = np.arange(len(top))
+        labels = list(log.decode_cases(log.case_codes[starts[top]]))
+        ylabel = 'Case ID'
+        title = f'Top {len(top)} Cases by Total Wait (hrs)'
+    elif mode == 'quantile':
+        rank = np.empty(n_cases, dtype=np.int64)
+        rank[np.argsort(case_total, kind='stable')] = np.arange(n_cases)
+        n_buckets = max(1, min(buckets, n_cases))
+        # Worst percentile bucket on the top row
+        row_of_case = n_buckets - 1 - rank * n_buckets // max(n_cases, 1)
+        step = 100 / n_buckets
+        labels = [f'{100 - (r + 1) * step:.0f}–{100 - r * step:.0f}%' for r in range(n_buckets)]
+        ylabel = 'Case Percentile (total wait)'
+        title = 'Mean Wait by Case Percentile (hrs)'
+    elif mode == 'time':
+        case_start = log.timestamps[starts]
+        lo, hi = (case_start.min(), case_start.max()) if n_cases else (0, 0)
+        n_buckets = max(1, buckets)
+        width = max((hi - lo) / n_buckets, 1)
+        row_of_case = np.minimum(((case_start - lo) / width).astype(np.int64), n_buckets - 1)
+        edges = pd.to_datetime(lo + width * np.arange(n_buckets))
+        labels = [e.strftime('%Y-%m-%d %H:%M') for e in edges]
+        ylabel = 'Case Start Period'
+        title = 'Mean Wait by Case Start Period (hrs)'
+    else:
+        raise ValueError(f"Unknown heatmap mode: {mode}. Use one of {HEATMAP_MODES}")
+
+    n_rows, n_cols = len(labels), len(codes)
+    row = row_of_case[case_of_row]
+    col = col_of_code[np.maximum(act, 0)]
+    keep = (row >= 0) & (act >= 0)
+    key = row[keep] * n_cols + col[keep]
+    sums = np.bincount(key, weights=waits[keep], minlength=n_rows * n_cols)
+    counts = np.bincount(key, minlength=n_rows * n_cols)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = np.where(counts > 0, sums / counts, 0.0).reshape(n_rows, n_cols)
+
+    return {
+        'matrix': pd.DataFrame(matrix, index=labels, columns=list(log.decode_activities(codes))),
+        'mode': mode,
+        'ylabel': ylabel,
+        'title': title,
+    }
+
+
+@profiled()
+def render_heatmap(data):
+    """Render heatmap_data output; small matrices are annotated, large ones drawn as a raster."""
+    matrix = data['matrix']
+    n_rows, n_cols = matrix.shape
+    annotate = n_rows * n_cols <= HEATMAP_MAX_ANNOTATED_CELLS and n_rows <= HEATMAP_FULL_MAX_CASES
     cmap = sns.color_palette("YlOrRd", as_cmap=True)
-    sns.heatmap(pivot, ax=ax, cmap=cmap, linewidths=0.3, linecolor='#1a1a2e',
-                annot=True, fmt='.1f', annot_kws={'size': 8, 'color': 'black'},
-                cbar_kws={'label': 'Waiting Time (hrs)', 'shrink': 0.8})
 
-    ax.set_title('🔥 Delay Heatmap — Waiting Time per Case per Activity (hrs)',
+    if annotate:
+        fig, ax = plt.subplots(figsize=(12, max(4, n_rows * 0.5 + 2)), facecolor=COLORS['primary'])
+        ax.set_facecolor(COLORS['primary'])
+        sns.heatmap(matrix, ax=ax, cmap=cmap, linewidths=0.3, linecolor='#1a1a2e',
+                    annot=True, fmt='.1f', annot_kws={'size': 8, 'color': 'black'},
+                    cbar_kws={'label': 'Waiting Time (hrs)', 'shrink': 0.8})
+        cbar = ax.collections[0].colorbar
+    else:
+        fig, ax = plt.subplots(figsize=(12, 7), facecolor=COLORS['primary'])
+        ax.set_facecolor(COLORS['primary'])
+        image = ax.imshow(matrix.to_numpy(), aspect='auto', interpolation='nearest', cmap=cmap)
+        cbar = fig.colorbar(image, ax=ax, shrink=0.8)
+        if n_cols <= HEATMAP_MAX_TICK_LABELS:
+            ax.set_xticks(range(n_cols), matrix.columns)
+        else:
+            ax.set_xticks([])
+        if n_rows <= HEATMAP_MAX_TICK_LABELS:
+            ax.set_yticks(range(n_rows), matrix.index)
+        else:
+            ax.set_yticks([])
+
+    ax.set_title(f"🔥 Delay Heatmap — {data['title']}",
                  fontsize=12, pad=15, fontweight='bold', color=COLORS['text'])
     ax.tick_params(colors=COLORS['text'], labelsize=8)
     ax.set_xlabel('Activity', fontsize=10, color=COLORS['text'])
-    ax.set_ylabel('Case ID', fontsize=10, color=COLORS['text'])
-    plt.xticks(rotation=30, ha='right')
-    plt.yticks(rotation=0)
+    ax.set_ylabel(data['ylabel'], fontsize=10, color=COLORS['text'])
+    plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
+    plt.setp(ax.get_yticklabels(), rotation=0)
 
-    cbar = ax.collections[0].colorbar
     cbar.ax.tick_params(colors=COLORS['text'], labelsize=8)
     cbar.set_label('Waiting Time (hrs)', color=COLORS['text'])
 
@@ -113,17 +221,98 @@ def plot_heatmap(df_with_waiting):
     return buf
 
 
-def plot_cycle_time_distribution(case_stats):
-    """Histogram of cycle times across all cases."""
+@profiled()
+def plot_heatmap(df_with_waiting, mode='auto'):
+    """Heatmap of waiting time per case (or case bucket) per activity."""
+    return render_heatmap(heatmap_data(df_with_waiting, mode=mode))
+
+
+@profiled()
+def process_map_data(transition_stats, activities):
+    """Source × target matrices of mean edge delay and edge frequency, in process order."""
+    if transition_stats is None or transition_stats.empty:
+        return None
+    return {
+        'delay': transition_matrix(transition_stats, activities, value='avg_waiting_hrs'),
+        'frequency': transition_matrix(transition_stats, activities, value='frequency'),
+    }
+
+
+@profiled()
+def render_process_map(data):
+    """Transition matrix: cell colour is the mean wait on the edge, label its frequency."""
+    if data is None:
+        return None
+    delay, freq = data['delay'], data['frequency']
+    n = len(delay)
+    cmap = sns.color_palette("YlOrRd", as_cmap=True)
+    size = min(14, max(6, n * 0.55 + 3))
+    fig, ax = plt.subplots(figsize=(size + 2, size), facecolor=COLORS['primary'])
+    ax.set_facecolor(COLORS['primary'])
+
+    if n <= PROCESS_MAP_MAX_ANNOTATED:
+        labels = np.where(freq.to_numpy() > 0,
+                          [[f"{d:.1f}h\n×{int(f)}" for d, f in zip(drow, frow)]
+                           for drow, frow in zip(delay.to_numpy(), freq.to_numpy())], '')
+        sns.heatmap(delay, ax=ax, cmap=cmap, mask=delay.isna(), linewidths=0.3, linecolor='#1a1a2e',
+                    annot=labels, fmt='', annot_kws={'size': 7, 'color': 'black'},
+                    cbar_kws={'label': 'Mean Wait on Edge (hrs)', 'shrink': 0.8})
+        cbar = ax.collections[0].colorbar
+    else:
+        image = ax.imshow(np.ma.masked_invalid(delay.to_numpy()), aspect='auto', interpolation='nearest', cmap=cmap)
+        cbar = fig.colorbar(image, ax=ax, shrink=0.8)
+        if n <= HEATMAP_MAX_TICK_LABELS:
+            ax.set_xticks(range(n), delay.columns)
+            ax.set_yticks(range(n), delay.index)
+        else:
+            ax.set_xticks([])
+            ax.set_yticks([])
+
+    ax.set_title('🔀 Process Map — Wait per Transition (hrs, × frequency)',
+                 fontsize=12, pad=15, fontweight='bold', color=COLORS['text'])
+    ax.tick_params(colors=COLORS['text'], labelsize=8)
+    ax.set_xlabel('Next Activity', fontsize=10, color=COLORS['text'])
+    ax.set_ylabel('Previous Activity', fontsize=10, color=COLORS['text'])
+    plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
+    plt.setp(ax.get_yticklabels(), rotation=0)
+
+    cbar.ax.tick_params(colors=COLORS['text'], labelsize=8)
+    cbar.set_label('Mean Wait on Edge (hrs)', color=COLORS['text'])
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor=COLORS['primary'])
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+@profiled()
+def plot_process_map(transition_stats, activities):
+    """Directly-follows matrix of edge delays and frequencies."""
+    return render_process_map(process_map_data(transition_stats, activities))
+
+
+@profiled()
+def cycle_time_data(case_stats):
+    """Histogram counts, bin edges, mean and median of case cycle times."""
+    data = case_stats['cycle_time_hrs'].to_numpy(dtype=float)
+    counts, edges = np.histogram(data, bins=min(10, len(data)))
+    return {'counts': counts, 'edges': edges, 'mean': float(data.mean()), 'median': float(np.median(data))}
+
+
+@profiled()
+def render_cycle_time_distribution(hist):
+    """Draw the cycle-time histogram from cycle_time_data output."""
     fig, ax = _base_fig(figsize=(9, 4))
 
-    data = case_stats['cycle_time_hrs']
-    ax.hist(data, bins=min(10, len(data)), color=COLORS['accent'], edgecolor=COLORS['primary'],
+    edges = hist['edges']
+    ax.hist(edges[:-1], bins=edges, weights=hist['counts'], color=COLORS['accent'], edgecolor=COLORS['primary'],
             linewidth=0.8, alpha=0.85)
-    ax.axvline(data.mean(), color=COLORS['gold'], linestyle='--', linewidth=1.5,
-               label=f'Mean: {data.mean():.1f}h')
-    ax.axvline(data.median(), color=COLORS['green'], linestyle='--', linewidth=1.5,
-               label=f'Median: {data.median():.1f}h')
+    ax.axvline(hist['mean'], color=COLORS['gold'], linestyle='--', linewidth=1.5,
+               label=f"Mean: {hist['mean']:.1f}h")
+    ax.axvline(hist['median'], color=COLORS['green'], linestyle='--', linewidth=1.5,
+               label=f"Median: {hist['median']:.1f}h")
 
     ax.set_xlabel('Cycle Time (Hours)', fontsize=10)
     ax.set_ylabel('Number of Cases', fontsize=10)
@@ -140,13 +329,34 @@ def plot_cycle_time_distribution(case_stats):
     return buf
 
 
-def plot_resource_workload(df):
-    """Bar chart of how many activities each resource handled."""
+@profiled()
+def plot_cycle_time_distribution(case_stats):
+    """Histogram of cycle times across all cases."""
+    return render_cycle_time_distribution(cycle_time_data(case_stats))
+
+
+@profiled()
+def resource_workload_data(df):
+    """Tasks handled per resource, busiest first (None without a resource column)."""
     if 'resource' not in df.columns:
         return None
 
-    resource_counts = df['resource'].value_counts().reset_index()
-    resource_counts.columns = ['resource', 'count']
+    # Count on the dictionary codes; ties keep first-appearance order
+    codes, resources = column_codes(df['resource'])
+    seen, first_row, counts = np.unique(codes[codes >= 0], return_index=True, return_counts=True)
+    order = np.lexsort((first_row, -counts))
+    resource_counts = pd.DataFrame({
+        'resource': resources.take(seen[order]),
+        'count': counts[order],
+    })
+    return resource_counts
+
+
+@profiled()
+def render_resource_workload(resource_counts):
+    """Draw the workload bar chart from resource_workload_data output."""
+    if resource_counts is None:
+        return None
 
     fig, ax = _base_fig(figsize=(8, 4))
     bar_colors = [COLORS['accent'] if i == 0 else COLORS['highlight'] for i in range(len(resource_counts))]
@@ -169,3 +379,233 @@ def plot_resource_workload(df):
     plt.close(fig)
     buf.seek(0)
     return buf
+
+
+@profiled()
+def plot_resource_workload(df):
+    """Bar chart of how many activities each resource handled."""
+    return render_resource_workload(resource_workload_data(df))
+
+
+QUEUE_TIMELINE_TOP_N = 6
+UTILIZATION_HEATMAP_TOP_N = 25
+DELAY_TREND_TOP_N = 6
+CASE_TIMELINE_MAX_STEPS = 60
+
+
+@profiled()
+def queue_timeline_data(utilization, top_n=QUEUE_TIMELINE_TOP_N):
+    """Queue-length series of the top_n activities by average queue, from utilization()."""
+    stats = utilization['activity_queue_stats']
+    top = stats[stats['avg_queue'] > 0].head(top_n)['activity']
+    if top.empty:
+        return None
+    return {'queue': utilization['activity_queue'][list(top)], 'resolution': utilization['resolution']}
+
+
+@profiled()
+def render_queue_timeline(data):
+    """Line chart of time-averaged cases waiting per activity, one line per activity."""
+    if data is None:
+        return None
+    fig, ax = _base_fig(figsize=(11, 5))
+    palette = sns.color_palette('YlOrRd_r', n_colors=max(len(data['queue'].columns), 3))
+    for color, (activity, series) in zip(palette, data['queue'].items()):
+        ax.plot(series.index, series.to_numpy(), color=color, linewidth=1.4, label=activity,
+                drawstyle='steps-post')
+
+    ax.set_xlabel('Time', fontsize=10)
+    ax.set_ylabel(f"Cases Waiting (avg per {data['resolution']})", fontsize=10)
+    ax.set_title('📈 Queue Length Over Time — Top Waiting Activities', fontsize=12, pad=15, fontweight='bold')
+    ax.legend(facecolor=COLORS['highlight'], labelcolor=COLORS['text'], edgecolor='none', fontsize=8,
+              loc='upper left')
+    ax.grid(axis='y', color='#333355', linewidth=0.5, alpha=0.6)
+    ax.set_axisbelow(True)
+    fig.autofmt_xdate()
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor=COLORS['primary'])
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+@profiled()
+def plot_queue_timeline(utilization):
+    """Queue length over time for the activities with the longest queues."""
+    return render_queue_timeline(queue_timeline_data(utilization))
+
+
+@profiled()
+def resource_utilization_data(utilization, top_n=UTILIZATION_HEATMAP_TOP_N):
+    """Resource × time matrix of busy % for the top_n busiest resources (None without resources)."""
+    if utilization['resource_utilization'] is None:
+        return None
+    top = utilization['resource_utilization_stats'].head(top_n)['resource']
+    if top.empty:
+        return None
+    matrix = 100 * utilization['resource_utilization'][list(top)].T
+    return {'matrix': matrix, 'resolution': utilization['resolution']}
+
+
+@profiled()
+def render_resource_utilization(data):
+    """Heatmap of the share of each time bucket a resource had open work."""
+    if data is None:
+        return None
+    matrix = data['matrix']
+    n_rows, n_cols = matrix.shape
+    cmap = sns.color_palette("YlOrRd", as_cmap=True)
+    fig, ax = plt.subplots(figsize=(12, max(3, n_rows * 0.35 + 2)), facecolor=COLORS['primary'])
+    ax.set_facecolor(COLORS['primary'])
+    image = ax.imshow(matrix.to_numpy(), aspect='auto', interpolation='nearest', cmap=cmap, vmin=0, vmax=100)
+    cbar = fig.colorbar(image, ax=ax, shrink=0.8)
+
+    ax.set_yticks(range(n_rows), matrix.index)
+    ticks = np.unique(np.linspace(0, n_cols - 1, min(n_cols, 8)).astype(int))
+    ax.set_xticks(ticks, [matrix.columns[i].strftime('%Y-%m-%d %H:%M') for i in ticks])
+
+    ax.set_title(f"🧑‍💼 Resource Utilization — % of Each {data['resolution']} With Open Work",
+                 fontsize=12, pad=15, fontweight='bold', color=COLORS['text'])
+    ax.tick_params(colors=COLORS['text'], labelsize=8)
+    ax.set_xlabel('Time', fontsize=10, color=COLORS['text'])
+    ax.set_ylabel('Resource / Agent', fontsize=10, color=COLORS['text'])
+    plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
+
+    cbar.ax.tick_params(colors=COLORS['text'], labelsize=8)
+    cbar.set_label('Utilization (%)', color=COLORS['text'])
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor=COLORS['primary'])
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+@profiled()
+def plot_resource_utilization(utilization):
+    """Heatmap of resource utilization over time."""
+    return render_resource_utilization(resource_utilization_data(utilization))
+
+
+@profiled()
+def delay_trend_data(trends, top_n=DELAY_TREND_TOP_N):
+    """Per-window mean wait of the rising activities (then the slowest), plus cases completed."""
+    trend = trends['trend']
+    ranked = pd.concat([trend[trend['rising']],
+                        trend[~trend['rising']].sort_values('avg_waiting_hrs', ascending=False)])
+    top = ranked[ranked['events'] > 0].head(top_n)
+    if top.empty:
+        return None
+    return {
+        'avg_waiting': trends['avg_waiting'][list(top['activity'])],
+        'rising': set(top.loc[top['rising'], 'activity']),
+        'completed': trends['throughput']['cases_completed'],
+        'window': trends['window'],
+        'span': trends['span'],
+    }
+
+
+@profiled()
+def render_delay_trend(data):
+    """Mean wait per window (rising activities drawn bold) over a bar strip of cases completed."""
+    if data is None:
+        return None
+    fig, (ax, ax_cases) = _base_fig(figsize=(11, 6), nrows=2, height_ratios=[3, 1])
+    palette = sns.color_palette('YlOrRd_r', n_colors=max(len(data['avg_waiting'].columns), 3))
+    for color, (activity, series) in zip(palette, data['avg_waiting'].items()):
+        rising = activity in data['rising']
+        ax.plot(series.index, series.to_numpy(), color=COLORS['accent'] if rising else color,
+                linewidth=2.2 if rising else 1.2, marker='o' if len(series) <= 60 else None, markersize=3,
+                label=f"{activity} ▲" if rising else activity)
+
+    unit = {'hourly': 'hour', 'daily': 'day', 'weekly': 'week'}[data['window']]
+    per = f"{data['span']}-{unit} window" if data['span'] > 1 else unit
+    ax.set_ylabel('Avg Waiting Time (hrs)', fontsize=10)
+    ax.set_title(f'📆 Delay Trend — Avg Wait per {per}', fontsize=12, pad=15, fontweight='bold')
+    ax.legend(facecolor=COLORS['highlight'], labelcolor=COLORS['text'], edgecolor='none', fontsize=8,
+              loc='upper left')
+    ax.grid(axis='y', color='#333355', linewidth=0.5, alpha=0.6)
+    ax.set_axisbelow(True)
+
+    completed = data['completed']
+    widths = np.diff(completed.index.asi8).min() if len(completed) > 1 else pd.Timedelta('1D').value
+    ax_cases.bar(completed.index, completed.to_numpy(), width=pd.Timedelta(widths) * 0.8, align='edge',
+                 color=COLORS['highlight'], edgecolor='none')
+    ax_cases.set_ylabel('Cases Completed', fontsize=9)
+    ax_cases.set_xlabel('Window Start', fontsize=10)
+    ax_cases.grid(axis='y', color='#333355', linewidth=0.5, alpha=0.6)
+    ax_cases.set_axisbelow(True)
+    fig.autofmt_xdate()
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor=COLORS['primary'])
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+@profiled()
+def plot_delay_trend(trends):
+    """Waiting time per activity and case throughput over time windows."""
+    return render_delay_trend(delay_trend_data(trends))
+
+
+def case_timeline_data(case_id, steps, max_steps=CASE_TIMELINE_MAX_STEPS):
+    """Waits of a case's first max_steps steps as (start, length) offsets in hours, from case_index.case_steps."""
+    shown = steps.head(max_steps)
+    return {
+        'case_id': case_id,
+        'labels': [f"{step}. {activity}" for step, activity in zip(shown['step'], shown['activity'].astype(str))],
+        'end': shown['elapsed_hrs'].to_numpy(),
+        'wait': shown['waiting_time_hrs'].to_numpy(),
+        'severity': shown['severity'].tolist(),
+        'total_steps': len(steps),
+    }
+
+
+@profiled()
+def render_case_timeline(data):
+    """One bar per step spanning its wait, coloured by severity, ending at the step's event."""
+    n = len(data['labels'])
+    fig, ax = _base_fig(figsize=(11, max(3, 0.35 * n + 1.5)))
+    y = np.arange(n)
+    colors = [SEVERITY_COLORS.get(s, COLORS['highlight']) for s in data['severity']]
+    ax.barh(y, data['wait'], left=data['end'] - data['wait'], color=colors, height=0.55, edgecolor='none')
+    ax.scatter(data['end'], y, color=COLORS['text'], s=12, zorder=3)
+    for yi, end, wait in zip(y[1:], data['end'][1:], data['wait'][1:]):
+        ax.text(end, yi, f'  {wait:.1f}h', va='center', color=COLORS['text'], fontsize=8)
+    ax.set_yticks(y)
+    ax.set_yticklabels(data['labels'])
+    ax.invert_yaxis()
+
+    shown = '' if n == data['total_steps'] else f" (first {n} of {data['total_steps']} steps)"
+    ax.margins(x=0.08)  # room for the wait labels of the last steps
+    ax.set_xlabel('Hours Since Case Start', fontsize=10)
+    ax.set_title(f"Case {data['case_id']} — Waits per Step{shown}", fontsize=12, pad=15, fontweight='bold')
+    ax.grid(axis='x', color='#333355', linewidth=0.5, alpha=0.7)
+    ax.set_axisbelow(True)
+    patches = [
+        mpatches.Patch(color=COLORS['accent'], label=f"Critical (≥{band_floor('Critical'):g}h)"),
+        mpatches.Patch(color=COLORS['gold'], label=f"High (≥{band_floor('High'):g}h)"),
+        mpatches.Patch(color=COLORS['green'], label=f"Normal (<{band_floor('High'):g}h)"),
+    ]
+    ax.legend(handles=patches, loc='lower left', facecolor=COLORS['highlight'],
+              labelcolor=COLORS['text'], edgecolor='none', fontsize=8)
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor=COLORS['primary'])
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+@profiled()
+def plot_case_timeline(case_id, steps):
+    """Timeline of one case's steps and the waits before them."""
+    return render_case_timeline(case_timeline_data(case_id, steps))
+
@@ -0,0 +1,32 @@
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# One lock for every __main__ swap in the process: chart renders and parallel
+# analyses from different sessions must not interleave their swaps
+_main_lock = threading.Lock()
+
+
+def spawn_pool(max_workers):
+    """Process pool of spawned workers (forking a multi-threaded Streamlit server is unsafe)."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+@contextmanager
+def without_main_script():
+    """Hide the running script from spawn's __main__ re-import.
+
+    Streamlit executes app.py as __main__, and spawned workers would re-run
+    the whole app on start-up. Workers only need the module of their entry
+    point, so pools submit (and start workers) against a bare __main__ instead.
+    """
+    with _main_lock:
+        main = sys.modules.get('__main__')
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main